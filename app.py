@@ -2,19 +2,54 @@
 import os
 import re
 import json
-from typing import Dict, Any
-from flask import Flask, render_template, request, jsonify
-import requests
+import time
+import math
+import hashlib
+import datetime
+import mimetypes
+import importlib.util
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, TimeoutError as FutureTimeout, wait as wait_futures
+from contextlib import contextmanager, nullcontext
+from typing import TYPE_CHECKING, Dict, Any, Callable, Iterable, Iterator
+from flask import (Flask, Response, g, has_request_context, render_template, request, jsonify,
+                   stream_with_context, url_for)
 
-# dotenv: load .env if present (so systemd/env files still work too)
-from dotenv import load_dotenv
-load_dotenv()
+from nutrient_cache import NutrientCache, MISS
+from food_index import load_default_index, normalize_food_name
+from food_resolver import FoodNameResolver
+from recommender import Recommender, DIETS
+from ttl_cache import TTLCache, save_snapshot, load_snapshot
+from json_stream import IncrementalObjectParser
+from consult_jobs import JobQueue, QueueFull, PRIORITIES
+from chat_sessions import ChatSessionStore
+from meal_log import MealLog, PROFILE_FIELDS
+from deadline import Deadline, DeadlineExceeded, DEADLINE_HEADER
+from circuit_breaker import Upstreams, UpstreamUnavailable, is_upstream_failure
+from metrics import Metrics, RequestTimer
+from assets import Assets, Precompressed, ENCODINGS, compress, negotiate
+from nutrition import calculate_deficiency, map_usda_nutrients, canonical_nutrients, format_amount, parse_amount
+from bulk_analyze import analyze_records
+
+if TYPE_CHECKING:
+    import requests    # annotations only; imported for real by _ensure_http_resources
 
-# Try to import the Google GenAI SDK (Gemini). We will fail gracefully if not installed.
+# dotenv: load .env if present (so systemd/env files still work too)
 try:
-    from google import genai  # google-genai SDK
-except Exception:
-    genai = None
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:
+    pass
+
+# The Google GenAI SDK (Gemini) is imported on first use (see _genai): it is the slowest
+# import by far, and most tools and tests never call Gemini. We fail gracefully if not installed.
+def _module_available(name: str) -> bool:
+    try:
+        return importlib.util.find_spec(name) is not None
+    except ImportError:
+        return False
+
+GENAI_INSTALLED = _module_available("google.genai")
 
 app = Flask(__name__)
 
@@ -23,130 +58,488 @@ USDA_API_KEY = os.getenv("USDA_API_KEY")
 WEATHER_API_KEY = os.getenv("WEATHER_API_KEY")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")  # your Gemini (Google) API key
 
-if not USDA_API_KEY or not WEATHER_API_KEY:
-    # we raise here because analyze route depends on these. For local dev you must set these.
-    raise RuntimeError("Please set USDA_API_KEY and WEATHER_API_KEY environment variables (in .env or system env).")
+def _missing_keys_response():
+    """Error response for /analyze when the USDA or WeatherAPI key is not configured, else None."""
+    missing = [name for name, value in (("USDA_API_KEY", USDA_API_KEY), ("WEATHER_API_KEY", WEATHER_API_KEY)) if not value]
+    if not missing:
+        return None
+    return jsonify({"error": f"Please set {' and '.join(missing)} (in .env or system env)."}), 500
+
+# Upstream endpoints; override to point the app at local stand-ins (see bench/fake_upstreams.py).
+USDA_BASE_URL = os.getenv("USDA_BASE_URL", "https://api.nal.usda.gov/fdc/v1").rstrip("/")
+WEATHER_BASE_URL = os.getenv("WEATHER_BASE_URL", "http://api.weatherapi.com/v1").rstrip("/")
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL")   # None: the SDK's default endpoint
 
-# ----------------- WEATHER DATA -----------------
-def get_weather(city: str):
+# ----------------- HTTP SESSION -----------------
+# One keep-alive connection pool per worker process, shared by every upstream call,
+# so repeated USDA/WeatherAPI requests skip the TCP+TLS handshake.
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "10"))
+USDA_MAX_WORKERS = int(os.getenv("USDA_MAX_WORKERS", "6"))
+
+_http_lock = threading.Lock()
+_http_session = None
+_lookup_executor = None
+_attempt_executor = None
+_http_pid = None
+
+def _ensure_http_resources():
+    """Create the session/executor lazily and again after a fork (gunicorn workers)."""
+    global _http_session, _lookup_executor, _attempt_executor, _http_pid
+    pid = os.getpid()
+    if _http_pid == pid:
+        return
+    with _http_lock:
+        if _http_pid == pid:
+            return
+        import requests    # deferred: only upstream calls need it
+        from requests.adapters import HTTPAdapter
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        _http_session = session
+        _lookup_executor = ThreadPoolExecutor(max_workers=USDA_MAX_WORKERS, thread_name_prefix="usda")
+        # single USDA requests (first tries and hedges), run for the lookups above
+        _attempt_executor = ThreadPoolExecutor(max_workers=2 * USDA_MAX_WORKERS, thread_name_prefix="usda-attempt")
+        _http_pid = pid
+
+def http_session() -> "requests.Session":
+    _ensure_http_resources()
+    return _http_session
+
+# ----------------- DEADLINES -----------------
+# Time budget per endpoint in seconds; clients may ask for another one with the
+# X-Request-Deadline-Ms header (between MIN_DEADLINE and MAX_DEADLINE, below the
+# gunicorn timeout). Upstream calls only use what is left of it, see deadline.py.
+ANALYZE_DEADLINE = float(os.getenv("ANALYZE_DEADLINE", "10"))
+CONSULT_DEADLINE = float(os.getenv("CONSULT_DEADLINE", "60"))
+CHAT_DEADLINE = float(os.getenv("CHAT_DEADLINE", "60"))
+BATCH_DEADLINE = float(os.getenv("BATCH_DEADLINE", "60"))
+MAX_DEADLINE = float(os.getenv("MAX_DEADLINE", "110"))
+MIN_DEADLINE = float(os.getenv("MIN_DEADLINE", "1"))
+WEATHER_TIMEOUT = 8.0
+USDA_TIMEOUT = 10.0
+# start a second USDA request when the first has not answered after this many seconds
+USDA_HEDGE_AFTER = float(os.getenv("USDA_HEDGE_AFTER", "1.5"))
+
+def request_deadline(default: float) -> Deadline:
+    return Deadline.from_header(request.headers.get(DEADLINE_HEADER), default, MAX_DEADLINE, MIN_DEADLINE)
+
+def timeouts_count(deadline: Deadline = None, cap: float = None) -> bool:
+    """
+    Whether a timeout of an upstream call made now should count against its breaker:
+    not when a client's shorter deadline, rather than the call's usual `cap`, cut it off.
+    """
+    return deadline is None or not deadline.limits(cap)
+
+# ----------------- METRICS -----------------
+# Counted per worker in memory, flushed to SQLite and summed over all workers on
+# /metrics (see metrics.py). Every response also carries a Server-Timing header.
+METRICS = Metrics.from_env()
+METRICS.counter("nutri_requests_total", "HTTP requests by endpoint and status code")
+METRICS.histogram("nutri_request_duration_seconds", "HTTP request duration by endpoint (streams: until the last event)")
+METRICS.gauge("nutri_requests_in_flight", "HTTP requests being served, by endpoint")
+METRICS.histogram("nutri_upstream_duration_seconds", "Duration of single calls to USDA, WeatherAPI and Gemini")
+METRICS.counter("nutri_cache_requests_total", "Cache lookups by cache and result (hit, stale, miss)")
+METRICS.counter("nutri_food_lookups_total", "Foods resolved for /analyze and /analyze/batch, by source and status")
+METRICS.histogram("nutri_analyze_items", "Food items per /analyze request", buckets=(1, 2, 3, 5, 8, 13, 20, 50))
+METRICS.counter("nutri_gemini_tokens_total", "Gemini tokens from response usage metadata, by use and kind")
+
+def phase(name: str):
+    """Time part of the current request for its Server-Timing header (no-op outside a request)."""
+    timer = g.get("timer") if has_request_context() else None
+    return timer.phase(name) if timer else nullcontext()
+
+@contextmanager
+def timed_upstream(name: str):
+    started = time.perf_counter()
+    outcome = "ok"
     try:
-        url = "http://api.weatherapi.com/v1/current.json"
-        params = {"key": WEATHER_API_KEY, "q": city, "aqi": "no"}
-        r = requests.get(url, params=params, timeout=8)
-        r.raise_for_status()
-        d = r.json()
-        return {
-            "condition": d["current"]["condition"]["text"],
-            "temp": d["current"]["temp_c"],
-            "humidity": d["current"]["humidity"],
-        }
+        yield
     except Exception:
+        outcome = "error"
+        raise
+    finally:
+        METRICS.observe("nutri_upstream_duration_seconds", time.perf_counter() - started,
+                        upstream=name, outcome=outcome)
+
+def _record_gemini_usage(usage, use: str):
+    """Count the tokens of one Gemini answer (its usage_metadata)."""
+    if usage is None:
+        return
+    for kind, attr in (("prompt", "prompt_token_count"), ("output", "candidates_token_count"),
+                       ("thoughts", "thoughts_token_count")):
+        count = getattr(usage, attr, None)
+        if isinstance(count, int) and count > 0:
+            METRICS.inc("nutri_gemini_tokens_total", count, use=use, kind=kind)
+
+@METRICS.collector
+def _cache_counts():
+    for name, cache in (("weather", WEATHER_CACHE), ("consult", CONSULT_CACHE)):
+        yield "nutri_cache_requests_total", {"cache": name, "result": "hit"}, cache.hits
+        yield "nutri_cache_requests_total", {"cache": name, "result": "stale"}, cache.stale_hits
+        yield "nutri_cache_requests_total", {"cache": name, "result": "miss"}, cache.misses
+
+# ----------------- UPSTREAM RESILIENCE -----------------
+# Circuit breakers shared by all workers (an outage fails fast everywhere) and a
+# per-worker retry budget, see circuit_breaker.py.
+UPSTREAMS = Upstreams.from_env(("usda", "weather", "gemini"))
+RETRY_ATTEMPTS = int(os.getenv("RETRY_ATTEMPTS", "3"))
+
+def call_upstream(name: str, fn: Callable[[], Any], deadline: Deadline = None, attempts: int = RETRY_ATTEMPTS,
+                  cap: float = None):
+    """
+    fn() as a call to upstream `name` through its circuit breaker, retried on upstream
+    failures with jittered exponential backoff while the retry budget and deadline allow.
+    Raises UpstreamUnavailable at once while the breaker is open. `cap` is the usual
+    timeout of one attempt (see timeouts_count).
+    """
+    from tenacity import Retrying, stop_after_attempt, wait_random_exponential
+    budget = UPSTREAMS.retry_budget
+    budget.record_call()
+    backoff = wait_random_exponential(multiplier=0.2, max=2.0)
+
+    def should_retry(state) -> bool:
+        e = state.outcome.exception()
+        return e is not None and is_upstream_failure(e) and budget.try_retry()
+
+    def out_of_time(state) -> bool:
+        return deadline is not None and deadline.remaining() < 0.25
+
+    def wait(state) -> float:
+        pause = backoff(state)
+        return min(pause, max(0.0, deadline.remaining() - 0.25)) if deadline is not None else pause
+
+    def attempt():
+        with UPSTREAMS[name].guard(timeouts_count(deadline, cap)), timed_upstream(name):
+            return fn()
+
+    retrying = Retrying(stop=stop_after_attempt(attempts) | out_of_time, wait=wait,
+                        retry=should_retry, reraise=True)
+    return retrying(attempt)
+
+def _unavailable_response(e: UpstreamUnavailable):
+    retry_after = max(1, math.ceil(e.retry_after))
+    resp = jsonify({"ok": False, "error": str(e), "upstream": e.upstream, "retry_after": retry_after})
+    resp.headers["Retry-After"] = str(retry_after)
+    return resp, 503
+
+# ----------------- WEATHER DATA -----------------
+# Current conditions barely change within minutes: cache per normalized city, serve
+# slightly stale entries while refreshing in the background, remember unknown cities.
+WEATHER_CACHE = TTLCache(
+    ttl=float(os.getenv("WEATHER_CACHE_TTL", "600")),
+    stale_ttl=float(os.getenv("WEATHER_STALE_TTL", "900")),
+    negative_ttl=float(os.getenv("WEATHER_NEGATIVE_TTL", "3600")),
+    maxsize=int(os.getenv("WEATHER_CACHE_MAX", "1024")),
+)
+
+def _fetch_weather(city: str, deadline: Deadline = None):
+    """Current weather for a city, None if WeatherAPI does not know it. Raises on other errors."""
+    url = f"{WEATHER_BASE_URL}/current.json"
+    params = {"key": WEATHER_API_KEY, "q": city, "aqi": "no"}
+
+    def get():
+        timeout = deadline.timeout(WEATHER_TIMEOUT, "weather") if deadline else WEATHER_TIMEOUT
+        r = http_session().get(url, params=params, timeout=timeout)
+        if r.status_code == 400:
+            # WeatherAPI answers 400 with error code 1006 for "No matching location found."
+            try:
+                if r.json().get("error", {}).get("code") == 1006:
+                    return None
+            except Exception:
+                pass
+        r.raise_for_status()
+        return r.json()
+
+    d = call_upstream("weather", get, deadline, cap=WEATHER_TIMEOUT)
+    if d is None:
         return None
+    return {
+        "condition": d["current"]["condition"]["text"],
+        "temp": d["current"]["temp_c"],
+        "humidity": d["current"]["humidity"],
+    }
+
+def get_weather(city: str, deadline: Deadline = None):
+    """
+    Weather for a city, None if WeatherAPI does not know it. Raises DeadlineExceeded when
+    `deadline` ran out before an answer came, UpstreamUnavailable when WeatherAPI failed.
+    """
+    key = " ".join((city or "").lower().split())
+    if not key:
+        return None
+    try:
+        return WEATHER_CACHE.get_or_load(key, lambda k: _fetch_weather(k, deadline),
+                                         timeout=deadline.remaining() if deadline else None)
+    except UpstreamUnavailable:
+        raise
+    except Exception as e:
+        if deadline and deadline.expired:
+            raise DeadlineExceeded("weather: request deadline exceeded")
+        raise UpstreamUnavailable("weather", UPSTREAMS["weather"].retry_after()) from e
 
 # ----------------- NUTRIENTS FETCH -----------------
-def get_food_nutrients(food: str) -> Dict[str, tuple]:
-    url = "https://api.nal.usda.gov/fdc/v1/foods/search"
+def _search_usda_food(food: str, deadline: Deadline = None):
+    """
+    Top USDA search hit as {"description": str, "nutrients": {name: canonical amount per 100 g}}
+    (mapped by nutrient id once, here, see nutrition.py), or None when USDA has no match.
+    Raises on HTTP errors.
+    """
+    url = f"{USDA_BASE_URL}/foods/search"
     params = {"api_key": USDA_API_KEY, "query": food, "pageSize": 1}
-    try:
-        r = requests.get(url, params=params, timeout=10)
+    timeout = deadline.timeout(USDA_TIMEOUT, "USDA") if deadline else USDA_TIMEOUT
+    with UPSTREAMS["usda"].guard(timeouts_count(deadline, USDA_TIMEOUT)), timed_upstream("usda"):
+        r = http_session().get(url, params=params, timeout=timeout)
         r.raise_for_status()
-        data = r.json()
-        nutrients = {}
-        foods = data.get("foods", [])
-        if not foods:
-            return nutrients
-        food_data = foods[0]
-        for n in food_data.get("foodNutrients", []):
-            name = n.get("nutrientName") or n.get("name")
-            val = n.get("value")
-            unit = n.get("unitName") or n.get("unit")
-            if name and val is not None:
-                try:
-                    nutrients[name.strip()] = (float(val), unit or "")
-                except Exception:
-                    # ignore parsing problems
-                    continue
-        return nutrients
+    data = r.json()
+    foods = data.get("foods", [])
+    if not foods:
+        return None
+    food_data = foods[0]
+    nutrients = map_usda_nutrients(food_data.get("foodNutrients", []))
+    return {"description": food_data.get("description", ""), "nutrients": nutrients}
+
+def _search_usda_food_hedged(food: str, deadline: Deadline = None):
+    """
+    _search_usda_food with one hedged retry: when the first request has not answered
+    after USDA_HEDGE_AFTER seconds, or failed with an upstream error (5xx, timeout...),
+    and both the deadline and the retry budget allow, a second one is sent and the
+    first good answer wins.
+    """
+    deadline = deadline or Deadline(USDA_TIMEOUT)
+    _ensure_http_resources()
+    UPSTREAMS.retry_budget.record_call()
+    pending = {_attempt_executor.submit(_search_usda_food, food, deadline)}
+    hedged = False
+    error = None
+    while pending:
+        can_hedge = not hedged and deadline.remaining() > USDA_HEDGE_AFTER
+        timeout = min(USDA_HEDGE_AFTER, deadline.remaining()) if can_hedge else deadline.remaining()
+        done, pending = wait_futures(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+        for fut in done:
+            try:
+                return fut.result()
+            except Exception as e:
+                if not is_upstream_failure(e):
+                    raise
+                error = e
+        if can_hedge and UPSTREAMS.retry_budget.try_retry():
+            hedged = True
+            pending.add(_attempt_executor.submit(_search_usda_food, food, deadline))
+        elif not done and deadline.expired:
+            raise DeadlineExceeded("USDA: request deadline exceeded")
+    raise error
+
+# shared across workers (SQLite), see nutrient_cache.py
+NUTRIENT_CACHE = NutrientCache.from_env()
+
+# local per-100 g composition data (dataset.csv + optional USDA dump), see food_index.py
+FOOD_INDEX = load_default_index()
+
+# ----------------- FOOD NAME RESOLUTION -----------------
+# trigram index over local foods + cached USDA descriptions, see food_resolver.py
+FUZZY_MATCH_MIN_SCORE = float(os.getenv("FUZZY_MATCH_MIN_SCORE", "0.6"))
+RESOLVER_SYNC_SECONDS = 60.0
+
+FOOD_RESOLVER = FoodNameResolver()
+for _name in FOOD_INDEX.names:
+    FOOD_RESOLVER.add(_name, "local")
+_resolver_sync = {"rowid": 0, "at": 0.0}
+
+def _sync_resolver_with_cache():
+    """Pick up USDA descriptions other workers have cached since the last sync."""
+    now = time.time()
+    if now - _resolver_sync["at"] < RESOLVER_SYNC_SECONDS:
+        return
+    _resolver_sync["at"] = now
+    try:
+        rows = NUTRIENT_CACHE.descriptions(_resolver_sync["rowid"])
     except Exception:
-        return {}
-
-def convert_to_mg(amount: float, unit: str) -> float:
-    unit = (unit or "").lower()
-    if unit in ("g", "gram", "grams"):
-        return amount * 1000.0
-    if unit in ("mg", "milligram", "milligrams"):
-        return amount
-    return amount
-
-NUTRIENT_KEY_MAP = {
-    "Protein": ["protein"],
-    "Vitamin C": ["vitamin c", "ascorbic acid"],
-    "Iron": ["iron"],
-    "Calcium": ["calcium"],
-    "Fiber": ["fiber", "dietary fiber"],
-}
+        return
+    for rowid, key, description in rows:
+        if description:
+            FOOD_RESOLVER.add(description, "cache", key=key)
+        _resolver_sync["rowid"] = max(_resolver_sync["rowid"], rowid)
 
-def calculate_deficiency(total_nutrients_mg: Dict[str,float], gender: str, height_cm: float, weight_kg: float):
-    baseline = {
-        "Protein_g": 50.0,
-        "Vitamin C_mg": 90.0,
-        "Iron_mg": 18.0 if gender.lower() == "female" else 8.0,
-        "Calcium_mg": 1000.0,
-        "Fiber_g": 30.0,
-    }
-    bmi = weight_kg / ((height_cm / 100.0) ** 2) if height_cm > 0 else 0
-    if bmi and bmi < 18.5:
-        for k in list(baseline.keys()):
-            baseline[k] *= 1.10
-    elif bmi and bmi > 25:
-        for k in list(baseline.keys()):
-            baseline[k] *= 0.90
-
-    deficiencies = {}
-    protein_mg = total_nutrients_mg.get("Protein", 0.0)
-    fiber_mg = total_nutrients_mg.get("Fiber", 0.0)
-    if protein_mg < (baseline["Protein_g"] * 1000.0) * 0.6:
-        need_mg = baseline["Protein_g"] * 1000.0 - protein_mg
-        deficiencies["Protein"] = f"{round(need_mg/1000.0, 2)} g"
-    if fiber_mg < (baseline["Fiber_g"] * 1000.0) * 0.6:
-        need_mg = baseline["Fiber_g"] * 1000.0 - fiber_mg
-        deficiencies["Fiber"] = f"{round(need_mg/1000.0, 2)} g"
-
-    for short_key, base_key in [("Vitamin C", "Vitamin C_mg"), ("Iron", "Iron_mg"), ("Calcium", "Calcium_mg")]:
-        have = total_nutrients_mg.get(short_key, 0.0)
-        need = baseline[base_key]
-        if have < need * 0.6:
-            need_more = need - have
-            deficiencies[short_key] = f"{round(need_more, 2)} mg"
-    return deficiencies
-
-def recommend_foods(defic: Dict[str,str], weather: Dict[str,Any]):
-    base = {
-        "Protein": [("Chicken", "27 g"), ("Eggs", "13 g"), ("Paneer", "18 g")],
-        "Iron": [("Spinach", "2.7 mg"), ("Liver", "6.5 mg"), ("Beans", "3.7 mg")],
-        "Calcium": [("Milk", "120 mg"), ("Curd", "80 mg"), ("Almonds", "75 mg")],
-        "Fiber": [("Oats", "10 g"), ("Apple", "4.5 g"), ("Carrots", "3 g")],
-        "Vitamin C": [("Orange", "53 mg"), ("Guava", "200 mg"), ("Kiwi", "90 mg")],
-    }
-    temp_foods = ["Cucumber", "Yogurt"] if weather and weather.get("temp", 0) > 30 else ["Soup", "Eggs"]
-    rec = []
-    for n in defic.keys():
-        rec.extend(base.get(n, []))
-    for f in temp_foods:
-        rec.append((f, "-", "-"))
-    return rec[:10]
+def _resolve_fuzzy(key: str):
+    """Nutrients for the name `key` looks like a misspelling of, or None (then USDA is asked)."""
+    _sync_resolver_with_cache()
+    match = FOOD_RESOLVER.typo_match(key, FUZZY_MATCH_MIN_SCORE)
+    if not match:
+        return None
+    if match["source"] == "local":
+        nutrients = FOOD_INDEX.lookup(match["key"])
+    else:
+        entry = NUTRIENT_CACHE.get(match["key"])
+        nutrients = _entry_nutrients(entry) if entry is not MISS else None
+    if not nutrients:
+        return None
+    return {"nutrients": nutrients, "source": match["source"], "match": match["name"], "error": None}
+
+def _entry_nutrients(entry) -> Dict[str, float]:
+    # cache entries written before nutrient-id mapping hold {name: (value, unit)}
+    return canonical_nutrients(entry["nutrients"]) if entry else {}
+
+def _cached_usda_food(food: str, deadline: Deadline = None):
+    entry, _hit = NUTRIENT_CACHE.get_or_fetch(normalize_food_name(food),
+                                              lambda key: _search_usda_food_hedged(key, deadline))
+    return entry
+
+def get_food_nutrients(food: str, deadline: Deadline = None) -> Dict[str, float]:
+    """
+    Canonical {nutrient: amount per 100 g} for a food, {} if it is unknown.
+    Raises UpstreamUnavailable when USDA could not be asked (DeadlineExceeded when out of time).
+    """
+    local = FOOD_INDEX.lookup(food)
+    if local is not None:
+        return local
+    try:
+        entry = _cached_usda_food(food, deadline)
+    except (UpstreamUnavailable, DeadlineExceeded):
+        raise
+    except Exception as e:
+        raise UpstreamUnavailable("usda", UPSTREAMS["usda"].retry_after()) from e
+    return _entry_nutrients(entry)
+
+def _usda_error(food: str, e: Exception) -> str:
+    """
+    Client-facing message for a failed USDA lookup. The exception itself is only logged:
+    requests puts the full URL, api_key included, into its messages.
+    """
+    app.logger.warning("USDA lookup for %r failed: %r", food, e)
+    if isinstance(e, UpstreamUnavailable) or is_upstream_failure(e):
+        return "usda is unavailable"
+    status = getattr(getattr(e, "response", None), "status_code", None)
+    return f"usda request failed ({status})" if status else "usda request failed"
+
+def lookup_foods(names: Iterable[str], deadline: Deadline = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Resolve several foods. Each one is answered, in order, from the local FOOD_INDEX,
+    the shared NUTRIENT_CACHE, a name in either of them it is a misspelling of
+    (not merely a similar name: "apple pie" is not "apple"), or USDA; the USDA misses are fetched concurrently
+    (bounded by USDA_MAX_WORKERS). Names are normalized and de-duplicated, so each
+    unique unknown food costs at most one upstream call.
+    Returns {normalized name: {"nutrients": {...}, "source": "local"|"cache"|"usda", "error": None or message}};
+    fuzzy matches also carry "match" (the name that was used). With a `deadline`, USDA misses
+    still unanswered when it runs out come back with "timeout": True (their fetch keeps going
+    in the background, within its own USDA_TIMEOUT, and fills the cache for the next request).
+    Misses that USDA could not answer (open circuit breaker, outage) carry "unavailable": True.
+    """
+    unique = []
+    for name in names:
+        key = normalize_food_name(name)
+        if key and key not in unique:
+            unique.append(key)
+    results = {}
+    misses = []
+    for key in unique:
+        local = FOOD_INDEX.lookup(key)
+        if local is not None:
+            results[key] = {"nutrients": local, "source": "local", "error": None}
+            continue
+        try:
+            entry = NUTRIENT_CACHE.get(key)
+        except Exception:
+            entry = MISS
+        METRICS.inc("nutri_cache_requests_total", cache="nutrient", result="miss" if entry is MISS else "hit")
+        if entry is not MISS:
+            results[key] = {"nutrients": _entry_nutrients(entry), "source": "cache", "error": None}
+            continue
+        fuzzy = _resolve_fuzzy(key)
+        if fuzzy:
+            results[key] = fuzzy
+        else:
+            misses.append(key)
+    if misses and UPSTREAMS["usda"].is_open():
+        # USDA is known to be down: answer at once instead of queueing doomed fetches
+        for key in misses:
+            results[key] = {"nutrients": {}, "source": "usda", "error": "usda is unavailable",
+                            "unavailable": True}
+        misses = []
+    if misses and deadline and deadline.expired:
+        # nothing left to wait with: don't start fetches nobody will read
+        for key in misses:
+            results[key] = {"nutrients": {}, "source": "usda", "error": "request deadline exceeded",
+                            "timeout": True}
+        misses = []
+    if misses:
+        _ensure_http_resources()
+        # the fetch gets its own budget, not the request's: one that outlives the deadline
+        # still lands in NUTRIENT_CACHE (the caller only stops waiting for it)
+        fetch = lambda key: _search_usda_food_hedged(key)
+        futures = {key: _lookup_executor.submit(NUTRIENT_CACHE.get_or_fetch, key, fetch)
+                   for key in misses}
+        for key, fut in futures.items():
+            try:
+                entry, hit = fut.result(timeout=deadline.remaining() if deadline else None)
+                if entry and entry.get("description"):
+                    FOOD_RESOLVER.add(entry["description"], "cache", key=key)
+                results[key] = {"nutrients": _entry_nutrients(entry),
+                                "source": "cache" if hit else "usda", "error": None}
+            except (FutureTimeout, DeadlineExceeded):
+                results[key] = {"nutrients": {}, "source": "usda", "error": "request deadline exceeded",
+                                "timeout": True}
+            except Exception as e:
+                results[key] = {"nutrients": {}, "source": "usda", "error": _usda_error(key, e)}
+                if isinstance(e, UpstreamUnavailable) or is_upstream_failure(e):
+                    results[key]["unavailable"] = True
+    for found in results.values():
+        status = ("timeout" if found.get("timeout") else "unavailable" if found.get("unavailable")
+                  else "error" if found["error"] else "ok" if found["nutrients"] else "not_found")
+        METRICS.inc("nutri_food_lookups_total", source="fuzzy" if found.get("match") else found["source"],
+                    status=status)
+    return results
+
+RECOMMENDER = Recommender(FOOD_INDEX)
+
+def recommend_foods(defic: Dict[str,str], weather: Dict[str,Any], diet: str = None):
+    """[(food, portion)] covering the calculate_deficiency() deficits at low energy."""
+    needs = {n: parse_amount(n, text) for n, text in defic.items()}
+    temp = (weather or {}).get("temp")
+    picks = RECOMMENDER.recommend({n: v for n, v in needs.items() if v}, temp=temp, diet=diet)
+    return [(name, f"{grams:g} g") for name, grams in picks]
 
 # ----------------- Gemini helper (in-file) -----------------
 DEFAULT_GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
 
+_gemini_client = None
+_gemini_client_pid = None
+_gemini_lock = threading.Lock()
+_genai_module = None
+
+def _genai():
+    """The google.genai module, imported on first use; None when it is not installed."""
+    global _genai_module
+    if _genai_module is None and GENAI_INSTALLED:
+        with _gemini_lock:
+            if _genai_module is None:
+                from google import genai
+                _genai_module = genai
+    return _genai_module
+
 def _ensure_gemini_client():
+    """One long-lived client (and connection pool) per worker process."""
+    global _gemini_client, _gemini_client_pid
     if not GEMINI_API_KEY:
         raise RuntimeError("GEMINI_API_KEY not set in environment (.env or system).")
+    genai = _genai()
     if genai is None:
         raise RuntimeError("google-genai SDK not installed (pip install google-genai).")
-    # Initialize client explicitly
-    client = genai.Client(api_key=GEMINI_API_KEY)
-    return client
+    pid = os.getpid()
+    if _gemini_client is None or _gemini_client_pid != pid:
+        with _gemini_lock:
+            if _gemini_client is None or _gemini_client_pid != pid:
+                http_options = {"base_url": GEMINI_BASE_URL} if GEMINI_BASE_URL else None
+                _gemini_client = genai.Client(api_key=GEMINI_API_KEY, http_options=http_options)
+                _gemini_client_pid = pid
+    return _gemini_client
+
+def _gemini_config(deadline: Deadline = None, **config) -> Dict[str, Any]:
+    """generate_content config; with a deadline the call may only take the time that is left."""
+    if deadline is not None:
+        config["http_options"] = {"timeout": int(deadline.timeout(what="Gemini") * 1000)}
+    return config or None
 
 def _format_gemini_prompt(profile: Dict[str,Any], totals: Dict[str,str],
                           deficiencies: Dict[str,str], weather: Dict[str,Any],
@@ -205,12 +598,61 @@ def _extract_json_from_text(text: str) -> Dict[str,Any]:
         pass
     return {"summary": text.strip(), "meal_plan": [], "advice": ""}
 
-def consult_with_gemini(profile: Dict[str,Any], totals: Dict[str,str],
-                        deficiencies: Dict[str,str], weather: Dict[str,Any], lang: str="en", model: str=DEFAULT_GEMINI_MODEL) -> Dict[str,Any]:
+# Consultations are cached per canonical input: identical or near-identical requests
+# (same profile, totals/deficiencies rounded to 2 significant digits, same weather bucket)
+# reuse the earlier answer instead of spending Gemini quota.
+CONSULT_CACHE = TTLCache(
+    ttl=float(os.getenv("CONSULT_CACHE_TTL", "3600")),
+    maxsize=int(os.getenv("CONSULT_CACHE_MAX", "512")),
+)
+
+def _round_amount(value: Any):
+    """'6.36 g' -> '6.4 g', 1093.2 -> 1100.0; leaves anything unparseable as-is."""
+    text = str(value).strip()
+    m = re.match(r"^(-?\d+(?:\.\d+)?)\s*(.*)$", text)
+    if not m:
+        return text.lower()
+    num = float(m.group(1))
+    rounded = float(f"{num:.2g}") if num else 0.0
+    return f"{rounded} {m.group(2).lower()}".strip()
+
+def _consult_cache_key(profile: Dict[str,Any], totals: Dict[str,str], deficiencies: Dict[str,str],
+                       weather: Dict[str,Any], lang: str, model: str) -> str:
+    def num(v, step):
+        try:
+            return round(float(v) / step) * step
+        except Exception:
+            return None
+    weather = weather or {}
+    canonical = {
+        "profile": {
+            "age": num(profile.get("age"), 1),
+            "gender": str(profile.get("gender", "")).lower(),
+            "height_cm": num(profile.get("height_cm"), 1),
+            "weight_kg": num(profile.get("weight_kg"), 1),
+            "activity": str(profile.get("activity") or "").lower(),
+        },
+        "totals": {k: _round_amount(v) for k, v in (totals or {}).items()},
+        "deficiencies": {k: _round_amount(v) for k, v in (deficiencies or {}).items()},
+        "weather": {
+            "condition": str(weather.get("condition") or "").lower(),
+            "temp": num(weather.get("temp"), 2),
+            "humidity": num(weather.get("humidity"), 10),
+        },
+        "lang": lang or "en",
+        "model": model,
+    }
+    return hashlib.sha256(json.dumps(canonical, sort_keys=True).encode("utf-8")).hexdigest()
+
+def _consult_with_gemini_uncached(profile: Dict[str,Any], totals: Dict[str,str],
+                                  deficiencies: Dict[str,str], weather: Dict[str,Any], lang: str, model: str,
+                                  deadline: Deadline = None) -> Dict[str,Any]:
     client = _ensure_gemini_client()
     prompt = _format_gemini_prompt(profile, totals, deficiencies, weather, lang=lang)
     # call generate_content as in SDK quickstart
-    resp = client.models.generate_content(model=model, contents=prompt)
+    resp = call_upstream("gemini", lambda: client.models.generate_content(
+        model=model, contents=prompt, config=_gemini_config(deadline)), deadline)
+    _record_gemini_usage(getattr(resp, "usage_metadata", None), "consult")
     raw_text = ""
     try:
         raw_text = resp.text if hasattr(resp, "text") else str(resp)
@@ -219,10 +661,291 @@ def consult_with_gemini(profile: Dict[str,Any], totals: Dict[str,str],
     parsed = _extract_json_from_text(raw_text)
     return {"summary": parsed.get("summary",""), "meal_plan": parsed.get("meal_plan",[]), "advice": parsed.get("advice",""), "raw": raw_text}
 
+def consult_with_gemini(profile: Dict[str,Any], totals: Dict[str,str],
+                        deficiencies: Dict[str,str], weather: Dict[str,Any], lang: str="en", model: str=DEFAULT_GEMINI_MODEL,
+                        deadline: Deadline = None) -> Dict[str,Any]:
+    key = _consult_cache_key(profile, totals, deficiencies, weather, lang, model)
+    return CONSULT_CACHE.get_or_load(
+        key, lambda _key: _consult_with_gemini_uncached(profile, totals, deficiencies, weather, lang, model, deadline),
+        timeout=deadline.remaining() if deadline else None)
+
+# Schema-constrained output for the streaming consultation: Gemini emits the fields
+# in this order, so summary, each meal and the advice can be shown as they complete.
+CONSULT_RESPONSE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "summary": {"type": "STRING"},
+        "meal_plan": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {
+                    "meal": {"type": "STRING"},
+                    "name": {"type": "STRING"},
+                    "items": {"type": "ARRAY", "items": {"type": "STRING"}},
+                },
+                "required": ["meal", "name", "items"],
+                "property_ordering": ["meal", "name", "items"],
+            },
+        },
+        "advice": {"type": "STRING"},
+    },
+    "required": ["summary", "meal_plan", "advice"],
+    "property_ordering": ["summary", "meal_plan", "advice"],
+}
+
+def stream_consult_with_gemini(profile: Dict[str,Any], totals: Dict[str,str],
+                               deficiencies: Dict[str,str], weather: Dict[str,Any], lang: str="en",
+                               model: str=DEFAULT_GEMINI_MODEL, deadline: Deadline = None) -> Iterator[tuple]:
+    """
+    Streaming consult_with_gemini. Yields ("summary", str), ("meal", {...}) per meal_plan
+    entry, ("advice", str) as each part of the JSON answer completes, then ("done", result)
+    with the same dict consult_with_gemini returns. Cached consultations are replayed at once.
+    If `deadline` runs out first, the stream stops and the result holds what was parsed so
+    far, with "partial": True (and is not cached).
+    """
+    key = _consult_cache_key(profile, totals, deficiencies, weather, lang, model)
+    result = CONSULT_CACHE.get(key)
+    if result is None:
+        client = _ensure_gemini_client()
+        prompt = _format_gemini_prompt(profile, totals, deficiencies, weather, lang=lang)
+        config = _gemini_config(deadline, response_mime_type="application/json",
+                                response_schema=CONSULT_RESPONSE_SCHEMA)
+        with UPSTREAMS["gemini"].guard(timeouts_count(deadline)), timed_upstream("gemini"):
+            stream = client.models.generate_content_stream(model=model, contents=prompt, config=config)
+            parser = IncrementalObjectParser(stream_arrays=("meal_plan",))
+            raw_parts = []
+            partial = False
+            streamed_summary = False
+            usage = None
+            try:
+                for chunk in stream:
+                    # every chunk may carry the running usage; the last one has the totals
+                    usage = getattr(chunk, "usage_metadata", None) or usage
+                    if deadline is not None and deadline.expired:
+                        partial = True
+                        break
+                    try:
+                        text = chunk.text
+                    except Exception:
+                        text = None
+                    if not text:
+                        continue
+                    raw_parts.append(text)
+                    for kind, field, value in parser.feed(text):
+                        if kind == "item":
+                            yield ("meal", value)
+                        elif field in ("summary", "advice"):
+                            streamed_summary = streamed_summary or field == "summary"
+                            yield (field, value)
+            except Exception:
+                # the SDK's own timeout (from the deadline) ends the stream with an error
+                if deadline is None or not deadline.expired:
+                    raise
+                partial = True
+            finally:
+                close = getattr(stream, "close", None)
+                if close:
+                    close()
+                _record_gemini_usage(usage, "consult")
+        raw_text = "".join(raw_parts)
+        if partial:
+            parsed = parser.obj
+        else:
+            parsed = parser.result() or _extract_json_from_text(raw_text)
+        result = {"summary": parsed.get("summary",""), "meal_plan": parsed.get("meal_plan",[]), "advice": parsed.get("advice",""), "raw": raw_text}
+        if partial:
+            result["partial"] = True
+        elif parser.complete:
+            CONSULT_CACHE.set(key, result)
+        elif not streamed_summary:
+            # not valid JSON after all: send what the fallback parser made of it
+            yield ("summary", result["summary"])
+    else:
+        yield ("summary", result["summary"])
+        for meal in result["meal_plan"]:
+            yield ("meal", meal)
+        yield ("advice", result["advice"])
+    yield ("done", result)
+
+# ----------------- STATIC ASSETS -----------------
+# Fingerprinted, precompressed copies of static/ (assets.py); the page refers to them
+# with asset_url() and is rendered once per process.
+ASSETS = Assets(app.static_folder)
+ASSET_CACHE_CONTROL = "public, max-age=31536000, immutable"
+JSON_COMPRESS_MIN_BYTES = int(os.getenv("JSON_COMPRESS_MIN_BYTES", "1024"))
+_page_cache: Dict[str, Precompressed] = {}
+
+@app.template_global()
+def asset_url(name: str) -> str:
+    return url_for("static", filename=ASSETS.path(name))
+
+def _home_page() -> Precompressed:
+    page = _page_cache.get("home")
+    if page is None or app.debug:
+        page = _page_cache["home"] = Precompressed(render_template("nutri.html").encode("utf-8"))
+    return page
+
+def _precompressed_response(content: Precompressed, mimetype: str, cache_control: str) -> Response:
+    """`content` in the best encoding the client accepts, or 304 if it already has that version."""
+    encoding, body = content.select(request.headers.get("Accept-Encoding", ""))
+    etag = content.etag(encoding)
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype=mimetype)
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = cache_control
+    response.vary.add("Accept-Encoding")
+    return response
+
+# ----------------- STARTUP -----------------
+# gunicorn.conf.py calls warm_up() once before serving: in the master with preload_app
+# (workers then share the loaded modules and data copy-on-write), else in each worker.
+# Workers save the weather and consultation caches on exit; the next start loads them.
+CACHE_SNAPSHOT_PATH = os.getenv("CACHE_SNAPSHOT_PATH",
+                                os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache_snapshot.json"))
+SNAPSHOT_CACHES = {"weather": WEATHER_CACHE, "consult": CONSULT_CACHE}
+
+def save_cache_snapshot() -> int:
+    if not CACHE_SNAPSHOT_PATH:
+        return 0
+    return save_snapshot(CACHE_SNAPSHOT_PATH, SNAPSHOT_CACHES)
+
+def warm_up() -> Dict[str, Any]:
+    """Load everything the first requests would otherwise wait for; returns what was done."""
+    started = time.perf_counter()
+    done = {"snapshot_entries": load_snapshot(CACHE_SNAPSHOT_PATH, SNAPSHOT_CACHES) if CACHE_SNAPSHOT_PATH else 0}
+    _resolver_sync["at"] = 0.0
+    _sync_resolver_with_cache()
+    done["resolver_names"] = len(FOOD_RESOLVER)
+    with app.test_request_context("/"):
+        done["assets"] = len(ASSETS.build())
+        _home_page()
+    _ensure_http_resources()    # imports requests, so preloaded workers share it
+    done["genai"] = _genai() is not None
+    done["seconds"] = round(time.perf_counter() - started, 3)
+    return done
+
 # ----------------- ROUTES -----------------
+@app.before_request
+def _start_request_metrics():
+    g.timer = RequestTimer()
+    g.endpoint = request.endpoint or "other"    # unmatched URLs share one label
+    METRICS.add("nutri_requests_in_flight", 1, endpoint=g.endpoint)
+
+@app.after_request
+def _finish_request_metrics(response):
+    timer, endpoint, status = g.timer, g.endpoint, response.status_code
+    # phases so far; a streamed body is not included
+    response.headers["Server-Timing"] = timer.header()
+
+    def done():
+        METRICS.add("nutri_requests_in_flight", -1, endpoint=endpoint)
+        METRICS.inc("nutri_requests_total", endpoint=endpoint, status=status)
+        METRICS.observe("nutri_request_duration_seconds", timer.elapsed(), endpoint=endpoint)
+
+    response.call_on_close(done)
+    return response
+
+@app.after_request
+def _compress_json(response):
+    """gzip/br for JSON bodies of at least JSON_COMPRESS_MIN_BYTES (e.g. /analyze, /consult)."""
+    if (response.mimetype != "application/json" or response.direct_passthrough or response.is_streamed
+            or "Content-Encoding" in response.headers
+            or (response.content_length or 0) < JSON_COMPRESS_MIN_BYTES):
+        return response
+    encoding = negotiate(request.headers.get("Accept-Encoding", ""), ENCODINGS)
+    response.vary.add("Accept-Encoding")
+    if encoding:
+        response.set_data(compress(response.get_data(), (encoding,), fast=True)[encoding])
+        response.headers["Content-Encoding"] = encoding
+    return response
+
 @app.route("/")
 def home():
-    return render_template("nutri.html")
+    """The pre-rendered page: revalidated on every visit (ETag), small because its assets are cached."""
+    return _precompressed_response(_home_page(), "text/html", "no-cache")
+
+@app.route("/static/dist/<path:filename>")
+def fingerprinted_asset(filename):
+    """static/dist/ when nginx is not in front (it serves these files itself)."""
+    content = ASSETS.get(filename)
+    if content is None:
+        return jsonify({"error": "not found"}), 404
+    mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    return _precompressed_response(content, mimetype, ASSET_CACHE_CONTROL)
+
+@app.route("/metrics")
+def prometheus_metrics():
+    """Prometheus text format, summed over all workers (at most METRICS_FLUSH_INTERVAL s behind)."""
+    extra = [("nutri_upstream_circuit_open", "gauge", "1 while the upstream's circuit breaker is open",
+              {"upstream": name}, 0 if state["state"] == "closed" else 1)
+             for name, state in UPSTREAMS.states().items()]
+    extra += [("nutri_consult_jobs", "gauge", "Consultation jobs in the shared queue, by status",
+               {"status": status}, count)
+              for status, count in CONSULT_JOBS.stats()["all"].items()]
+    return Response(METRICS.render(extra), mimetype="text/plain; version=0.0.4")
+
+@app.route("/upstreams")
+def upstream_status():
+    """Circuit breaker state of each upstream API (shared by all workers)."""
+    return jsonify({"ok": True, "upstreams": UPSTREAMS.states()})
+
+@app.route("/foods/suggest")
+def suggest_foods():
+    """Autocomplete for the food name inputs: ranked local/cached matches, no USDA calls."""
+    q = (request.args.get("q") or "").strip()
+    try:
+        limit = max(1, min(int(request.args.get("limit") or 8), 25))
+    except Exception:
+        limit = 8
+    if len(q) < 2:
+        return jsonify({"ok": True, "suggestions": []})
+    _sync_resolver_with_cache()
+    found = FOOD_RESOLVER.search(q, limit=limit)
+    return jsonify({"ok": True, "suggestions": [{"name": c["name"], "source": c["source"], "score": c["score"]} for c in found]})
+
+def _parse_items(items) -> list:
+    """[(name, grams)] from a request's [{name, qty (grams)}], skipping blank names and non-positive amounts."""
+    parsed = []
+    for it in items if isinstance(items, list) else []:
+        if not isinstance(it, dict):
+            continue
+        name = (it.get("name") or "").strip()
+        try:
+            qty_g = float(it.get("qty") or 0)
+        except Exception:
+            qty_g = 0.0
+        if not name or qty_g <= 0:
+            continue
+        parsed.append((name, qty_g))
+    return parsed
+
+def _food_status(name: str, qty_g: float, found: Dict[str, Any]) -> Dict[str, Any]:
+    """Per-item entry of an /analyze reply for a lookup_foods() result; "status" is
+    ok, not_found, error, unavailable or timeout."""
+    status = {"name": name, "qty": qty_g, "source": found["source"]}
+    if found.get("timeout"):
+        status["status"] = "timeout"
+    elif found.get("unavailable"):
+        status.update(status="unavailable", error=found["error"])
+    elif found["error"]:
+        status.update(status="error", error=found["error"])
+    elif not found["nutrients"]:
+        status["status"] = "not_found"
+    else:
+        status["status"] = "ok"
+        if found.get("match"):
+            status["match"] = found["match"]
+    return status
+
+def _scaled_nutrients(per_100g: Dict[str, float], qty_g: float) -> Dict[str, float]:
+    # nutrients are already canonical per 100 g (mg, Energy in kcal)
+    scale = qty_g / 100.0
+    return {key: amount * scale for key, amount in per_100g.items()}
 
 @app.route("/analyze", methods=["POST"])
 def analyze():
@@ -238,65 +961,72 @@ def analyze():
         weight = float(data.get("weight") or 0)
     except Exception:
         weight = 0.0
+    diet = (data.get("diet") or "").strip().lower() or None
 
     if not city:
         return jsonify({"error": "City required"}), 400
+    missing_keys = _missing_keys_response()
+    if missing_keys:
+        return missing_keys
+    if diet and diet not in DIETS:
+        return jsonify({"error": f"Unknown diet: {diet} (use one of {', '.join(sorted(DIETS))})"}), 400
+
+    deadline = request_deadline(ANALYZE_DEADLINE)
+    partial = False
+    unavailable = set()
+    try:
+        with phase("weather"):
+            weather = get_weather(city, deadline)
+    except DeadlineExceeded:
+        weather, partial = None, True
+    except UpstreamUnavailable:
+        # answer without weather instead of failing the whole analysis
+        weather = None
+        unavailable.add("weather")
+    else:
+        if not weather:
+            return jsonify({"error": f"Weather data not found for city: {city}"}), 404
 
-    weather = get_weather(city)
-    if not weather:
-        return jsonify({"error": f"Weather data not found for city: {city}"}), 404
+    parsed_items = _parse_items(items)
+    METRICS.observe("nutri_analyze_items", len(parsed_items))
+    with phase("foods"):
+        lookups = lookup_foods((name for name, _ in parsed_items), deadline)
 
     totals_mg = {}
-    # items: list of {name, qty (grams)}
-    for it in items:
-        name = (it.get("name") or "").strip()
-        try:
-            qty_g = float(it.get("qty") or 0)
-        except Exception:
-            qty_g = 0.0
-        if not name or qty_g <= 0:
-            continue
-        nut = get_food_nutrients(name)
-        for full_name, (val, unit) in nut.items():
-            try:
-                actual = float(val) * (qty_g / 100.0)  # convert per-100g nutrient
-            except Exception:
-                continue
-            matched_key = None
-            low = full_name.lower()
-            for friendly, substrings in NUTRIENT_KEY_MAP.items():
-                if any(s in low for s in substrings):
-                    matched_key = friendly
-                    break
-            if not matched_key:
-                continue
-            amount_mg = convert_to_mg(actual, unit)
-            totals_mg[matched_key] = totals_mg.get(matched_key, 0.0) + amount_mg
+    item_status = []
+    for name, qty_g in parsed_items:
+        found = lookups[normalize_food_name(name)]
+        status = _food_status(name, qty_g, found)
+        item_status.append(status)
+        if status["status"] == "timeout":
+            partial = True
+        elif status["status"] == "unavailable":
+            # not a zero-nutrient food: its nutrients are simply unknown right now
+            unavailable.add("usda")
+        elif status["status"] == "ok":
+            for key, amount in _scaled_nutrients(found["nutrients"], qty_g).items():
+                totals_mg[key] = totals_mg.get(key, 0.0) + amount
 
     defic = calculate_deficiency(totals_mg, gender, height, weight)
-    rec = recommend_foods(defic, weather)
+    with phase("recommend"):
+        rec = recommend_foods(defic, weather, diet)
 
-    human_totals = {}
-    for k, v in totals_mg.items():
-        if k in ("Protein", "Fiber"):
-            human_totals[k] = f"{round(v/1000.0, 2)} g"
-        else:
-            human_totals[k] = f"{round(v, 2)} mg"
+    human_totals = {k: format_amount(k, v) for k, v in totals_mg.items()}
 
     return jsonify({
         "weather": weather,
         "total_nutrients": human_totals,
         "deficient": defic,
-        "recommendations": rec
+        "recommendations": rec,
+        "items": item_status,
+        # true when the deadline cut off the weather or some foods (see "items")
+        "partial": partial,
+        # upstreams that failed or whose circuit breaker is open ("usda", "weather")
+        "unavailable": sorted(unavailable)
     })
 
-@app.route("/consult", methods=["POST"])
-def consult():
-    """
-    Accepts JSON with profile + totals + deficient + weather + lang (same as frontend).
-    If Gemini is not configured, returns an error explaining what's missing.
-    """
-    data = request.get_json() or {}
+def _consult_inputs(data: Dict[str, Any]):
+    """(profile, totals, deficiencies, weather, lang) from a /consult request body."""
     # profile fields (frontend should pass age/activity if available)
     try:
         profile = {
@@ -313,24 +1043,320 @@ def consult():
     deficiencies = data.get("deficient", {})
     weather = data.get("weather", {})
     lang = data.get("lang", "en")
+    return profile, totals, deficiencies, weather, lang
+
+# ----------------- BATCH ANALYSIS -----------------
+BATCH_CHUNK_RECORDS = int(os.getenv("BATCH_CHUNK_RECORDS", "500"))
+
+def _iter_batch_records() -> Iterator[Dict[str, Any]]:
+    """Records from an NDJSON body (one per line, read as a stream) or a JSON {"records": [...]} body."""
+    if request.mimetype in ("application/x-ndjson", "application/jsonl"):
+        for line in request.stream:
+            line = line.strip()
+            if line:
+                try:
+                    yield json.loads(line)
+                except Exception as e:
+                    yield {"_error": f"invalid JSON line: {e}"}
+        return
+    data = request.get_json(silent=True) or {}
+    yield from (data.get("records", []) if isinstance(data, dict) else data)
+
+def analyze_batch_chunk(records, vectors: Dict[str, Any], deadline: Deadline = None) -> Iterator[Dict[str, Any]]:
+    """
+    bulk_analyze.analyze_records with foods resolved like /analyze (USDA for the misses,
+    within `deadline`; the ones it cut off are reported under "timeout").
+    """
+    def resolve(keys):
+        return {key: None if found.get("timeout") else found["nutrients"]
+                for key, found in lookup_foods(keys, deadline).items()}
+    return analyze_records(records, vectors, resolve)
+
+@app.route("/analyze/batch", methods=["POST"])
+def analyze_batch():
+    """
+    Bulk analysis for integrations. Body: NDJSON (Content-Type: application/x-ndjson),
+    one record per line, or JSON {"records": [...]}. A record is
+    {id, gender, height, weight, meals: [{date, items: [{name, qty}]}]}.
+    Streams one NDJSON result line per record: {id, days: [{date, total_nutrients, deficient}], unresolved}.
+    Unique foods are resolved once per chunk of BATCH_CHUNK_RECORDS records. USDA is only
+    asked within one BATCH_DEADLINE for the whole request (X-Request-Deadline-Ms); foods
+    still unanswered after it count as zero and are listed under "timeout".
+    """
+    deadline = request_deadline(BATCH_DEADLINE)
+
+    def results():
+        vectors: Dict[str, Any] = {}
+        chunk = []
+        for rec in _iter_batch_records():
+            chunk.append(rec)
+            if len(chunk) >= BATCH_CHUNK_RECORDS:
+                for res in analyze_batch_chunk(chunk, vectors, deadline):
+                    yield json.dumps(res, ensure_ascii=False) + "\n"
+                chunk = []
+        if chunk:
+            for res in analyze_batch_chunk(chunk, vectors, deadline):
+                yield json.dumps(res, ensure_ascii=False) + "\n"
+
+    return Response(stream_with_context(results()), mimetype="application/x-ndjson")
+
+# ----------------- MEAL LOG -----------------
+# Per-user daily log (meal_log.py): adding or removing items only looks up those items;
+# the day's deficiencies and recommendations are re-derived from its running totals.
+MEAL_LOG = MealLog.from_env()
+# a client's log is only reachable with the token it got when the log was created
+LOG_TOKEN_HEADER = "X-Log-Token"
+
+def _log_request(data: Dict[str, Any], create: bool = False):
+    """
+    (user_id, new token, day, error response) for a /log request: the day from its body or
+    query string, the user from its X-Log-Token header (a "user_id" the request names must be
+    that user). With `create`, a request without either starts a new user and "new token" is
+    that user's token (None otherwise).
+    """
+    try:
+        day = datetime.date.fromisoformat(str(data.get("day") or time.strftime("%Y-%m-%d"))).isoformat()
+    except ValueError:
+        return None, None, None, (jsonify({"error": "day must be a date, YYYY-MM-DD"}), 400)
+    token = request.headers.get(LOG_TOKEN_HEADER, "").strip()
+    claimed = str(data.get("user_id") or "").strip()
+    if token:
+        user_id = MEAL_LOG.user_for_token(token)
+        if user_id is None or (claimed and claimed != user_id):
+            return None, None, None, (jsonify({"error": "log token does not match this user"}), 403)
+        return user_id, None, day, None
+    if claimed or not create:
+        return None, None, None, (jsonify({"error": f"{LOG_TOKEN_HEADER} header required"}), 401)
+    user_id, token = MEAL_LOG.create_user()
+    return user_id, token, day, None
+
+def _log_weather(city: str, deadline: Deadline = None):
+    """Weather for the recommendations, None when there is no city or WeatherAPI cannot answer."""
+    if not city or not WEATHER_API_KEY:
+        return None
+    try:
+        with phase("weather"):
+            return get_weather(city, deadline)
+    except (DeadlineExceeded, UpstreamUnavailable):
+        return None
+
+def _log_deriver(user_id: str, weather: Dict[str, Any]):
+    """derive(totals, profile) for MealLog: the /analyze reply fields computed from a day's totals."""
+    def derive(totals_mg: Dict[str, float], profile: Dict[str, Any]) -> Dict[str, Any]:
+        defic = calculate_deficiency(totals_mg, profile.get("gender") or "male",
+                                     float(profile.get("height") or 0), float(profile.get("weight") or 0))
+        return {
+            "user_id": user_id,
+            "weather": weather,
+            "total_nutrients": {k: format_amount(k, v) for k, v in totals_mg.items()},
+            "deficient": defic,
+            "recommendations": recommend_foods(defic, weather, profile.get("diet")),
+        }
+    return derive
+
+@app.route("/log/items", methods=["POST"])
+def add_log_items():
+    """
+    Add foods to the caller's day. Body: {"day" (YYYY-MM-DD, default today on the server),
+    "items": [{name, qty (grams)}]} plus optional gender/height/weight/diet/city, which are
+    remembered for the user. Without an X-Log-Token header a new log is started and its
+    "token" returned (send it as X-Log-Token on later /log calls).
+    Returns the day's state (as /analyze: total_nutrients, deficient, recommendations, weather)
+    and one entry per sent item; logged items carry their "id". Items whose lookup timed out or
+    whose upstream is unavailable are not logged (send them again).
+    """
+    data = request.get_json(silent=True) or {}
+    profile = {k: data[k] for k in PROFILE_FIELDS if data.get(k) not in (None, "")}
+    try:
+        for k in ("height", "weight"):
+            if k in profile:
+                profile[k] = float(profile[k])
+    except (TypeError, ValueError):
+        return jsonify({"error": "height and weight must be numbers"}), 400
+    if "diet" in profile:
+        profile["diet"] = str(profile["diet"]).strip().lower()
+        if profile["diet"] not in DIETS:
+            return jsonify({"error": f"Unknown diet: {profile['diet']} (use one of {', '.join(sorted(DIETS))})"}), 400
+    user_id, new_token, day, error = _log_request(data, create=True)
+    if error:
+        return error
+
+    deadline = request_deadline(ANALYZE_DEADLINE)
+    parsed_items = _parse_items(data.get("items", []))
+    with phase("foods"):
+        lookups = lookup_foods((name for name, _ in parsed_items), deadline) if parsed_items else {}
+    logged, logged_status, item_status, partial, unavailable = [], [], [], False, set()
+    for name, qty_g in parsed_items:
+        found = lookups[normalize_food_name(name)]
+        status = _food_status(name, qty_g, found)
+        item_status.append(status)
+        if status["status"] == "timeout":
+            partial = True
+        elif status["status"] == "unavailable":
+            unavailable.add("usda")
+        elif status["status"] in ("ok", "not_found"):
+            logged.append(dict(status, nutrients=_scaled_nutrients(found["nutrients"], qty_g)))
+            logged_status.append(status)
+
+    weather = _log_weather(profile.get("city") or MEAL_LOG.profile(user_id).get("city"), deadline)
+    with phase("log"):
+        state, ids = MEAL_LOG.add(user_id, day, logged, _log_deriver(user_id, weather), profile)
+    for status, item_id in zip(logged_status, ids):
+        status["id"] = item_id
+    reply = dict(state, items=item_status, partial=partial, unavailable=sorted(unavailable))
+    if new_token:
+        reply["token"] = new_token
+    return jsonify(reply)
+
+@app.route("/log/items/<int:item_id>", methods=["DELETE"])
+def delete_log_item(item_id):
+    """Remove one of the caller's logged items; returns its day's updated state."""
+    user_id, _token, _day, error = _log_request(request.args)
+    if error:
+        return error
+    weather = _log_weather(MEAL_LOG.profile(user_id).get("city"), request_deadline(ANALYZE_DEADLINE))
+    with phase("log"):
+        state = MEAL_LOG.remove(user_id, item_id, _log_deriver(user_id, weather))
+    if state is None:
+        return jsonify({"error": "item not found"}), 404
+    return jsonify(state)
+
+@app.route("/log/today")
+def log_today():
+    """
+    The stored state of the caller's day (?day=YYYY-MM-DD, default today), one row read
+    without any lookup or recomputation. ?items=1 also lists the logged items.
+    """
+    user_id, _token, day, error = _log_request(request.args)
+    if error:
+        return error
+    state = MEAL_LOG.day(user_id, day)
+    if state is None:
+        # nothing logged yet: what an empty day looks like for this profile
+        empty = dict(_log_deriver(user_id, None)({}, MEAL_LOG.profile(user_id)), day=day, item_count=0)
+        state = json.dumps(empty, ensure_ascii=False)
+    if request.args.get("items") in ("1", "true"):
+        return jsonify(dict(json.loads(state), items=MEAL_LOG.items(user_id, day)))
+    return Response(state, mimetype="application/json")
+
+@app.route("/consult", methods=["POST"])
+def consult():
+    """
+    Accepts JSON with profile + totals + deficient + weather + lang (same as frontend).
+    If Gemini is not configured, returns an error explaining what's missing.
+    """
+    data = request.get_json() or {}
+    profile, totals, deficiencies, weather, lang = _consult_inputs(data)
 
     # Make sure Gemini SDK & key exist
-    if genai is None:
+    if not GENAI_INSTALLED:
         return jsonify({"ok": False, "error": "Gemini SDK (google-genai) not installed on server. Run: pip install google-genai"}), 500
     if not GEMINI_API_KEY:
         return jsonify({"ok": False, "error": "GEMINI_API_KEY not set in environment (.env or system env)."}), 500
 
+    deadline = request_deadline(CONSULT_DEADLINE)
     try:
-        consult_result = consult_with_gemini(profile, totals, deficiencies, weather, lang=lang)
+        with phase("gemini"):
+            consult_result = consult_with_gemini(profile, totals, deficiencies, weather, lang=lang, deadline=deadline)
         return jsonify({"ok": True, "consult": consult_result})
+    except UpstreamUnavailable as e:
+        return _unavailable_response(e)
     except Exception as e:
+        if deadline.expired:
+            return jsonify({"ok": False, "error": "Consultation did not finish within the request deadline",
+                            "timeout": True}), 504
         return jsonify({"ok": False, "error": str(e)}), 500
 
+@app.route("/consult/stream", methods=["POST"])
+def consult_stream():
+    """
+    Streaming variant of /consult. Same request body; the consultation is sent as
+    Server-Sent Events: "summary" {text}, one "meal" {meal} per meal_plan entry,
+    "advice" {text}, then "done" {consult} or "error" {error}. A consult cut short by the
+    request deadline has "partial": true.
+    """
+    data = request.get_json() or {}
+    profile, totals, deficiencies, weather, lang = _consult_inputs(data)
+
+    # Make sure Gemini SDK & key exist
+    if not GENAI_INSTALLED:
+        return jsonify({"ok": False, "error": "Gemini SDK (google-genai) not installed on server. Run: pip install google-genai"}), 500
+    if not GEMINI_API_KEY:
+        return jsonify({"ok": False, "error": "GEMINI_API_KEY not set in environment (.env or system env)."}), 500
+
+    deadline = request_deadline(CONSULT_DEADLINE)
+
+    def events():
+        try:
+            for kind, value in stream_consult_with_gemini(profile, totals, deficiencies, weather, lang=lang,
+                                                          deadline=deadline):
+                if kind == "meal":
+                    yield _sse("meal", {"meal": value})
+                elif kind == "done":
+                    yield _sse("done", {"consult": value})
+                else:
+                    yield _sse(kind, {"text": value})
+        except Exception as e:
+            yield _sse("error", {"error": str(e)})
+
+    return _sse_response(events())
+
+# ----------------- Consultation jobs -----------------
+# Bounded queue + fixed worker pool in front of Gemini, see consult_jobs.py.
+CONSULT_JOB_MAX_WAIT = 25.0
+
+def _run_consult_job(payload: Dict[str, Any]) -> Dict[str, Any]:
+    profile, totals, deficiencies, weather, lang = _consult_inputs(payload)
+    return consult_with_gemini(profile, totals, deficiencies, weather, lang=lang,
+                               deadline=Deadline(CONSULT_DEADLINE))
+
+CONSULT_JOBS = JobQueue.from_env(_run_consult_job)
+
+@app.route("/consult/jobs", methods=["POST"])
+def submit_consult_job():
+    """
+    Queue a consultation (same body as /consult, plus optional "priority": high|normal|low).
+    Returns 202 with a job id, or 429 + Retry-After when the queue is full.
+    """
+    data = request.get_json() or {}
+    if not GENAI_INSTALLED:
+        return jsonify({"ok": False, "error": "Gemini SDK (google-genai) not installed on server. Run: pip install google-genai"}), 500
+    if not GEMINI_API_KEY:
+        return jsonify({"ok": False, "error": "GEMINI_API_KEY not set in environment (.env or system env)."}), 500
+    priority = PRIORITIES.get(str(data.get("priority", "normal")).lower(), PRIORITIES["normal"])
+    try:
+        job_id = CONSULT_JOBS.submit(data, priority=priority)
+    except QueueFull as e:
+        resp = jsonify({"ok": False, "error": str(e), "retry_after": e.retry_after})
+        resp.headers["Retry-After"] = str(e.retry_after)
+        return resp, 429
+    return jsonify({"ok": True, "job_id": job_id, "status_url": f"/consult/jobs/{job_id}"}), 202
+
+@app.route("/consult/jobs/stats")
+def consult_job_stats():
+    return jsonify({"ok": True, "stats": CONSULT_JOBS.stats()})
+
+@app.route("/consult/jobs/<job_id>")
+def get_consult_job(job_id):
+    """Job status; with ?wait=N (seconds, max 25) blocks until the job finishes or N runs out."""
+    try:
+        wait = min(float(request.args.get("wait") or 0), CONSULT_JOB_MAX_WAIT)
+    except Exception:
+        wait = 0.0
+    job = CONSULT_JOBS.wait(job_id, wait) if wait > 0 else CONSULT_JOBS.get(job_id)
+    if job is None:
+        return jsonify({"ok": False, "error": "Unknown job id"}), 404
+    return jsonify({"ok": True, "job": job})
+
 # ----------------- Gemini Chatbot -----------------
 
-def _format_gemini_chat_prompt(message: str, analysis: Dict[str, Any], lang: str = "en") -> str:
+CHAT_SESSIONS = ChatSessionStore.from_env()
+
+def _format_gemini_chat_prompt(message: str, analysis: Dict[str, Any], lang: str = "en",
+                               session: Dict[str, Any] = None) -> str:
     """
-    Formats a prompt for the Gemini chat model, including nutrition context.
+    Formats a prompt for the Gemini chat model, including nutrition context and,
+    for a chat session, its summary and recent turns.
     """
     lines = []
     lines.append("You are a helpful and friendly AI Dietician Assistant.")
@@ -346,6 +1372,13 @@ def _format_gemini_chat_prompt(message: str, analysis: Dict[str, Any], lang: str
         for k, v in analysis["deficient"].items():
             lines.append(f"- {k}: need {v} more")
     lines.append("\n--- END CONTEXT ---")
+    if session and session.get("summary"):
+        lines.append("\n--- EARLIER IN THIS CONVERSATION (abridged) ---")
+        lines.append(session["summary"])
+    if session and session.get("turns"):
+        lines.append("\n--- RECENT CONVERSATION ---")
+        for role, text in session["turns"]:
+            lines.append(f"{'User' if role == 'user' else 'Assistant'}: {text}")
     lines.append("\nNow, please answer the user's question concisely and helpfully.")
     if lang and lang != "en":
         lines.append(f"Respond in the following language: {lang}")
@@ -353,13 +1386,16 @@ def _format_gemini_chat_prompt(message: str, analysis: Dict[str, Any], lang: str
     return "\n".join(lines)
 
 
-def call_gemini_chat(message: str, analysis: Dict[str, Any], lang: str="en", model: str=DEFAULT_GEMINI_MODEL) -> str:
+def call_gemini_chat(message: str, analysis: Dict[str, Any], lang: str="en", model: str=DEFAULT_GEMINI_MODEL,
+                     session: Dict[str, Any] = None, deadline: Deadline = None) -> str:
     """
     Calls the Gemini API with a formatted chat prompt.
     """
     client = _ensure_gemini_client()
-    prompt = _format_gemini_chat_prompt(message, analysis, lang)
-    resp = client.models.generate_content(model=model, contents=prompt)
+    prompt = _format_gemini_chat_prompt(message, analysis, lang, session)
+    resp = call_upstream("gemini", lambda: client.models.generate_content(
+        model=model, contents=prompt, config=_gemini_config(deadline)), deadline)
+    _record_gemini_usage(getattr(resp, "usage_metadata", None), "chat")
     try:
         return resp.text if hasattr(resp, "text") else str(resp)
     except Exception:
@@ -367,32 +1403,163 @@ def call_gemini_chat(message: str, analysis: Dict[str, Any], lang: str="en", mod
         return str(resp)
 
 
+def stream_gemini_chat(message: str, analysis: Dict[str, Any], lang: str="en", model: str=DEFAULT_GEMINI_MODEL,
+                       session: Dict[str, Any] = None, deadline: Deadline = None) -> Iterator[str]:
+    """
+    Like call_gemini_chat, but yields the reply in pieces as the model produces them.
+    Closing the generator (e.g. the client went away) closes the upstream stream too.
+    Raises DeadlineExceeded when `deadline` runs out mid-reply.
+    """
+    client = _ensure_gemini_client()
+    prompt = _format_gemini_chat_prompt(message, analysis, lang, session)
+    with UPSTREAMS["gemini"].guard(timeouts_count(deadline)), timed_upstream("gemini"):
+        stream = client.models.generate_content_stream(model=model, contents=prompt, config=_gemini_config(deadline))
+        usage = None
+        try:
+            for chunk in stream:
+                usage = getattr(chunk, "usage_metadata", None) or usage
+                if deadline is not None and deadline.expired:
+                    raise DeadlineExceeded("Gemini: request deadline exceeded")
+                try:
+                    text = chunk.text
+                except Exception:
+                    text = None
+                if text:
+                    yield text
+        except DeadlineExceeded:
+            raise
+        except Exception:
+            if deadline is not None and deadline.expired:
+                raise DeadlineExceeded("Gemini: request deadline exceeded")
+            raise
+        finally:
+            close = getattr(stream, "close", None)
+            if close:
+                close()
+            _record_gemini_usage(usage, "chat")
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _sse_response(events: Iterator[str]) -> Response:
+    # X-Accel-Buffering: let nginx pass events through as soon as they are written
+    return Response(stream_with_context(events), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.route("/chat/session", methods=["POST"])
+def create_chat_session():
+    """
+    Open a chat session for an analysis: {"analysis_data": {...}, "lang": "en"}.
+    Later /chat and /chat/stream calls send only {"message", "session_id"}.
+    """
+    data = request.get_json() or {}
+    session_id = CHAT_SESSIONS.create(data.get("analysis_data") or {}, data.get("lang", "en"))
+    return jsonify({"ok": True, "session_id": session_id, "expires_in": int(CHAT_SESSIONS.ttl)})
+
+@app.route("/chat/session/<session_id>", methods=["DELETE"])
+def delete_chat_session(session_id):
+    CHAT_SESSIONS.delete(session_id)
+    return jsonify({"ok": True})
+
+def _chat_session(data: Dict[str, Any]):
+    """(session, error response) for a chat request; both None when no session_id is given."""
+    session_id = data.get("session_id")
+    if not session_id:
+        return None, None
+    session = CHAT_SESSIONS.get(session_id)
+    if session is None:
+        return None, (jsonify({"ok": False, "error": "Unknown or expired chat session", "session_expired": True}), 404)
+    return session, None
+
 @app.route("/chat", methods=["POST"])
 def chat():
     """
     Chat endpoint for the AI Dietician Assistant.
-    Accepts a user message and nutrition analysis data.
+    Accepts a user message and either nutrition analysis data or a session_id from
+    /chat/session (the session keeps the analysis and the conversation history).
     """
     data = request.get_json() or {}
     message = data.get("message")
-    analysis_data = data.get("analysis_data")
-    lang = data.get("lang", "en")
+    with phase("session"):
+        session, error = _chat_session(data)
+    if error:
+        return error
+    analysis_data = session["analysis"] if session else data.get("analysis_data")
+    lang = data.get("lang") or (session["lang"] if session else "en")
 
     if not message:
         return jsonify({"ok": False, "error": "No message provided"}), 400
 
     # Make sure Gemini SDK & key exist
-    if genai is None:
+    if not GENAI_INSTALLED:
         return jsonify({"ok": False, "error": "Gemini SDK (google-genai) not installed on server. Run: pip install google-genai"}), 500
     if not GEMINI_API_KEY:
         return jsonify({"ok": False, "error": "GEMINI_API_KEY not set in environment (.env or system env)."}), 500
 
+    deadline = request_deadline(CHAT_DEADLINE)
     try:
-        chat_reply = call_gemini_chat(message, analysis_data, lang=lang)
+        with phase("gemini"):
+            chat_reply = call_gemini_chat(message, analysis_data, lang=lang, session=session, deadline=deadline)
+        if session:
+            with phase("session"):
+                CHAT_SESSIONS.add_turn(session["id"], message, chat_reply)
         return jsonify({"ok": True, "reply": chat_reply})
+    except UpstreamUnavailable as e:
+        return _unavailable_response(e)
     except Exception as e:
+        if deadline.expired:
+            return jsonify({"ok": False, "error": "No reply within the request deadline", "timeout": True}), 504
         return jsonify({"ok": False, "error": str(e)}), 500
 
+@app.route("/chat/stream", methods=["POST"])
+def chat_stream():
+    """
+    Streaming variant of /chat. Same request body; the reply is sent as Server-Sent Events:
+    "delta" events carry {"text": ...} pieces, followed by "done" or "error";
+    "done" carries {"partial": true} when the request deadline cut the reply short.
+    """
+    data = request.get_json() or {}
+    message = data.get("message")
+    with phase("session"):
+        session, error = _chat_session(data)
+    if error:
+        return error
+    analysis_data = session["analysis"] if session else data.get("analysis_data")
+    lang = data.get("lang") or (session["lang"] if session else "en")
+
+    if not message:
+        return jsonify({"ok": False, "error": "No message provided"}), 400
+
+    # Make sure Gemini SDK & key exist
+    if not GENAI_INSTALLED:
+        return jsonify({"ok": False, "error": "Gemini SDK (google-genai) not installed on server. Run: pip install google-genai"}), 500
+    if not GEMINI_API_KEY:
+        return jsonify({"ok": False, "error": "GEMINI_API_KEY not set in environment (.env or system env)."}), 500
+
+    deadline = request_deadline(CHAT_DEADLINE)
+
+    def events():
+        reply = []
+        try:
+            for text in stream_gemini_chat(message, analysis_data, lang=lang, session=session, deadline=deadline):
+                reply.append(text)
+                yield _sse("delta", {"text": text})
+            if session:
+                CHAT_SESSIONS.add_turn(session["id"], message, "".join(reply))
+            yield _sse("done", {})
+        except DeadlineExceeded:
+            # keep what was said so far; the client shows it as cut off
+            if session and reply:
+                CHAT_SESSIONS.add_turn(session["id"], message, "".join(reply))
+            yield _sse("done", {"partial": True})
+        except Exception as e:
+            yield _sse("error", {"error": str(e)})
+
+    return _sse_response(events())
+
 if __name__ == "__main__":
     # for dev only; in production use gunicorn
     app.run(host="0.0.0.0", port=int(os.getenv("PORT", "5000")), debug=True)
@@ -0,0 +1,168 @@
+# assets.py
+"""
+Static asset pipeline.
+
+build() copies the CSS/JS/image files of static/ to static/dist/ under names that
+contain a hash of their content (style.3f2a9c1d04be.css) and writes precompressed
+.gz and, if the optional `brotli` package is installed, .br variants next to them.
+A fingerprinted file never changes, so browsers may cache it for a year; a new
+build only adds files, so pages already loaded still find theirs. nginx serves
+static/dist/ directly (gzip_static / brotli_static); the app can serve it too.
+
+Precompressed holds one response body with its encodings and ETag, for assets
+and the pre-rendered page.
+
+CLI:
+    python assets.py build
+"""
+
+import os
+import sys
+import gzip
+import hashlib
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DEFAULT_STATIC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+DIST = "dist"
+
+# files that get fingerprinted (static/ also holds other things, which are left alone)
+FINGERPRINTED = {".css", ".js", ".svg", ".png", ".jpg", ".jpeg", ".gif", ".webp", ".ico", ".woff", ".woff2"}
+# worth compressing; images and fonts already are
+COMPRESSIBLE = {".css", ".js", ".svg", ".html", ".json", ".txt"}
+
+ENCODINGS = ("br", "gzip") if brotli else ("gzip",)
+
+
+def compress(data: bytes, encodings: Iterable[str] = ENCODINGS, fast: bool = False) -> Dict[str, bytes]:
+    """{encoding: compressed body}; `fast` trades ratio for speed (for responses built per request)."""
+    out = {}
+    if "gzip" in encodings:
+        out["gzip"] = gzip.compress(data, 6 if fast else 9, mtime=0)
+    if "br" in encodings and brotli:
+        out["br"] = brotli.compress(data, quality=5 if fast else 11)
+    return out
+
+
+def negotiate(accept_encoding: str, available: Iterable[str]) -> Optional[str]:
+    """The best of `available` (br before gzip) that an Accept-Encoding header allows, else None."""
+    accepted = set()
+    for part in (accept_encoding or "").lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(name.strip())
+    for encoding in ("br", "gzip"):
+        if encoding in available and (encoding in accepted or "*" in accepted):
+            return encoding
+    return None
+
+
+class Precompressed:
+    """A response body, its compressed variants and a strong ETag per variant."""
+
+    def __init__(self, body: bytes, compressible: bool = True):
+        self.body = body
+        self.digest = hashlib.sha256(body).hexdigest()[:16]
+        self.variants = compress(body) if compressible else {}
+        # keep a variant only where it actually saves bytes
+        self.variants = {enc: data for enc, data in self.variants.items() if len(data) < len(body)}
+
+    def etag(self, encoding: Optional[str]) -> str:
+        return f"{self.digest}-{encoding}" if encoding else self.digest
+
+    def select(self, accept_encoding: str) -> Tuple[Optional[str], bytes]:
+        """(Content-Encoding or None, body) for a request's Accept-Encoding."""
+        encoding = negotiate(accept_encoding, self.variants)
+        return encoding, self.variants[encoding] if encoding else self.body
+
+
+class Assets:
+    def __init__(self, static_dir: str = DEFAULT_STATIC):
+        self.static_dir = static_dir
+        self.dist_dir = os.path.join(static_dir, DIST)
+        self._manifest: Optional[Dict[str, str]] = None     # "style.css" -> "dist/style.<hash>.css"
+        self._files: Dict[str, Precompressed] = {}          # "style.<hash>.css" -> content
+        self._lock = threading.Lock()
+
+    def _sources(self) -> Iterable[str]:
+        for name in sorted(os.listdir(self.static_dir)):
+            path = os.path.join(self.static_dir, name)
+            if os.path.isfile(path) and os.path.splitext(name)[1].lower() in FINGERPRINTED:
+                yield name
+
+    def build(self) -> Dict[str, str]:
+        """Fingerprint every asset; writes what static/dist/ lacks. Returns the manifest."""
+        manifest, files = {}, {}
+        for name in self._sources():
+            with open(os.path.join(self.static_dir, name), "rb") as f:
+                data = f.read()
+            stem, ext = os.path.splitext(name)
+            content = Precompressed(data, ext.lower() in COMPRESSIBLE)
+            fingerprinted = f"{stem}.{content.digest[:12]}{ext}"
+            manifest[name] = f"{DIST}/{fingerprinted}"
+            files[fingerprinted] = content
+            try:
+                self._write(fingerprinted, content)
+            except OSError:
+                pass    # read-only checkout: the app still serves the assets from memory
+        with self._lock:
+            self._manifest, self._files = manifest, files
+        return manifest
+
+    def _write(self, name: str, content: Precompressed):
+        os.makedirs(self.dist_dir, exist_ok=True)
+        outputs = [(name, content.body)]
+        outputs += [(f"{name}.{'gz' if enc == 'gzip' else enc}", data) for enc, data in content.variants.items()]
+        for out_name, data in outputs:
+            path = os.path.join(self.dist_dir, out_name)
+            if os.path.exists(path):
+                continue
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+
+    def manifest(self) -> Dict[str, str]:
+        if self._manifest is None:
+            self.build()
+        return self._manifest
+
+    def path(self, name: str) -> str:
+        """Path under static/ of an asset's fingerprinted copy (the original if it has none)."""
+        return self.manifest().get(name, name)
+
+    def get(self, fingerprinted: str) -> Optional[Precompressed]:
+        """Content of static/dist/<fingerprinted>, None if no such asset was built."""
+        self.manifest()
+        return self._files.get(fingerprinted)
+
+
+def main(argv=None) -> int:
+    import argparse
+    parser = argparse.ArgumentParser(description="Fingerprint and precompress static assets.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    build = sub.add_parser("build", help=f"write fingerprinted, precompressed copies to static/{DIST}/")
+    build.add_argument("--static", default=DEFAULT_STATIC)
+    args = parser.parse_args(argv)
+
+    if args.cmd == "build":
+        for name, built in Assets(args.static).build().items():
+            print(f"{name} -> {built}")
+        if not brotli:
+            print("brotli is not installed: only .gz variants were written")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+# bench/_util.py
+"""
+Helpers shared by the benchmark harnesses: latency percentiles and starting a
+gunicorn for the app on a free local port.
+"""
+
+import os
+import sys
+import time
+import socket
+import subprocess
+import http.client
+from typing import Dict, List, Optional
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, int(round(p / 100.0 * (len(ordered) - 1)))))
+    return ordered[idx]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def launch(worker_class: str, workers: int, env: Optional[Dict[str, str]] = None) -> (subprocess.Popen, int):
+    """Start gunicorn on a free port without waiting for it; returns the process and the port."""
+    port = _free_port()
+    env = dict(os.environ, **(env or {}), NUTRI_WORKER_CLASS=worker_class, NUTRI_WORKERS=str(workers))
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", os.path.join(PROJECT_DIR, "gunicorn.conf.py"),
+         "--chdir", PROJECT_DIR, "--bind", f"127.0.0.1:{port}", "app:app"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return proc, port
+
+
+def spawn(worker_class: str, workers: int, env: Optional[Dict[str, str]] = None,
+          ready_path: str = "/", seconds: float = 30.0) -> (subprocess.Popen, str):
+    """Start gunicorn and wait until GET `ready_path` answers; returns the process and its base URL."""
+    proc, port = launch(worker_class, workers, env)
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"gunicorn ({worker_class}) exited with status {proc.returncode}")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            try:
+                conn.request("GET", ready_path)
+                conn.getresponse().read()
+            finally:
+                conn.close()
+            return proc, f"http://127.0.0.1:{port}"
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError(f"gunicorn ({worker_class}) did not start")
@@ -0,0 +1,280 @@
+# bench/fake_upstreams.py
+"""
+Local stand-ins for USDA FoodData Central, WeatherAPI and Gemini, so app.py can be
+load-tested without network access or API quota.
+
+One threaded HTTP server answers all three APIs:
+
+    GET  /fdc/v1/foods/search?query=...                   USDA search (one food)
+    GET  /weather/v1/current.json?q=...                   WeatherAPI current conditions
+    POST /gemini/v1beta/models/<model>:generateContent    Gemini (and :streamGenerateContent?alt=sse)
+
+Point the app at it with
+    USDA_BASE_URL=http://127.0.0.1:PORT/fdc/v1
+    WEATHER_BASE_URL=http://127.0.0.1:PORT/weather/v1
+    GEMINI_BASE_URL=http://127.0.0.1:PORT/gemini
+
+Each upstream has a median latency (lognormal, --jitter spread), an error rate
+(503 answers) and a payload size: nutrients per USDA food, padding bytes per
+weather answer, characters per Gemini reply. Latency and errors are drawn from
+--seed, the upstream, the request key and how often that key was asked, so a
+replayed corpus meets the same delays and failures on every run. USDA queries
+starting with "unknown" find nothing; so do WeatherAPI cities starting with "nowhere".
+
+    python bench/fake_upstreams.py --port 8900 --gemini-latency-ms 800 --usda-error-rate 0.05
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import zlib
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Tuple
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from nutrition import NUTRIENT_PANEL    # noqa: E402
+
+UPSTREAMS = ("usda", "weather", "gemini")
+
+DEFAULTS: Dict[str, Dict[str, float]] = {
+    "usda": {"latency_ms": 150.0, "error_rate": 0.0, "payload": 60},       # foodNutrients per food
+    "weather": {"latency_ms": 80.0, "error_rate": 0.0, "payload": 0},      # padding bytes
+    "gemini": {"latency_ms": 1500.0, "error_rate": 0.0, "payload": 1200},  # reply characters
+}
+
+# per 100 g, roughly the scale of real foods (before unit conversion)
+_RANGES = {"kcal": (20.0, 600.0), "g": (0.0, 30.0), "mg": (0.0, 300.0), "µg": (0.0, 150.0)}
+
+_CONSULT = {
+    "summary": "Your intake is low in protein and fiber for your weight.",
+    "meal_plan": [
+        {"meal": "Breakfast", "name": "Oats bowl", "items": ["oats 60 g", "milk 250 ml", "banana"]},
+        {"meal": "Lunch", "name": "Dal and rice", "items": ["lentils 80 g", "rice 150 g", "spinach 100 g"]},
+        {"meal": "Dinner", "name": "Paneer wrap", "items": ["paneer 100 g", "whole wheat roti 2", "salad"]},
+    ],
+    "advice": "Drink water through the day and add a fruit between meals.",
+}
+
+
+class FakeUpstreams:
+    def __init__(self, config: Dict[str, Dict[str, float]] = None, jitter: float = 0.25, seed: int = 7):
+        self.config = {name: dict(DEFAULTS[name], **((config or {}).get(name) or {})) for name in UPSTREAMS}
+        self.jitter = jitter
+        self.seed = seed
+        self.counts: Dict[Tuple[str, str], int] = {}
+        self.requests = {name: 0 for name in UPSTREAMS}
+        self.errors = {name: 0 for name in UPSTREAMS}
+        self._lock = threading.Lock()
+        self.server = None
+
+    # ---------- behaviour ----------
+    def draw(self, upstream: str, key: str) -> Tuple[float, bool]:
+        """(delay in seconds, fail?) for the n-th request for `key`, reproducible across runs."""
+        with self._lock:
+            n = self.counts.get((upstream, key), 0)
+            self.counts[(upstream, key)] = n + 1
+            self.requests[upstream] += 1
+        rnd = random.Random(f"{self.seed}:{upstream}:{key}:{n}")
+        cfg = self.config[upstream]
+        delay = cfg["latency_ms"] / 1000.0 * math.exp(rnd.gauss(0.0, self.jitter)) if cfg["latency_ms"] > 0 else 0.0
+        fail = rnd.random() < cfg["error_rate"]
+        if fail:
+            with self._lock:
+                self.errors[upstream] += 1
+        return delay, fail
+
+    def usda_food(self, query: str) -> Dict[str, Any]:
+        if query.lower().startswith("unknown"):
+            return {"totalHits": 0, "foods": []}
+        rnd = random.Random(f"{self.seed}:food:{query.lower()}")
+        nutrients = []
+        for name, (nid, number, unit) in NUTRIENT_PANEL.items():
+            low, high = _RANGES[unit]
+            nutrients.append({"nutrientId": nid, "nutrientNumber": number, "nutrientName": name,
+                              "unitName": unit.replace("µ", "U").upper(),     # as USDA writes them: G, MG, UG
+                              "value": round(rnd.uniform(low, high), 2)})
+        # untracked nutrients (amino acids, fatty acids...) make up the rest of a real answer
+        for i in range(max(0, int(self.config["usda"]["payload"]) - len(nutrients))):
+            nutrients.append({"nutrientId": 1200 + i, "nutrientNumber": str(500 + i),
+                              "nutrientName": f"Other nutrient {i}", "unitName": "G",
+                              "value": round(rnd.uniform(0, 2), 3)})
+        return {"totalHits": 1, "foods": [{"fdcId": zlib.crc32(query.encode("utf-8")) % 10 ** 6,
+                                           "description": query.upper(), "foodNutrients": nutrients}]}
+
+    def weather(self, city: str) -> Tuple[int, Dict[str, Any]]:
+        if city.lower().startswith("nowhere"):
+            return 400, {"error": {"code": 1006, "message": "No matching location found."}}
+        rnd = random.Random(f"{self.seed}:city:{city.lower()}")
+        body = {"location": {"name": city.title()},
+                "current": {"temp_c": round(rnd.uniform(5, 40), 1), "humidity": rnd.randint(20, 95),
+                            "condition": {"text": rnd.choice(["Sunny", "Partly cloudy", "Mist", "Light rain"])}}}
+        padding = int(self.config["weather"]["payload"])
+        if padding:
+            body["padding"] = "x" * padding
+        return 200, body
+
+    def gemini_text(self, prompt: str) -> str:
+        if "JSON" in prompt:
+            return json.dumps(_CONSULT)
+        size = max(1, int(self.config["gemini"]["payload"]))
+        sentence = "Add a bowl of dal and a glass of milk to raise protein and calcium. "
+        return (sentence * (size // len(sentence) + 1))[:size]
+
+    # ---------- server ----------
+    def start(self, host: str = "127.0.0.1", port: int = 0) -> "FakeUpstreams":
+        upstreams = self
+
+        class Handler(_Handler):
+            fake = upstreams
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name="fake-upstreams", daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def env(self) -> Dict[str, str]:
+        """Environment for app.py to use these stand-ins."""
+        return {"USDA_BASE_URL": f"{self.base_url}/fdc/v1", "WEATHER_BASE_URL": f"{self.base_url}/weather/v1",
+                "GEMINI_BASE_URL": f"{self.base_url}/gemini", "USDA_API_KEY": "bench",
+                "WEATHER_API_KEY": "bench", "GEMINI_API_KEY": "bench"}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"requests": dict(self.requests), "errors": dict(self.errors)}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    fake: FakeUpstreams
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: Any, content_type: str = "application/json"):
+        data = body if isinstance(body, bytes) else json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _unavailable(self, upstream: str):
+        self._send(503, {"error": {"code": 503, "message": f"fake {upstream} is overloaded", "status": "UNAVAILABLE"}})
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if url.path == "/fdc/v1/foods/search":
+            food = (query.get("query") or [""])[0]
+            delay, fail = self.fake.draw("usda", food.lower())
+            time.sleep(delay)
+            return self._unavailable("usda") if fail else self._send(200, self.fake.usda_food(food))
+        if url.path == "/weather/v1/current.json":
+            city = (query.get("q") or [""])[0]
+            delay, fail = self.fake.draw("weather", city.lower())
+            time.sleep(delay)
+            if fail:
+                return self._unavailable("weather")
+            return self._send(*self.fake.weather(city))
+        self._send(404, {"error": "not found"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if not url.path.startswith("/gemini/") or ":" not in url.path:
+            return self._send(404, {"error": "not found"})
+        method = url.path.rsplit(":", 1)[1]
+        prompt = "".join(part.get("text", "") for content in body.get("contents", [])
+                         for part in content.get("parts", []))
+        delay, fail = self.fake.draw("gemini", f"{zlib.crc32(prompt.encode('utf-8')):08x}")
+        if fail:
+            time.sleep(delay / 4)
+            return self._unavailable("gemini")
+        text = self.fake.gemini_text(prompt)
+        usage = {"promptTokenCount": len(prompt) // 4 + 1, "candidatesTokenCount": len(text) // 4 + 1}
+        usage["totalTokenCount"] = usage["promptTokenCount"] + usage["candidatesTokenCount"]
+        if method == "generateContent":
+            time.sleep(delay)
+            return self._send(200, _candidate(text, usage))
+        if method != "streamGenerateContent":
+            return self._send(404, {"error": f"unknown method {method}"})
+        # first chunk after a quarter of the latency, the rest spread over the remainder
+        pieces = [text[i:i + 40] for i in range(0, len(text), 40)] or [""]
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        time.sleep(delay / 4)
+        for i, piece in enumerate(pieces):
+            if i:
+                time.sleep(delay * 0.75 / len(pieces))
+            event = _candidate(piece, usage if i == len(pieces) - 1 else None)
+            data = f"data: {json.dumps(event)}\r\n\r\n".encode("utf-8")
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+
+def _candidate(text: str, usage: Dict[str, int] = None) -> Dict[str, Any]:
+    out = {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]},
+                           "finishReason": "STOP", "index": 0}],
+           "modelVersion": "fake-gemini"}
+    if usage:
+        out["usageMetadata"] = usage
+    return out
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    for name in UPSTREAMS:
+        d = DEFAULTS[name]
+        parser.add_argument(f"--{name}-latency-ms", type=float, default=d["latency_ms"])
+        parser.add_argument(f"--{name}-error-rate", type=float, default=d["error_rate"])
+        parser.add_argument(f"--{name}-payload", type=int, default=int(d["payload"]))
+    parser.add_argument("--jitter", type=float, default=0.25, help="lognormal sigma of the latency")
+    parser.add_argument("--seed", type=int, default=7)
+
+
+def from_arguments(args: argparse.Namespace) -> FakeUpstreams:
+    config = {name: {"latency_ms": getattr(args, f"{name}_latency_ms"),
+                     "error_rate": getattr(args, f"{name}_error_rate"),
+                     "payload": getattr(args, f"{name}_payload")} for name in UPSTREAMS}
+    return FakeUpstreams(config, jitter=args.jitter, seed=args.seed)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+    fake = from_arguments(args).start(args.host, args.port)
+    for key, value in fake.env().items():
+        print(f"{key}={value}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        fake.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+# bench/load_concurrency.py
+"""
+Concurrency load test: how well does the server keep answering cheap requests
+while slow LLM requests are in flight?
+
+It opens --slow concurrent POST /chat requests (each holds a Gemini call) and,
+while they run, sends --probes GET / page loads from --probe-concurrency clients.
+With sync workers the page loads queue behind the chats; with gevent workers
+they should stay fast.
+
+    # against a running server
+    python bench/load_concurrency.py --url http://127.0.0.1:8000
+
+    # start gunicorn itself with each worker class and compare
+    python bench/load_concurrency.py --compare sync gevent
+
+Only the standard library is used on the client side.
+Note: /chat calls the real Gemini API unless the server is pointed at a stand-in.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import urllib.request
+from typing import Dict
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from _util import percentile, spawn    # noqa: E402
+
+
+def _timed_request(url: str, body: dict = None, timeout: float = 180.0) -> float:
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    req = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    start = time.perf_counter()
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        resp.read()
+    return time.perf_counter() - start
+
+
+def run(url: str, slow: int, probes: int, probe_concurrency: int) -> Dict[str, float]:
+    chat_body = {"message": "Suggest a high protein breakfast",
+                 "analysis_data": {"total_nutrients": {"Protein": "20.0 g"}, "deficient": {"Protein": "30.0 g"}}}
+    slow_times, slow_errors = [], []
+    probe_times, probe_errors = [], []
+    lock = threading.Lock()
+
+    def slow_client():
+        try:
+            t = _timed_request(url + "/chat", chat_body)
+            with lock:
+                slow_times.append(t)
+        except Exception as e:
+            with lock:
+                slow_errors.append(str(e))
+
+    def probe_client(count: int):
+        for _ in range(count):
+            try:
+                t = _timed_request(url + "/", timeout=60)
+                with lock:
+                    probe_times.append(t)
+            except Exception as e:
+                with lock:
+                    probe_errors.append(str(e))
+
+    started = time.perf_counter()
+    slow_threads = [threading.Thread(target=slow_client) for _ in range(slow)]
+    for t in slow_threads:
+        t.start()
+    time.sleep(0.5)  # let the slow requests occupy the workers
+    per_client = max(1, probes // probe_concurrency)
+    probe_threads = [threading.Thread(target=probe_client, args=(per_client,)) for _ in range(probe_concurrency)]
+    for t in probe_threads:
+        t.start()
+    for t in probe_threads + slow_threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    return {
+        "slow_requests": slow,
+        "slow_ok": len(slow_times),
+        "slow_errors": len(slow_errors),
+        "slow_p50_s": round(percentile(slow_times, 50), 3),
+        "slow_max_s": round(max(slow_times or [0.0]), 3),
+        "probes_ok": len(probe_times),
+        "probe_errors": len(probe_errors),
+        "probe_p50_ms": round(percentile(probe_times, 50) * 1000, 1),
+        "probe_p95_ms": round(percentile(probe_times, 95) * 1000, 1),
+        "probe_max_ms": round(max(probe_times or [0.0]) * 1000, 1),
+        "wall_s": round(elapsed, 2),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="base URL of a running server")
+    parser.add_argument("--compare", nargs="+", metavar="WORKER_CLASS",
+                        help="start gunicorn with each worker class (e.g. sync gevent) and compare")
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--slow", type=int, default=30, help="concurrent /chat requests")
+    parser.add_argument("--probes", type=int, default=60, help="total GET / requests")
+    parser.add_argument("--probe-concurrency", type=int, default=4)
+    args = parser.parse_args(argv)
+
+    if args.url:
+        print(json.dumps(run(args.url.rstrip("/"), args.slow, args.probes, args.probe_concurrency), indent=2))
+        return 0
+    if not args.compare:
+        parser.error("give --url or --compare")
+    results = {}
+    for worker_class in args.compare:
+        proc, url = spawn(worker_class, args.workers)
+        try:
+            results[worker_class] = run(url, args.slow, args.probes, args.probe_concurrency)
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+    print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
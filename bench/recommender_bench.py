@@ -0,0 +1,88 @@
+# bench/recommender_bench.py
+"""
+Micro-benchmark for recommender.Recommender.recommend().
+
+Times --requests random deficiency sets (1-5 of the core nutrients, random
+temperature and diet) against the local food index, optionally padded with
+--synthetic random foods to mimic a compiled USDA download.
+
+    python bench/recommender_bench.py
+    python bench/recommender_bench.py --synthetic 8000 --requests 5000
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from food_index import load_default_index                 # noqa: E402
+from nutrition import CORE_NUTRIENTS, TRACKED_NUTRIENTS    # noqa: E402
+from recommender import Recommender, DIETS                 # noqa: E402
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from _util import percentile    # noqa: E402
+
+# rough upper bounds of a daily deficit, canonical units (mg)
+MAX_DEFICIT = {"Protein": 50000.0, "Fiber": 30000.0, "Vitamin C": 90.0, "Iron": 18.0, "Calcium": 1000.0}
+
+
+def synthetic_foods(count: int, seed: int):
+    rng = np.random.default_rng(seed)
+    for i in range(count):
+        amounts = rng.gamma(0.6, 1.0, len(TRACKED_NUTRIENTS)) * rng.choice([0.0, 1.0], len(TRACKED_NUTRIENTS), p=[0.3, 0.7])
+        values = {n: float(a) * (5000.0 if n in ("Protein", "Fiber", "Fat", "Carbohydrate", "Sugars") else 20.0)
+                  for n, a in zip(TRACKED_NUTRIENTS, amounts)}
+        values["Energy"] = float(rng.uniform(15, 600))
+        yield f"synthetic food {i}", values
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--synthetic", type=int, default=0, help="extra random foods to add to the index")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    index = load_default_index()
+    if args.synthetic:
+        index.add_foods(synthetic_foods(args.synthetic, args.seed), source="synthetic")
+    started = time.perf_counter()
+    rec = Recommender(index)
+    build_ms = (time.perf_counter() - started) * 1000
+
+    rnd = random.Random(args.seed)
+    diets = [None, None] + sorted(DIETS)
+    cases = []
+    for _ in range(args.requests):
+        nutrients = rnd.sample(CORE_NUTRIENTS, rnd.randint(1, len(CORE_NUTRIENTS)))
+        deficits = {n: MAX_DEFICIT[n] * rnd.uniform(0.4, 1.0) for n in nutrients}
+        cases.append((deficits, rnd.uniform(0, 42), rnd.choice(diets)))
+
+    times, items = [], 0
+    for deficits, temp, diet in cases:
+        t = time.perf_counter()
+        items += len(rec.recommend(deficits, temp=temp, diet=diet))
+        times.append(time.perf_counter() - t)
+
+    print(json.dumps({
+        "foods": len(index),
+        "build_ms": round(build_ms, 2),
+        "requests": len(times),
+        "mean_items": round(items / len(times), 2),
+        "p50_us": round(percentile(times, 50) * 1e6, 1),
+        "p95_us": round(percentile(times, 95) * 1e6, 1),
+        "p99_us": round(percentile(times, 99) * 1e6, 1),
+        "max_us": round(max(times) * 1e6, 1),
+    }, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
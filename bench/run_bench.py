@@ -0,0 +1,219 @@
+# bench/run_bench.py
+"""
+Hermetic load test: replays bench/corpus.jsonl against /analyze, /consult and /chat
+at fixed concurrency levels and reports throughput and p50/p95/p99 latency.
+
+For every concurrency level it starts the fake upstreams (bench/fake_upstreams.py)
+and a fresh gunicorn with empty caches in a temporary directory, so runs do not use
+the network and are comparable on one machine. The corpus is replayed in order
+(cycled up to --requests); upstream delays and failures are seeded.
+
+    python bench/run_bench.py
+    python bench/run_bench.py --concurrency 1 8 32 --requests 200 --out before.json
+    python bench/run_bench.py --out after.json --baseline before.json
+    python bench/run_bench.py --gemini-latency-ms 300 --usda-error-rate 0.05 --workers 2
+
+With --url the corpus is sent to a server that is already running (start it with the
+environment printed by bench/fake_upstreams.py to keep it off the network).
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import argparse
+import tempfile
+import threading
+import http.client
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fake_upstreams    # noqa: E402
+from _util import percentile, spawn    # noqa: E402
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus.jsonl")
+
+# every file the app keeps state in, so each run starts cold
+STATE_FILES = {"NUTRIENT_CACHE_PATH": "nutrient_cache.sqlite3", "CONSULT_JOBS_PATH": "consult_jobs.sqlite3",
+               "CHAT_SESSION_PATH": "chat_sessions.sqlite3", "BREAKER_PATH": "circuit_breakers.sqlite3",
+               "METRICS_PATH": "metrics.sqlite3", "MEAL_LOG_PATH": "meal_log.sqlite3",
+               "CACHE_SNAPSHOT_PATH": "cache_snapshot.json"}
+
+
+def load_corpus(path: str) -> List[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _server_timing(header: Optional[str]) -> Dict[str, float]:
+    """'weather;dur=2.5, foods;dur=5.8' -> {"weather": 2.5, "foods": 5.8}"""
+    phases = {}
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        if params.startswith("dur="):
+            try:
+                phases[name] = float(params[4:])
+            except ValueError:
+                pass
+    return phases
+
+
+def replay(url: str, corpus: List[Dict[str, Any]], requests: int, concurrency: int,
+           timeout: float = 180.0) -> Dict[str, Any]:
+    parsed = urlparse(url)
+    jobs: "queue.Queue" = queue.Queue()
+    for i in range(requests):
+        jobs.put(corpus[i % len(corpus)])
+    samples = []    # (endpoint, seconds, status, phases)
+    lock = threading.Lock()
+
+    def client():
+        conn = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=timeout)
+        while True:
+            try:
+                entry = jobs.get_nowait()
+            except queue.Empty:
+                break
+            body = json.dumps(entry["body"]).encode("utf-8")
+            start = time.perf_counter()
+            try:
+                conn.request("POST", entry["endpoint"], body=body, headers={"Content-Type": "application/json"})
+                resp = conn.getresponse()
+                resp.read()
+                status, timing = resp.status, resp.getheader("Server-Timing")
+            except Exception:
+                conn.close()
+                conn = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=timeout)
+                status, timing = 0, None
+            elapsed = time.perf_counter() - start
+            with lock:
+                samples.append((entry["endpoint"], elapsed, status, _server_timing(timing)))
+        conn.close()
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+
+    def summary(rows) -> Dict[str, Any]:
+        times = [r[1] for r in rows]
+        phases: Dict[str, List[float]] = {}
+        for r in rows:
+            for name, ms in r[3].items():
+                if name != "total":
+                    phases.setdefault(name, []).append(ms)
+        out = {
+            "count": len(rows),
+            "errors": sum(1 for r in rows if r[2] != 200),
+            "p50_ms": round(percentile(times, 50) * 1000, 1),
+            "p95_ms": round(percentile(times, 95) * 1000, 1),
+            "p99_ms": round(percentile(times, 99) * 1000, 1),
+            "max_ms": round(max(times or [0.0]) * 1000, 1),
+        }
+        if phases:
+            # mean server-side time per phase, from the Server-Timing header
+            out["phases_ms"] = {name: round(sum(v) / len(v), 1) for name, v in phases.items()}
+        return out
+
+    endpoints = sorted({r[0] for r in samples})
+    return {
+        "concurrency": concurrency,
+        "requests": len(samples),
+        "wall_s": round(wall, 2),
+        "throughput_rps": round(len(samples) / wall, 2) if wall else 0.0,
+        "all": summary(samples),
+        "endpoints": {e: summary([r for r in samples if r[0] == e]) for e in endpoints},
+    }
+
+
+def run_level(args, corpus, concurrency: int) -> Dict[str, Any]:
+    """One concurrency level against fresh fakes and a fresh server with cold caches."""
+    fake = fake_upstreams.from_arguments(args).start()
+    try:
+        with tempfile.TemporaryDirectory(prefix="nutri-bench-") as state:
+            env = dict(fake.env(), **{k: os.path.join(state, f) for k, f in STATE_FILES.items()})
+            proc, url = spawn(args.worker_class, args.workers, env, ready_path="/upstreams")
+            try:
+                result = replay(url, corpus, args.requests, concurrency)
+            finally:
+                proc.terminate()
+                proc.wait(timeout=30)
+        result["upstreams"] = fake.stats()
+        return result
+    finally:
+        fake.stop()
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any]) -> str:
+    """Text table of the change from a saved run, per concurrency level and endpoint."""
+    def change(old, new):
+        return f"{old:>9} -> {new:<9} ({(new - old) / old * 100:+.0f}%)" if old else f"{old:>9} -> {new:<9}"
+
+    old_levels = {r["concurrency"]: r for r in baseline["results"]}
+    lines = []
+    for new in current["results"]:
+        old = old_levels.get(new["concurrency"])
+        if old is None:
+            continue
+        lines.append(f"concurrency {new['concurrency']}: throughput {change(old['throughput_rps'], new['throughput_rps'])} req/s")
+        for endpoint, stats in new["endpoints"].items():
+            before = old["endpoints"].get(endpoint)
+            if before is None:
+                continue
+            for key in ("p50_ms", "p95_ms", "p99_ms"):
+                lines.append(f"  {endpoint:<9} {key:<7} {change(before[key], stats[key])}")
+    return "\n".join(lines)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--requests", type=int, default=0, help="requests per level (default: 2x the corpus)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--url", help="replay against a running server instead of starting one")
+    parser.add_argument("--worker-class", default="gevent")
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--out", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="JSON file of an earlier run to compare with")
+    fake_upstreams.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    corpus = load_corpus(args.corpus)
+    args.requests = args.requests or 2 * len(corpus)
+    results = []
+    for concurrency in args.concurrency:
+        if args.url:
+            results.append(replay(args.url.rstrip("/"), corpus, args.requests, concurrency))
+        else:
+            results.append(run_level(args, corpus, concurrency))
+        print(f"concurrency {concurrency}: {results[-1]['throughput_rps']} req/s, "
+              f"p50 {results[-1]['all']['p50_ms']} ms, p99 {results[-1]['all']['p99_ms']} ms", file=sys.stderr)
+
+    report = {
+        "corpus": os.path.basename(args.corpus),
+        "worker_class": None if args.url else args.worker_class,
+        "workers": None if args.url else args.workers,
+        "upstreams": {name: {"latency_ms": getattr(args, f"{name}_latency_ms"),
+                             "error_rate": getattr(args, f"{name}_error_rate"),
+                             "payload": getattr(args, f"{name}_payload")} for name in fake_upstreams.UPSTREAMS},
+        "seed": args.seed,
+        "results": results,
+    }
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            print(compare(json.load(f), report))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+# bench/startup_bench.py
+"""
+Cold-start benchmark: how long a fresh gunicorn takes from launch to its first answers.
+
+For each mode (NUTRI_PRELOAD on and off) and each run it starts the fake upstreams and
+a gunicorn with empty state in a temporary directory, then measures from the launch to
+- the first GET / that succeeds (the workers are up), and
+- the first /analyze, /consult and /chat replies (sent one after the other, so the
+  first Gemini call includes loading the SDK in a worker that was not warmed up).
+It also reports how long `import app` takes on its own.
+
+    python bench/startup_bench.py
+    python bench/startup_bench.py --runs 5 --worker-class sync --out startup.json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+import http.client
+from typing import Any, Dict, List
+from urllib.parse import urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fake_upstreams    # noqa: E402
+from _util import PROJECT_DIR, launch, percentile    # noqa: E402
+from run_bench import STATE_FILES, DEFAULT_CORPUS, load_corpus   # noqa: E402
+
+MODES = {"preload": "1", "no-preload": "0"}
+
+
+def import_time(runs: int) -> float:
+    """Median seconds for `import app` in a fresh interpreter."""
+    times = []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", "import time; t = time.perf_counter(); import app; print(time.perf_counter() - t)"],
+            cwd=PROJECT_DIR, capture_output=True, text=True, check=True)
+        times.append(float(out.stdout.strip().splitlines()[-1]))
+    return percentile(times, 50)
+
+
+def _request(url: str, method: str, path: str, body: Any = None, timeout: float = 1.0) -> int:
+    parsed = urlparse(url)
+    conn = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=timeout)
+    try:
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        conn.request(method, path, body=data, headers={"Content-Type": "application/json"} if data else {})
+        resp = conn.getresponse()
+        resp.read()
+        return resp.status
+    finally:
+        conn.close()
+
+
+def cold_start(env: Dict[str, str], args, firsts: List[Dict[str, Any]]) -> Dict[str, float]:
+    """Seconds from launch to the first page and to the first reply per endpoint."""
+    started = time.perf_counter()
+    proc, port = launch(args.worker_class, args.workers, env)
+    url = f"http://127.0.0.1:{port}"
+    try:
+        result = {}
+        while "page" not in result:
+            if proc.poll() is not None:
+                raise RuntimeError(f"gunicorn exited with status {proc.returncode}")
+            if time.perf_counter() - started > 60:
+                raise RuntimeError("gunicorn did not start")
+            try:
+                if _request(url, "GET", "/") == 200:
+                    result["page"] = time.perf_counter() - started
+            except OSError:
+                time.sleep(0.01)
+        for entry in firsts:
+            status = _request(url, "POST", entry["endpoint"], entry["body"], timeout=120)
+            name = entry["endpoint"].strip("/")
+            result[name] = time.perf_counter() - started
+            if status != 200:
+                result[name + "_status"] = status
+        return result
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3, help="cold starts per mode")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--worker-class", default="gevent")
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--out", help="write the results to this JSON file")
+    fake_upstreams.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    corpus = load_corpus(args.corpus)
+    firsts = [next(e for e in corpus if e["endpoint"] == endpoint) for endpoint in ("/analyze", "/consult", "/chat")
+              if any(e["endpoint"] == endpoint for e in corpus)]
+    report = {"worker_class": args.worker_class, "workers": args.workers,
+              "import_app_s": round(import_time(args.runs), 3), "modes": {}}
+    fake = fake_upstreams.from_arguments(args).start()
+    try:
+        for mode, preload in MODES.items():
+            runs = []
+            for _ in range(args.runs):
+                with tempfile.TemporaryDirectory(prefix="nutri-startup-") as state:
+                    env = dict(fake.env(), NUTRI_PRELOAD=preload,
+                               **{k: os.path.join(state, f) for k, f in STATE_FILES.items()})
+                    runs.append(cold_start(env, args, firsts))
+            names = [k for k in runs[0] if not k.endswith("_status")]
+            report["modes"][mode] = {
+                "median_ms": {k: round(percentile([r[k] for r in runs], 50) * 1000, 1) for k in names},
+                "runs": runs,
+            }
+            print(f"{mode}: " + ", ".join(f"{k} {v} ms" for k, v in report["modes"][mode]["median_ms"].items()),
+                  file=sys.stderr)
+    finally:
+        fake.stop()
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
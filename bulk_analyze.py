@@ -0,0 +1,377 @@
+# bulk_analyze.py
+"""
+Offline bulk analysis of meal logs.
+
+analyze_records() computes the per-day totals and deficiencies of many records at
+once (NumPy, same mapping and calculate_deficiency rules as /analyze); it backs both
+POST /analyze/batch and the command line below.
+
+The CLI streams a CSV or JSONL meal log in chunks through a process pool and writes
+the results as it goes, so memory stays flat however large the input is. Foods are
+resolved from the local food index and the nutrient cache only (with the same
+typo-tolerant matching as the server); it never calls USDA. Foods it cannot resolve
+count as zero and are listed per record under "unresolved" (warm them with
+`python nutrient_cache.py warm` first).
+
+    python bulk_analyze.py meals.jsonl results.jsonl
+    python bulk_analyze.py meals.csv.gz report.csv --workers 8 --chunk 2000
+    zcat meals.jsonl.gz | python bulk_analyze.py - - --input-format jsonl > results.jsonl
+
+Input:
+- JSONL: one record per line, as for /analyze/batch:
+  {"id", "gender", "height", "weight", "meals": [{"date", "items": [{"name", "qty"}]}]}
+- CSV: one food per row, columns id, date, food (or name), qty (grams) and optionally
+  gender, height, weight. Consecutive rows with the same id form one record, so keep
+  each person's rows together.
+Output: JSONL (one result per record, as /analyze/batch) or CSV (one row per record and day).
+"""
+
+import os
+import csv
+import sys
+import gzip
+import json
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, TextIO
+
+import numpy as np
+
+from nutrition import (deficiency_matrix, nutrient_vector, canonical_nutrients, format_amount,
+                       NUTRIENT_PANEL, TRACKED_NUTRIENTS, CORE_NUTRIENTS)
+from food_index import FoodIndex, load_default_index, normalize_food_name
+from food_resolver import FoodNameResolver
+from nutrient_cache import NutrientCache, MISS
+
+DEFAULT_CHUNK = int(os.getenv("BATCH_CHUNK_RECORDS", "500"))
+# per-process memo of food -> nutrient vector; cleared when it grows past this
+MAX_MEMO_FOODS = 200000
+
+
+def _float_or_zero(value) -> float:
+    try:
+        return float(value or 0)
+    except Exception:
+        return 0.0
+
+
+def record_error(rec: Any) -> Optional[str]:
+    """Why a record cannot be analyzed, or None if its shape is fine."""
+    if not isinstance(rec, dict):
+        return "record must be an object"
+    if "_error" in rec:
+        return str(rec["_error"])
+    meals = rec["meals"] if rec.get("meals") is not None else [{"items": rec.get("items", [])}]
+    if not isinstance(meals, list):
+        return "meals must be a list"
+    for meal in meals:
+        if not isinstance(meal, dict):
+            return "each meal must be an object {date, items}"
+        items = meal.get("items", [])
+        if not isinstance(items, list) or not all(isinstance(it, dict) for it in items):
+            return "items must be a list of objects {name, qty}"
+    return None
+
+
+def analyze_records(records: List[Any], vectors: Dict[str, Any],
+                    resolve: Callable[[List[str]], Dict[str, Optional[Dict[str, float]]]]) -> Iterator[Dict[str, Any]]:
+    """
+    Totals and deficiencies for a list of records {id, gender, height, weight,
+    meals: [{date, items: [{name, qty}]}]}, one result per record.
+    `resolve(names)` returns {normalized name: canonical nutrients, {} if unknown} for the
+    foods not yet in `vectors`, which memoizes food -> mg-per-100 g vector (None if unknown)
+    across chunks. A None from `resolve` means "not answered in time": such foods count as
+    zero, are not memoized and are listed under "timeout" in the records that use them.
+    """
+    # one row per (record, day)
+    row_record, row_date = [], []
+    item_row, item_food, item_qty = [], [], []
+    food_cols: Dict[str, int] = {}
+    unresolved = [set() for _ in records]
+    timed_out = [set() for _ in records]
+    errors = [record_error(rec) for rec in records]
+    for r, rec in enumerate(records):
+        if errors[r]:
+            continue
+        meals = rec["meals"] if rec.get("meals") is not None else [{"items": rec.get("items", [])}]
+        day_rows = {}
+        for meal in meals:
+            date = str(meal.get("date") or "")
+            if date not in day_rows:
+                day_rows[date] = len(row_record)
+                row_record.append(r)
+                row_date.append(date)
+            for it in meal.get("items", []):
+                key = normalize_food_name(str(it.get("name") or ""))
+                qty_g = _float_or_zero(it.get("qty"))
+                if not key or qty_g <= 0:
+                    continue
+                item_row.append(day_rows[date])
+                item_food.append(food_cols.setdefault(key, len(food_cols)))
+                item_qty.append(qty_g)
+
+    new_foods = [key for key in food_cols if key not in vectors]
+    late = set()
+    if new_foods:
+        for key, nutrients in resolve(new_foods).items():
+            if nutrients is None:
+                late.add(key)
+            else:
+                vectors[key] = nutrient_vector(nutrients) if nutrients else None
+
+    # foods x nutrients matrix for this chunk (unknown foods contribute nothing)
+    zero = np.zeros(len(TRACKED_NUTRIENTS))
+    foods = list(food_cols)
+    matrix = np.vstack([vectors.get(k) if vectors.get(k) is not None else zero for k in foods]) if foods else np.zeros((0, len(TRACKED_NUTRIENTS)))
+    totals = np.zeros((len(row_record), len(TRACKED_NUTRIENTS)))
+    if item_row:
+        item_food_arr = np.asarray(item_food)
+        np.add.at(totals, np.asarray(item_row), matrix[item_food_arr] * (np.asarray(item_qty) / 100.0)[:, None])
+        for row, col in zip(item_row, item_food):
+            if foods[col] in late:
+                timed_out[row_record[row]].add(foods[col])
+            elif vectors[foods[col]] is None:
+                unresolved[row_record[row]].add(foods[col])
+
+    row_rec_arr = np.asarray(row_record, dtype=int)
+    genders = np.array([str((rec.get("gender") if isinstance(rec, dict) else "") or "male").lower() == "female" for rec in records])
+    heights = np.array([_float_or_zero(rec.get("height")) if isinstance(rec, dict) else 0.0 for rec in records])
+    weights = np.array([_float_or_zero(rec.get("weight")) if isinstance(rec, dict) else 0.0 for rec in records])
+    defic = deficiency_matrix(totals, genders[row_rec_arr], heights[row_rec_arr], weights[row_rec_arr]) if row_record else []
+
+    days = [[] for _ in records]
+    for row, r in enumerate(row_record):
+        days[r].append({
+            "date": row_date[row],
+            "total_nutrients": {n: format_amount(n, float(totals[row, j])) for j, n in enumerate(TRACKED_NUTRIENTS)
+                                if totals[row, j] or n in CORE_NUTRIENTS},
+            "deficient": defic[row],
+        })
+    for r, rec in enumerate(records):
+        if errors[r]:
+            rec_id = rec.get("id") if isinstance(rec, dict) else None
+            yield {"error": errors[r]} if rec_id is None else {"id": rec_id, "error": errors[r]}
+            continue
+        result = {"id": rec.get("id"), "days": days[r], "unresolved": sorted(unresolved[r])}
+        if timed_out[r]:
+            result["timeout"] = sorted(timed_out[r])
+        yield result
+
+
+# ----------------- offline food resolution -----------------
+class OfflineFoods:
+    """Food name -> canonical nutrients from the local index and the nutrient cache, never USDA."""
+
+    def __init__(self, index: FoodIndex, cache: NutrientCache, fuzzy_min_score: Optional[float] = None):
+        self.index = index
+        self.cache = cache
+        self.fuzzy_min_score = fuzzy_min_score
+        self.resolver: Optional[FoodNameResolver] = None
+        if fuzzy_min_score is not None:
+            self.resolver = FoodNameResolver()
+            for name in index.names:
+                self.resolver.add(name, "local")
+            for _rowid, key, description in cache.descriptions():
+                if description:
+                    self.resolver.add(description, "cache", key=key)
+
+    @classmethod
+    def from_env(cls, fuzzy: bool = True) -> "OfflineFoods":
+        min_score = float(os.getenv("FUZZY_MATCH_MIN_SCORE", "0.6")) if fuzzy else None
+        return cls(load_default_index(), NutrientCache.from_env(), min_score)
+
+    def _cached(self, key: str):
+        try:
+            entry = self.cache.get(key)
+        except Exception:
+            return None
+        if entry is MISS:
+            return None
+        # cache entries written before nutrient-id mapping hold {name: (value, unit)}
+        return canonical_nutrients(entry["nutrients"]) if entry else {}
+
+    def nutrients(self, key: str) -> Dict[str, float]:
+        local = self.index.lookup(key)
+        if local is not None:
+            return local
+        cached = self._cached(key)
+        if cached is not None:
+            return cached
+        if self.resolver is None:
+            return {}
+        match = self.resolver.typo_match(key, self.fuzzy_min_score)
+        if not match:
+            return {}
+        if match["source"] == "local":
+            return self.index.lookup(match["key"]) or {}
+        return self._cached(match["key"]) or {}
+
+    def resolve(self, keys: List[str]) -> Dict[str, Dict[str, float]]:
+        return {key: self.nutrients(key) for key in keys}
+
+
+# state of a pool worker process, set up once by _init_worker
+_worker: Dict[str, Any] = {}
+
+
+def _init_worker(fuzzy: bool):
+    _worker["foods"] = OfflineFoods.from_env(fuzzy)
+    _worker["vectors"] = {}
+
+
+def _analyze_chunk(records: List[Any]) -> List[Dict[str, Any]]:
+    if len(_worker["vectors"]) > MAX_MEMO_FOODS:
+        _worker["vectors"].clear()
+    return list(analyze_records(records, _worker["vectors"], _worker["foods"].resolve))
+
+
+# ----------------- input / output -----------------
+def _open(path: str, mode: str) -> TextIO:
+    if path == "-":
+        return sys.stdin if mode == "r" else sys.stdout
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8", newline="")
+    return open(path, mode, encoding="utf-8", newline="")
+
+
+def _format_of(path: str, given: Optional[str]) -> str:
+    if given:
+        return given
+    name = path[:-3] if path.endswith(".gz") else path
+    return "csv" if name.endswith(".csv") else "jsonl"
+
+
+def read_jsonl(fh: TextIO) -> Iterator[Dict[str, Any]]:
+    for line in fh:
+        line = line.strip()
+        if line:
+            try:
+                yield json.loads(line)
+            except Exception as e:
+                yield {"_error": f"invalid JSON line: {e}"}
+
+
+def read_csv(fh: TextIO) -> Iterator[Dict[str, Any]]:
+    """One record per run of consecutive rows with the same id."""
+    record = None
+    for row in csv.DictReader(fh):
+        rec_id = row.get("id")
+        if record is None or rec_id != record["id"]:
+            if record is not None:
+                yield record
+            record = {"id": rec_id, "gender": row.get("gender"), "height": row.get("height"),
+                      "weight": row.get("weight"), "meals": []}
+        record["meals"].append({"date": row.get("date"),
+                                "items": [{"name": row.get("food") or row.get("name"), "qty": row.get("qty")}]})
+    if record is not None:
+        yield record
+
+
+def chunked(records: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    chunk = []
+    for rec in records:
+        chunk.append(rec)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class CSVResultWriter:
+    """One row per record and day; amounts as numbers in each nutrient's display unit."""
+
+    def __init__(self, fh: TextIO):
+        self._csv = csv.writer(fh)
+        self._csv.writerow(["id", "date"] + [f"{n} ({NUTRIENT_PANEL[n][2]})" for n in TRACKED_NUTRIENTS]
+                           + ["deficient", "unresolved", "error"])
+
+    def write(self, result: Dict[str, Any]):
+        if "error" in result:
+            self._csv.writerow([result.get("id"), ""] + [""] * len(TRACKED_NUTRIENTS) + ["", "", result["error"]])
+            return
+        unresolved = "; ".join(result["unresolved"])
+        for day in result["days"]:
+            totals = day["total_nutrients"]
+            self._csv.writerow([result["id"], day["date"]]
+                               + [totals[n].split()[0] if n in totals else "0" for n in TRACKED_NUTRIENTS]
+                               + ["; ".join(f"{n} {amount}" for n, amount in day["deficient"].items()),
+                                  unresolved, ""])
+
+
+class JSONLResultWriter:
+    def __init__(self, fh: TextIO):
+        self._fh = fh
+
+    def write(self, result: Dict[str, Any]):
+        self._fh.write(json.dumps(result, ensure_ascii=False) + "\n")
+
+
+def run(records: Iterable[Any], write: Callable[[Dict[str, Any]], None], workers: int, chunk: int,
+        fuzzy: bool = True, on_chunk: Callable[[], None] = None) -> Dict[str, int]:
+    """
+    Analyze `records` in chunks of `chunk` on `workers` processes, passing each result to
+    `write` in input order. At most 2 chunks per worker are in flight at a time.
+    """
+    counts = {"records": 0, "errors": 0, "unresolved_foods": 0}
+
+    def emit(results: List[Dict[str, Any]]):
+        for result in results:
+            counts["records"] += 1
+            if "error" in result:
+                counts["errors"] += 1
+            else:
+                counts["unresolved_foods"] += len(result["unresolved"])
+            write(result)
+        if on_chunk:
+            on_chunk()
+
+    if workers <= 1:
+        _init_worker(fuzzy)
+        for part in chunked(records, chunk):
+            emit(_analyze_chunk(part))
+        return counts
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(fuzzy,)) as pool:
+        pending: deque = deque()
+        for part in chunked(records, chunk):
+            pending.append(pool.submit(_analyze_chunk, part))
+            if len(pending) >= 2 * workers:
+                emit(pending.popleft().result())
+        while pending:
+            emit(pending.popleft().result())
+    return counts
+
+
+def main(argv=None) -> int:
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="meal log (.csv or .jsonl, optionally .gz; '-' for stdin)")
+    parser.add_argument("output", help="results (.csv or .jsonl, optionally .gz; '-' for stdout)")
+    parser.add_argument("--input-format", choices=("csv", "jsonl"), help="default: from the file name")
+    parser.add_argument("--output-format", choices=("csv", "jsonl"), help="default: from the file name")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="processes (default: all cores)")
+    parser.add_argument("--chunk", type=int, default=DEFAULT_CHUNK, help="records per chunk")
+    parser.add_argument("--no-fuzzy", action="store_true", help="only exact food names (skip typo matching)")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    src = _open(args.input, "r")
+    dst = _open(args.output, "w")
+    try:
+        records = read_csv(src) if _format_of(args.input, args.input_format) == "csv" else read_jsonl(src)
+        writer = CSVResultWriter(dst) if _format_of(args.output, args.output_format) == "csv" else JSONLResultWriter(dst)
+        counts = run(records, writer.write, args.workers, args.chunk, fuzzy=not args.no_fuzzy, on_chunk=dst.flush)
+    finally:
+        if src is not sys.stdin:
+            src.close()
+        if dst is not sys.stdout:
+            dst.close()
+    elapsed = time.perf_counter() - started
+    print(f"{counts['records']} records ({counts['errors']} invalid, {counts['unresolved_foods']} unresolved foods) "
+          f"in {elapsed:.1f} s, {counts['records'] / elapsed if elapsed else 0:.0f} records/s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
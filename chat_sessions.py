@@ -0,0 +1,177 @@
+# chat_sessions.py
+"""
+Server-side chat sessions shared by every gunicorn worker (SQLite, WAL mode).
+
+A session holds the nutrition analysis it was opened with, a rolling summary of
+older turns and the most recent turns verbatim:
+- sessions expire `ttl` seconds after their last use; above `max_sessions` the least
+  recently used ones are dropped
+- after each turn, history beyond `token_budget` (estimated tokens) is folded into the
+  summary, oldest first, and the summary itself is capped at `summary_tokens`, so the
+  prompt built from a session stays the same size however long the conversation runs
+Compaction is extractive (turns are clipped, not re-written by the model), so it
+costs no extra LLM call.
+"""
+
+import os
+import json
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlite_store import SQLiteStore
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "chat_sessions.sqlite3")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    analysis TEXT NOT NULL,
+    lang TEXT NOT NULL,
+    summary TEXT NOT NULL DEFAULT '',
+    accessed REAL NOT NULL,
+    expires REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_accessed ON sessions(accessed);
+CREATE TABLE IF NOT EXISTS turns (
+    session_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    text TEXT NOT NULL,
+    tokens INTEGER NOT NULL,
+    PRIMARY KEY (session_id, seq)
+);
+"""
+
+# analysis fields the chat prompt uses; anything else the client sends is not stored
+ANALYSIS_FIELDS = ("total_nutrients", "deficient")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token), good enough for budgeting."""
+    return len(text or "") // 4 + 1
+
+
+def clip(text: str, tokens: int) -> str:
+    text = " ".join((text or "").split())
+    limit = tokens * 4
+    return text if len(text) <= limit else text[:limit - 1].rstrip() + "…"
+
+
+class ChatSessionStore:
+    def __init__(self, path: str = DEFAULT_PATH, ttl: float = 6 * 3600, max_sessions: int = 10000,
+                 token_budget: int = 1500, summary_tokens: int = 300, turn_tokens: int = 400):
+        self.path = path
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.token_budget = token_budget
+        self.summary_tokens = summary_tokens
+        self.turn_tokens = turn_tokens
+        self._store = SQLiteStore(path, _SCHEMA)
+        self._creates = 0
+
+    @classmethod
+    def from_env(cls) -> "ChatSessionStore":
+        return cls(
+            path=os.getenv("CHAT_SESSION_PATH", DEFAULT_PATH),
+            ttl=float(os.getenv("CHAT_SESSION_TTL", str(6 * 3600))),
+            max_sessions=int(os.getenv("CHAT_SESSION_MAX", "10000")),
+            token_budget=int(os.getenv("CHAT_TOKEN_BUDGET", "1500")),
+            summary_tokens=int(os.getenv("CHAT_SUMMARY_TOKENS", "300")),
+        )
+
+    # ---------- sessions ----------
+    def create(self, analysis: Dict[str, Any], lang: str = "en") -> str:
+        session_id = uuid.uuid4().hex
+        now = time.time()
+        context = {k: (analysis or {}).get(k) or {} for k in ANALYSIS_FIELDS}
+        with self._store.connection() as conn:
+            conn.execute(
+                "INSERT INTO sessions (id, analysis, lang, accessed, expires) VALUES (?, ?, ?, ?, ?)",
+                (session_id, json.dumps(context, ensure_ascii=False), lang or "en", now, now + self.ttl))
+        self._creates += 1
+        if self._creates % 100 == 0:
+            self.evict()
+        return session_id
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """The session (analysis, lang, summary, recent turns) or None; refreshes its TTL."""
+        now = time.time()
+        with self._store.connection() as conn:
+            row = conn.execute("SELECT analysis, lang, summary, expires FROM sessions WHERE id = ?",
+                               (session_id,)).fetchone()
+            if row is None or row[3] < now:
+                return None
+            conn.execute("UPDATE sessions SET accessed = ?, expires = ? WHERE id = ?", (now, now + self.ttl, session_id))
+            turns = conn.execute("SELECT role, text FROM turns WHERE session_id = ? ORDER BY seq",
+                                 (session_id,)).fetchall()
+            return {"id": session_id, "analysis": json.loads(row[0]), "lang": row[1], "summary": row[2],
+                    "turns": [(role, clip(text, self.turn_tokens)) for role, text in turns]}
+
+    def delete(self, session_id: str):
+        with self._store.connection() as conn:
+            conn.execute("DELETE FROM turns WHERE session_id = ?", (session_id,))
+            conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def add_turn(self, session_id: str, message: str, reply: str):
+        """Record a user message and its reply, then compact the history to the token budget."""
+        with self._store.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM turns WHERE session_id = ?",
+                                   (session_id,)).fetchone()[0]
+                conn.executemany(
+                    "INSERT INTO turns (session_id, seq, role, text, tokens) VALUES (?, ?, ?, ?, ?)",
+                    [(session_id, seq + 1, "user", message, estimate_tokens(clip(message, self.turn_tokens))),
+                     (session_id, seq + 2, "assistant", reply, estimate_tokens(clip(reply, self.turn_tokens)))])
+                self._compact(conn, session_id)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def _compact(self, conn, session_id: str):
+        turns = conn.execute("SELECT seq, role, text, tokens FROM turns WHERE session_id = ? ORDER BY seq DESC",
+                             (session_id,)).fetchall()
+        kept = 0
+        folded: List[Tuple[int, str, str]] = []
+        for seq, role, text, tokens in turns:
+            # always keep the newest exchange, then newer turns as long as they fit in the budget
+            if not folded and (kept + tokens <= self.token_budget or seq > turns[0][0] - 2):
+                kept += tokens
+            else:
+                folded.append((seq, role, text))
+        if not folded:
+            return
+        folded.reverse()
+        summary = conn.execute("SELECT summary FROM sessions WHERE id = ?", (session_id,)).fetchone()[0]
+        lines = [line for line in summary.split("\n") if line]
+        per_line = max(20, self.summary_tokens // 8)
+        lines += [f"{'User' if role == 'user' else 'Assistant'}: {clip(text, per_line)}" for _, role, text in folded]
+        # drop the oldest summary lines until the summary fits
+        while len(lines) > 1 and estimate_tokens("\n".join(lines)) > self.summary_tokens:
+            lines.pop(0)
+        conn.execute("UPDATE sessions SET summary = ? WHERE id = ?", ("\n".join(lines), session_id))
+        conn.execute("DELETE FROM turns WHERE session_id = ? AND seq <= ?", (session_id, folded[-1][0]))
+
+    # ---------- maintenance ----------
+    def evict(self) -> int:
+        """Drop expired sessions, then the least recently used ones above max_sessions."""
+        with self._store.connection() as conn:
+            removed = conn.execute("DELETE FROM sessions WHERE expires < ?", (time.time(),)).rowcount
+            count = conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+            if count > self.max_sessions:
+                removed += conn.execute(
+                    "DELETE FROM sessions WHERE id IN (SELECT id FROM sessions ORDER BY accessed LIMIT ?)",
+                    (count - self.max_sessions,)).rowcount
+            if removed:
+                conn.execute("DELETE FROM turns WHERE session_id NOT IN (SELECT id FROM sessions)")
+            return removed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._store.connection() as conn:
+            sessions, expired = conn.execute("SELECT COUNT(*), SUM(expires < ?) FROM sessions",
+                                             (time.time(),)).fetchone()
+            turns = conn.execute("SELECT COUNT(*) FROM turns").fetchone()[0]
+            return {"sessions": sessions, "expired": expired or 0, "turns": turns,
+                    "max_sessions": self.max_sessions, "token_budget": self.token_budget}
@@ -0,0 +1,241 @@
+# circuit_breaker.py
+"""
+Circuit breakers and a retry budget for the upstream APIs (USDA, WeatherAPI, Gemini).
+
+Breaker state lives in SQLite, so every gunicorn worker sees the same state:
+- closed: calls go through; `failure_threshold` upstream failures in a row open it
+- open: calls fail at once with UpstreamUnavailable (no network wait) for `reset_timeout` s
+- half-open: then exactly one caller, across all workers, is let through as a probe;
+  its success closes the breaker, its failure opens it again
+Only upstream failures count (connection errors, timeouts, 5xx and 429); a 4xx or
+"not found" answer means the upstream is up (and closes a half-open breaker). A probe
+that ends any other way (our own deadline, a client that went away) hands the probe
+back at once instead of holding it for `probe_timeout`. Callers pass count_timeout=False when
+the timeout was cut short by a client's deadline, which proves nothing either.
+
+RetryBudget caps retries (and hedged requests) at a fraction of recent calls, per
+worker, so retries cannot multiply the load on an upstream that is already struggling.
+"""
+
+import os
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator
+
+from sqlite_store import SQLiteStore
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "circuit_breakers.sqlite3")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS breakers (
+    name TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    failures INTEGER NOT NULL,
+    opened_at REAL NOT NULL,
+    probe_until REAL NOT NULL
+);
+"""
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class UpstreamUnavailable(Exception):
+    def __init__(self, upstream: str, retry_after: float = 0.0):
+        super().__init__(f"{upstream} is unavailable")
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+
+def is_upstream_failure(e: BaseException, count_timeout: bool = True) -> bool:
+    """True for errors that say the upstream is down or overloaded, not that the request was bad."""
+    if isinstance(e, UpstreamUnavailable):
+        return False
+    status = getattr(getattr(e, "response", None), "status_code", None)
+    if status is None:
+        status = getattr(e, "code", None)          # google-genai APIError
+    if isinstance(status, int) and status >= 400:
+        return status >= 500 or status == 429
+    name = type(e).__name__
+    if "Timeout" in name:                           # requests / httpx / builtin
+        return count_timeout
+    return "Connect" in name
+
+
+def is_client_error(e: BaseException) -> bool:
+    """True for a 4xx answer other than 429: the request was refused, but the upstream is up."""
+    status = getattr(getattr(e, "response", None), "status_code", None)
+    if status is None:
+        status = getattr(e, "code", None)
+    return isinstance(status, int) and 400 <= status < 500 and status != 429
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, store: SQLiteStore, failure_threshold: int = 5,
+                 reset_timeout: float = 30.0, probe_timeout: float = 15.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.probe_timeout = probe_timeout
+        self._store = store
+
+    def _row(self):
+        with self._store.connection() as conn:
+            return conn.execute(
+                "SELECT state, failures, opened_at, probe_until FROM breakers WHERE name = ?", (self.name,)).fetchone()
+
+    def is_open(self) -> bool:
+        """Read-only check: open and not yet due for a probe (callers may skip work entirely)."""
+        row = self._row()
+        if row is None or row[0] == CLOSED:
+            return False
+        now = time.time()
+        if row[0] == OPEN:
+            return now < row[2] + self.reset_timeout
+        return now < row[3]          # half-open with a probe in flight
+
+    def retry_after(self) -> float:
+        row = self._row()
+        if row is None or row[0] == CLOSED:
+            return 0.0
+        return max(0.0, row[2] + self.reset_timeout - time.time())
+
+    def allow(self) -> bool:
+        """May a call go out now? In the half-open state only the caller that claims the probe gets True."""
+        return self._admit()[0]
+
+    def _admit(self):
+        """(allowed, probe claim): the claim is the probe_until this caller set, None when not probing."""
+        row = self._row()
+        if row is None or row[0] == CLOSED:
+            return True, None
+        now = time.time()
+        if row[0] == OPEN and now < row[2] + self.reset_timeout:
+            return False, None
+        if row[0] == HALF_OPEN and now < row[3]:
+            return False, None
+        # claim the probe; the WHERE clause makes sure only one caller wins
+        claim = now + self.probe_timeout
+        with self._store.connection() as conn:
+            cur = conn.execute(
+                "UPDATE breakers SET state = ?, probe_until = ? WHERE name = ? AND state = ? AND probe_until = ?",
+                (HALF_OPEN, claim, self.name, row[0], row[3]))
+        return (True, claim) if cur.rowcount == 1 else (False, None)
+
+    def release_probe(self, claim: float):
+        """Give back a probe that ended without an answer, so the next caller may probe now."""
+        with self._store.connection() as conn:
+            conn.execute("UPDATE breakers SET probe_until = ? WHERE name = ? AND state = ? AND probe_until = ?",
+                         (time.time(), self.name, HALF_OPEN, claim))
+
+    def record_success(self):
+        row = self._row()
+        if row is not None and (row[0] != CLOSED or row[1]):
+            with self._store.connection() as conn:
+                conn.execute(
+                    "UPDATE breakers SET state = ?, failures = 0, probe_until = 0 WHERE name = ?", (CLOSED, self.name))
+
+    def record_failure(self):
+        now = time.time()
+        with self._store.connection() as conn:
+            conn.execute("INSERT OR IGNORE INTO breakers (name, state, failures, opened_at, probe_until) "
+                         "VALUES (?, ?, 0, 0, 0)", (self.name, CLOSED))
+            # a failed probe re-opens at once; otherwise open after enough failures in a row
+            conn.execute(
+                "UPDATE breakers SET failures = failures + 1, "
+                "opened_at = CASE WHEN state = ? OR failures + 1 >= ? THEN ? ELSE opened_at END, "
+                "state = CASE WHEN state = ? OR failures + 1 >= ? THEN ? ELSE state END, probe_until = 0 "
+                "WHERE name = ?",
+                (HALF_OPEN, self.failure_threshold, now, HALF_OPEN, self.failure_threshold, OPEN, self.name))
+
+    @contextmanager
+    def guard(self, count_timeout: bool = True) -> Iterator[None]:
+        """Run the body as one upstream call: fail fast when open, record the outcome."""
+        allowed, claim = self._admit()
+        if not allowed:
+            raise UpstreamUnavailable(self.name, self.retry_after())
+        try:
+            yield
+        except BaseException as e:
+            if is_upstream_failure(e, count_timeout):
+                self.record_failure()
+            elif is_client_error(e):
+                self.record_success()
+            elif claim is not None:
+                # our own deadline, a closed stream...: says nothing about health, free the probe
+                self.release_probe(claim)
+            raise
+        self.record_success()
+
+    def call(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        with self.guard():
+            return fn(*args, **kwargs)
+
+    def state(self) -> Dict[str, Any]:
+        row = self._row()
+        if row is None:
+            return {"state": CLOSED, "failures": 0, "retry_after": 0.0}
+        state = row[0]
+        if state == OPEN and time.time() >= row[2] + self.reset_timeout:
+            state = "open (probe due)"
+        return {"state": state, "failures": row[1], "retry_after": round(self.retry_after(), 1)}
+
+
+class RetryBudget:
+    """Allow retries up to `ratio` of the calls made in the last `window` seconds (plus `min_retries`)."""
+
+    def __init__(self, ratio: float = 0.2, window: float = 10.0, min_retries: int = 3):
+        self.ratio = ratio
+        self.window = window
+        self.min_retries = min_retries
+        self._calls: deque = deque()
+        self._retries: deque = deque()
+        self._lock = threading.Lock()
+
+    def _trim(self, now: float):
+        for q in (self._calls, self._retries):
+            while q and q[0] < now - self.window:
+                q.popleft()
+
+    def record_call(self):
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            self._calls.append(now)
+
+    def try_retry(self) -> bool:
+        """Take one retry from the budget; False when it is spent."""
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            if len(self._retries) >= self.min_retries + self.ratio * len(self._calls):
+                return False
+            self._retries.append(now)
+            return True
+
+
+class Upstreams:
+    """One breaker per upstream name, sharing a SQLite file, plus a shared retry budget."""
+
+    def __init__(self, names, path: str = DEFAULT_PATH, failure_threshold: int = 5,
+                 reset_timeout: float = 30.0, retry_ratio: float = 0.2):
+        store = SQLiteStore(path, _SCHEMA)
+        self.breakers = {n: CircuitBreaker(n, store, failure_threshold, reset_timeout) for n in names}
+        self.retry_budget = RetryBudget(ratio=retry_ratio)
+
+    @classmethod
+    def from_env(cls, names) -> "Upstreams":
+        return cls(
+            names,
+            path=os.getenv("BREAKER_PATH", DEFAULT_PATH),
+            failure_threshold=int(os.getenv("BREAKER_FAILURES", "5")),
+            reset_timeout=float(os.getenv("BREAKER_RESET", "30")),
+            retry_ratio=float(os.getenv("RETRY_BUDGET_RATIO", "0.2")),
+        )
+
+    def __getitem__(self, name: str) -> CircuitBreaker:
+        return self.breakers[name]
+
+    def states(self) -> Dict[str, Dict[str, Any]]:
+        return {n: b.state() for n, b in self.breakers.items()}
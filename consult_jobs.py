@@ -0,0 +1,259 @@
+# consult_jobs.py
+"""
+Background job queue for Gemini consultations.
+
+- submit() puts a job on a bounded in-process priority queue and returns its id at once;
+  when the queue is full it raises QueueFull with a Retry-After estimate
+- a fixed number of worker threads run the jobs (this caps concurrent Gemini calls)
+- job status and results live in SQLite, so any gunicorn worker can answer a poll
+- the process holding a queued or running job renews its lease on it; a job whose
+  lease ran out (its worker died or was restarted) is failed, so polls end, and a
+  result that comes in after that is dropped rather than flipping the status back
+- stats() reports queue depth, running jobs and queue wait times
+"""
+
+import os
+import json
+import math
+import time
+import uuid
+import queue
+import sqlite3
+import itertools
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+from sqlite_store import SQLiteStore
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "consult_jobs.sqlite3")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    result TEXT,
+    error TEXT,
+    queued_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    owner TEXT,
+    lease_until REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_finished ON jobs(finished_at);
+"""
+
+# added after the first release; job tables from before get them on startup
+_LEASE_COLUMNS = {"owner": "TEXT", "lease_until": "REAL"}
+
+LOST_JOB_ERROR = "the server process running this job stopped; submit it again"
+
+PRIORITIES = {"high": 0, "normal": 5, "low": 9}
+
+
+class QueueFull(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__(f"Consultation queue is full, retry in {retry_after} s")
+        self.retry_after = retry_after
+
+
+class JobQueue:
+    def __init__(self, handler: Callable[[Dict[str, Any]], Any], path: str = DEFAULT_PATH,
+                 workers: int = 2, maxsize: int = 50, result_ttl: float = 900.0, lease: float = 60.0):
+        self.handler = handler
+        self.workers = workers
+        self.maxsize = maxsize
+        self.result_ttl = result_ttl
+        self.lease = lease
+        self._store = SQLiteStore(path, _SCHEMA)
+        self._owner = None                     # this process's id on the jobs it holds
+        self._add_lease_columns()
+        self._queue: "queue.PriorityQueue" = queue.PriorityQueue(maxsize=maxsize)
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._pid = None
+        self._running = 0
+        self._waits = deque(maxlen=500)        # seconds spent queued, recent jobs
+        self._service = deque(maxlen=100)      # seconds spent running, recent jobs
+        self.rejected = 0
+        self.submitted = 0
+
+    @classmethod
+    def from_env(cls, handler: Callable[[Dict[str, Any]], Any]) -> "JobQueue":
+        return cls(
+            handler,
+            path=os.getenv("CONSULT_JOBS_PATH", DEFAULT_PATH),
+            workers=int(os.getenv("CONSULT_JOB_WORKERS", "2")),
+            maxsize=int(os.getenv("CONSULT_QUEUE_SIZE", "50")),
+            result_ttl=float(os.getenv("CONSULT_JOB_TTL", "900")),
+            lease=float(os.getenv("CONSULT_JOB_LEASE", "60")),
+        )
+
+    # ---------- workers ----------
+    def _ensure_workers(self):
+        # started lazily, and again in each forked worker process
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.PriorityQueue(maxsize=self.maxsize)
+            self._running = 0
+            self._owner = uuid.uuid4().hex
+            for i in range(self.workers):
+                threading.Thread(target=self._work, name=f"consult-job-{i}", daemon=True).start()
+            threading.Thread(target=self._renew_loop, name="consult-job-lease", daemon=True).start()
+            self._pid = os.getpid()
+
+    def _add_lease_columns(self):
+        with self._store.connection() as conn:
+            have = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for name, kind in _LEASE_COLUMNS.items():
+                if name not in have:
+                    try:
+                        conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {kind}")
+                    except sqlite3.OperationalError:
+                        pass    # another worker added it first
+
+    def _renew_loop(self):
+        while True:
+            time.sleep(self.lease / 3)
+            try:
+                self.renew()
+                self.expire()
+            except Exception:
+                pass
+
+    def renew(self) -> int:
+        """Extend the lease on every job this process holds; returns how many."""
+        with self._store.connection() as conn:
+            return conn.execute(
+                "UPDATE jobs SET lease_until = ? WHERE owner = ? AND status IN ('queued', 'running')",
+                (time.time() + self.lease, self._owner)).rowcount
+
+    def expire(self, job_id: Optional[str] = None) -> int:
+        """Fail queued or running jobs (all, or just `job_id`) whose lease ran out; returns how many."""
+        now = time.time()
+        sql = ("UPDATE jobs SET status = 'error', error = ?, finished_at = ? "
+               "WHERE status IN ('queued', 'running') AND COALESCE(lease_until, 0) < ?")
+        params = [LOST_JOB_ERROR, now, now]
+        if job_id is not None:
+            sql += " AND id = ?"
+            params.append(job_id)
+        with self._store.connection() as conn:
+            return conn.execute(sql, params).rowcount
+
+    def _work(self):
+        while True:
+            _prio, _seq, job_id, payload, queued_at = self._queue.get()
+            started = time.time()
+            with self._lock:
+                self._running += 1
+                self._waits.append(started - queued_at)
+            try:
+                with self._store.connection() as conn:
+                    claimed = conn.execute(
+                        "UPDATE jobs SET status = 'running', started_at = ? "
+                        "WHERE id = ? AND status = 'queued' AND owner = ?", (started, job_id, self._owner)).rowcount
+                if not claimed:
+                    continue        # failed by expire() while it waited
+                # the result only counts while the job is still ours and running
+                finish = "WHERE id = ? AND status = 'running' AND owner = ?"
+                try:
+                    result = self.handler(payload)
+                    with self._store.connection() as conn:
+                        conn.execute("UPDATE jobs SET status = 'done', result = ?, finished_at = ? " + finish,
+                                     (json.dumps(result, ensure_ascii=False), time.time(), job_id, self._owner))
+                except Exception as e:
+                    with self._store.connection() as conn:
+                        conn.execute("UPDATE jobs SET status = 'error', error = ?, finished_at = ? " + finish,
+                                     (str(e) or e.__class__.__name__, time.time(), job_id, self._owner))
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._service.append(time.time() - started)
+                self._queue.task_done()
+
+    # ---------- API ----------
+    def retry_after(self) -> int:
+        """Rough seconds until a slot frees up: queued work / workers x mean service time."""
+        with self._lock:
+            mean = sum(self._service) / len(self._service) if self._service else 10.0
+        return max(1, math.ceil(mean * (self._queue.qsize() + 1) / max(1, self.workers)))
+
+    def submit(self, payload: Dict[str, Any], priority: int = PRIORITIES["normal"]) -> str:
+        self._ensure_workers()
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._store.connection() as conn:
+            conn.execute("INSERT INTO jobs (id, status, priority, queued_at, owner, lease_until) "
+                         "VALUES (?, 'queued', ?, ?, ?, ?)", (job_id, priority, now, self._owner, now + self.lease))
+        try:
+            self._queue.put_nowait((priority, next(self._seq), job_id, payload, now))
+        except queue.Full:
+            with self._store.connection() as conn:
+                conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+            with self._lock:
+                self.rejected += 1
+            raise QueueFull(self.retry_after())
+        self.submitted += 1
+        if self.submitted % 50 == 0:
+            self.cleanup()
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._store.connection() as conn:
+            row = conn.execute(
+                "SELECT id, status, priority, result, error, queued_at, started_at, finished_at, lease_until "
+                "FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is not None and row[1] in ("queued", "running") and (row[8] or 0) < time.time() and self.expire(job_id):
+            return self.get(job_id)
+        if row is None:
+            return None
+        job = {"id": row[0], "status": row[1], "priority": row[2], "queued_at": row[5],
+               "started_at": row[6], "finished_at": row[7]}
+        if row[3] is not None:
+            job["result"] = json.loads(row[3])
+        if row[4] is not None:
+            job["error"] = row[4]
+        return job
+
+    def wait(self, job_id: str, timeout: float, poll_interval: float = 0.25) -> Optional[Dict[str, Any]]:
+        """Long-poll: return the job once it is done/error or when `timeout` runs out."""
+        deadline = time.time() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is None or job["status"] in ("done", "error") or time.time() >= deadline:
+                return job
+            time.sleep(poll_interval)
+
+    def cleanup(self) -> int:
+        self.expire()
+        with self._store.connection() as conn:
+            return conn.execute(
+                "DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?",
+                (time.time() - self.result_ttl,)).rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        """Read-only (scraped by /metrics): lapsed jobs are failed by the lease thread, get() and cleanup()."""
+        with self._lock:
+            waits = sorted(self._waits)
+            running = self._running
+        def pct(p):
+            return round(waits[min(len(waits) - 1, int(p / 100.0 * len(waits)))] * 1000, 1) if waits else 0.0
+        with self._store.connection() as conn:
+            counts = dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return {
+            "worker": {
+                "depth": self._queue.qsize(),
+                "capacity": self.maxsize,
+                "running": running,
+                "workers": self.workers,
+                "rejected": self.rejected,
+                "wait_ms": {"p50": pct(50), "p95": pct(95), "max": round(waits[-1] * 1000, 1) if waits else 0.0},
+            },
+            # across all gunicorn workers (from the shared job table)
+            "all": {"queued": counts.get("queued", 0), "running": counts.get("running", 0),
+                    "done": counts.get("done", 0), "error": counts.get("error", 0)},
+        }
@@ -0,0 +1,69 @@
+# deadline.py
+"""
+Request-scoped deadlines.
+
+An endpoint creates one Deadline for its whole time budget and hands it to every
+upstream call, which uses only what is left of it:
+
+    deadline = Deadline.from_header(request.headers.get(DEADLINE_HEADER), default=10.0, maximum=110.0)
+    r = session.get(url, timeout=deadline.timeout(cap=8))   # raises DeadlineExceeded when spent
+
+Clients may ask for a different budget with the X-Request-Deadline-Ms header; it is
+capped at the endpoint's maximum (keep that below the gunicorn worker timeout) and
+raised to a minimum. When a client asked for less than the endpoint's default,
+limits(cap) tells whether that budget, rather than the call's own cap, bounds a call:
+its timeout then says nothing about the upstream's health.
+"""
+
+import time
+from typing import Optional
+
+DEADLINE_HEADER = "X-Request-Deadline-Ms"
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class Deadline:
+    def __init__(self, seconds: float):
+        self.budget = seconds
+        self.expires = time.monotonic() + seconds
+        self.shortened = False      # a client asked for less than the default
+
+    @classmethod
+    def from_header(cls, value: Optional[str], default: float, maximum: float,
+                    minimum: float = 0.0) -> "Deadline":
+        """Budget from an X-Request-Deadline-Ms value, else `default`; within [minimum, maximum]."""
+        seconds = default
+        if value:
+            try:
+                ms = float(value)
+            except ValueError:
+                ms = 0.0
+            if ms > 0:
+                seconds = max(ms / 1000.0, minimum)
+        deadline = cls(min(seconds, maximum))
+        deadline.shortened = deadline.budget < default
+        return deadline
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires
+
+    def elapsed(self) -> float:
+        return self.budget - (self.expires - time.monotonic())
+
+    def timeout(self, cap: Optional[float] = None, what: str = "request") -> float:
+        """Seconds an upstream call may take: what is left, at most `cap`. Raises when nothing is left."""
+        left = self.remaining()
+        if left <= 0.01:
+            raise DeadlineExceeded(f"{what}: request deadline exceeded")
+        return min(left, cap) if cap is not None else left
+
+    def limits(self, cap: Optional[float] = None) -> bool:
+        """Whether a client's shorter budget, not `cap`, bounds a call made now."""
+        return self.shortened and (cap is None or self.remaining() < cap)
@@ -45,13 +45,20 @@ cat > "$PROJECT_DIR/requirements-min.txt" <<'REQ'
 Flask==3.1.2
 requests
 gunicorn
+gevent
 python-dotenv
+numpy
+tenacity
+Brotli
 REQ
 
 # Install minimal + google-genai
 "$VENV_DIR/bin/pip" install -r "$PROJECT_DIR/requirements-min.txt"
 "$VENV_DIR/bin/pip" install google-genai
 
+# Fingerprinted, precompressed static assets (static/dist/, served by nginx below)
+"$VENV_DIR/bin/python" "$PROJECT_DIR/assets.py" build
+
 # 2) Write .env (do not overwrite if exists unless user confirms)
 if [[ -f "$ENV_FILE" ]]; then
   echo ".env already exists at $ENV_FILE (will overwrite)."
@@ -68,7 +75,7 @@ echo "Wrote $ENV_FILE (mode 600)."
 
 # 3) Quick gunicorn test (background): test socket creation
 echo "Testing gunicorn startup (short test)..."
-"$VENV_DIR/bin/gunicorn" --chdir "$PROJECT_DIR" --bind "unix:$SOCKET_PATH" --workers 1 app:app &
+NUTRI_WORKERS=1 "$VENV_DIR/bin/gunicorn" -c "$PROJECT_DIR/gunicorn.conf.py" --chdir "$PROJECT_DIR" --bind "unix:$SOCKET_PATH" app:app &
 GTEST_PID=$!
 sleep 2
 if [[ -S "$SOCKET_PATH" ]]; then
@@ -95,7 +102,7 @@ Group=$(id -gn)
 WorkingDirectory=$PROJECT_DIR
 EnvironmentFile=$ENV_FILE
 Environment=PATH=$VENV_DIR/bin
-ExecStart=$VENV_DIR/bin/gunicorn --chdir $PROJECT_DIR --workers 3 --bind unix:$SOCKET_PATH --timeout 120 app:app
+ExecStart=$VENV_DIR/bin/gunicorn -c $PROJECT_DIR/gunicorn.conf.py --chdir $PROJECT_DIR --bind unix:$SOCKET_PATH app:app
 Restart=on-failure
 RestartSec=3
 LimitNOFILE=65536
@@ -115,6 +122,12 @@ sudo systemctl status "$SERVICE_NAME" --no-pager
 echo "Installing nginx (if missing) and creating site..."
 sudo apt-get update -y
 sudo apt-get install -y nginx
+# serves the .br files of static/dist/ (not packaged everywhere; gzip_static is built in)
+if sudo apt-get install -y libnginx-mod-http-brotli-static; then
+  BROTLI_STATIC="brotli_static on;"
+else
+  BROTLI_STATIC="# brotli_static: module not available"
+fi
 
 sudo tee "$NGINX_SITE" > /dev/null <<'EOF'
 server {
@@ -126,6 +139,23 @@ server {
         proxy_pass http://unix:REPLACE_SOCKET;
     }
 
+    # Prometheus scrapes from this host only
+    location = /metrics {
+        allow 127.0.0.1;
+        deny all;
+        include proxy_params;
+        proxy_pass http://unix:REPLACE_SOCKET;
+    }
+
+    # fingerprinted copies (assets.py): the name changes with the content, so cache forever
+    location /static/dist/ {
+        alias REPLACE_PROJECT/static/dist/;
+        gzip_static on;
+        REPLACE_BROTLI
+        add_header Cache-Control "public, max-age=31536000, immutable";
+        add_header Vary Accept-Encoding;
+    }
+
     location /static/ {
         alias REPLACE_PROJECT/static/;
         expires 1d;
@@ -142,6 +172,7 @@ EOF
 # replace placeholders
 sudo sed -i "s|REPLACE_SOCKET|$SOCKET_PATH|g" "$NGINX_SITE"
 sudo sed -i "s|REPLACE_PROJECT|$PROJECT_DIR|g" "$NGINX_SITE"
+sudo sed -i "s|REPLACE_BROTLI|$BROTLI_STATIC|g" "$NGINX_SITE"
 
 sudo ln -sf "$NGINX_SITE" /etc/nginx/sites-enabled/"$SERVICE_NAME"
 sudo nginx -t
@@ -0,0 +1,180 @@
+# food_index.py
+"""
+In-memory food composition index.
+
+Foods are rows of a float matrix (foods x nutrients, canonical amounts per 100 g:
+mg, or kcal for Energy; see nutrition.py) with a normalized-name -> row dict in front of it, so resolving a known food is a dict
+lookup plus one row read and never touches the network.
+
+Sources:
+- dataset.csv (columns: Food, Protein, Vitamin C, Iron, Calcium, Fiber, Energy)
+- optionally a USDA FoodData Central "Foundation" / "SR Legacy" JSON download,
+  or a compiled .npz of one (see `python food_index.py compile`)
+"""
+
+import os
+import csv
+import sys
+import json
+from typing import Dict, List, Optional, Iterable, Tuple
+
+import numpy as np
+
+from nutrition import TRACKED_NUTRIENTS, map_usda_nutrients, to_canonical
+
+DATASET_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dataset.csv")
+
+# units of the per-100 g columns in dataset.csv
+COLUMN_UNITS = {
+    "Protein": "g",
+    "Vitamin C": "mg",
+    "Iron": "mg",
+    "Calcium": "mg",
+    "Fiber": "g",
+    "Energy": "kcal",
+}
+
+
+def normalize_food_name(name: str) -> str:
+    return " ".join((name or "").lower().split())
+
+
+class FoodIndex:
+    def __init__(self, columns: Iterable[str] = tuple(TRACKED_NUTRIENTS)):
+        self.columns: List[str] = list(columns)
+        self.names: List[str] = []
+        self.sources: List[str] = []
+        self.rows: Dict[str, int] = {}
+        self.matrix = np.zeros((0, len(self.columns)), dtype=np.float64)
+        # which cells the source actually reported (a missing value is not a zero)
+        self.known = np.zeros((0, len(self.columns)), dtype=bool)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    # ---------- building ----------
+    def add_foods(self, foods: Iterable[Tuple[str, Dict[str, float]]], source: str) -> int:
+        """Append foods given as (name, {column: canonical amount per 100 g}); existing names are kept."""
+        new_rows, new_known = [], []
+        for name, values in foods:
+            key = normalize_food_name(name)
+            if not key or key in self.rows:
+                continue
+            self.rows[key] = len(self.names)
+            self.names.append(name.strip())
+            self.sources.append(source)
+            new_rows.append([float(values.get(c) or 0.0) for c in self.columns])
+            new_known.append([c in values for c in self.columns])
+        if new_rows:
+            self.matrix = np.vstack([self.matrix, np.asarray(new_rows, dtype=np.float64)])
+            self.known = np.vstack([self.known, np.asarray(new_known, dtype=bool)])
+        return len(new_rows)
+
+    def load_csv(self, path: str = DATASET_PATH) -> int:
+        foods = []
+        with open(path, newline="", encoding="utf-8") as fh:
+            for row in csv.DictReader(fh):
+                name = row.pop("Food", "")
+                values = {}
+                for col, val in row.items():
+                    col = col.strip()
+                    try:
+                        amount = to_canonical(float(val), COLUMN_UNITS.get(col, "mg"), col)
+                    except (TypeError, ValueError):
+                        continue
+                    if amount is not None:
+                        values[col] = amount
+                foods.append((name, values))
+        return self.add_foods(foods, source="dataset")
+
+    def import_usda_json(self, path: str) -> int:
+        """Import a FoodData Central JSON download (FoundationFoods / SRLegacyFoods)."""
+        with open(path, encoding="utf-8") as fh:
+            data = json.load(fh)
+        if isinstance(data, dict):
+            records = data.get("FoundationFoods") or data.get("SRLegacyFoods") or data.get("foods") or []
+        else:
+            records = data
+        foods = []
+        for rec in records:
+            values = map_usda_nutrients(rec.get("foodNutrients", []))
+            if values:
+                foods.append((rec.get("description", ""), values))
+        return self.add_foods(foods, source="usda-dump")
+
+    def save_npz(self, path: str):
+        np.savez_compressed(path, matrix=self.matrix, known=self.known,
+                            columns=np.array(self.columns), names=np.array(self.names))
+
+    def load_npz(self, path: str) -> int:
+        data = np.load(path, allow_pickle=False)
+        if "known" not in data:
+            raise ValueError(f"{path} was compiled by an older version; re-run 'food_index.py compile'")
+        columns = [str(c) for c in data["columns"]]
+        matrix, known = data["matrix"], data["known"]
+        picked = [(col, columns.index(col)) for col in self.columns if col in columns]
+        foods = []
+        for name, row, mask in zip(data["names"], matrix, known):
+            foods.append((str(name), {col: row[j] for col, j in picked if mask[j]}))
+        return self.add_foods(foods, source="usda-dump")
+
+    def load_extra(self, path: str) -> int:
+        return self.load_npz(path) if path.endswith(".npz") else self.import_usda_json(path)
+
+    # ---------- lookups ----------
+    def row_for(self, name: str) -> Optional[int]:
+        key = normalize_food_name(name)
+        row = self.rows.get(key)
+        if row is None and key.endswith("s"):
+            # cheap plural fallback: "eggs" -> "egg", "tomatoes" -> "tomato"
+            row = self.rows.get(key[:-1])
+            if row is None and key.endswith("es"):
+                row = self.rows.get(key[:-2])
+        return row
+
+    def lookup(self, name: str) -> Optional[Dict[str, float]]:
+        """Known nutrients of a food as canonical {name: amount per 100 g}, or None."""
+        row = self.row_for(name)
+        if row is None:
+            return None
+        values, known = self.matrix[row], self.known[row]
+        return {col: float(values[j]) for j, col in enumerate(self.columns) if known[j]}
+
+
+def load_default_index() -> FoodIndex:
+    """dataset.csv plus the optional USDA dump named by USDA_DUMP_PATH."""
+    index = FoodIndex()
+    index.load_csv(os.getenv("FOOD_DATASET_PATH", DATASET_PATH))
+    extra = os.getenv("USDA_DUMP_PATH")
+    if extra:
+        index.load_extra(extra)
+    return index
+
+
+def main(argv=None) -> int:
+    import argparse
+    parser = argparse.ArgumentParser(description="Build / inspect the local food composition index.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    comp = sub.add_parser("compile", help="convert a USDA FDC JSON download into a compact .npz")
+    comp.add_argument("dump", help="FoundationFoods / SRLegacyFoods JSON file")
+    comp.add_argument("out", help="output .npz path (use it as USDA_DUMP_PATH)")
+    look = sub.add_parser("lookup", help="print the nutrients of a food")
+    look.add_argument("name")
+    args = parser.parse_args(argv)
+
+    if args.cmd == "compile":
+        index = FoodIndex()
+        count = index.import_usda_json(args.dump)
+        index.save_npz(args.out)
+        print(f"wrote {count} foods to {args.out}")
+    elif args.cmd == "lookup":
+        nutrients = load_default_index().lookup(args.name)
+        if nutrients is None:
+            print("not found")
+            return 1
+        print(json.dumps(nutrients, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
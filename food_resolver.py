@@ -0,0 +1,128 @@
+# food_resolver.py
+"""
+Typo-tolerant food name resolution.
+
+A character-trigram inverted index over every food name we can answer without
+USDA (local food index + descriptions already in the nutrient cache).
+Queries are scored by a mix of Dice similarity and how much of the query is
+covered by the candidate, with a boost for prefix matches (autocomplete).
+
+search() is for suggestions. typo_match() is what answers a lookup in place of the
+name asked for: it only accepts a candidate the query could be a misspelling of
+(same number of words, a few edits apart), so "apple pie" never becomes "apple".
+"""
+
+import threading
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from food_index import normalize_food_name
+
+
+def trigrams(text: str) -> List[str]:
+    padded = "  " + text + " "
+    return sorted({padded[i:i + 3] for i in range(len(padded) - 2)})
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Edits (insert, delete, substitute, swap adjacent) from a to b; limit + 1 once it exceeds limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2, prev = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (a[i - 1] != b[j - 1]))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        if min(cur) > limit:
+            return limit + 1
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+def looks_like_typo(query: str, name: str) -> bool:
+    """Whether normalized `query` could be a misspelling of normalized `name`."""
+    if len(query.split()) != len(name.split()):
+        return False
+    limit = max(1, len(query) // 4)
+    return edit_distance(query, name, limit) <= limit
+
+
+class FoodNameResolver:
+    def __init__(self):
+        self.entries: List[Dict[str, str]] = []   # {"name", "source", "key"}
+        self._norm: List[str] = []
+        self._sizes = np.zeros(256, dtype=np.float64)     # trigram count per entry (grown by doubling)
+        self._postings: Dict[str, List[int]] = defaultdict(list)
+        self._seen = set()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def add(self, name: str, source: str, key: Optional[str] = None):
+        """Index a display name; `key` is what the source is looked up by (defaults to the name)."""
+        norm = normalize_food_name(name)
+        if not norm or (norm, source) in self._seen:
+            return
+        grams = trigrams(norm)
+        with self._lock:
+            if (norm, source) in self._seen:
+                return
+            self._seen.add((norm, source))
+            idx = len(self.entries)
+            self.entries.append({"name": name.strip(), "source": source, "key": key or norm})
+            self._norm.append(norm)
+            if idx == len(self._sizes):
+                # a new array, so a search holding the old one keeps a consistent view
+                self._sizes = np.concatenate([self._sizes, np.zeros(len(self._sizes))])
+            self._sizes[idx] = len(grams)
+            for g in grams:
+                self._postings[g].append(idx)
+
+    def search(self, query: str, limit: int = 8, min_score: float = 0.3) -> List[Dict[str, Any]]:
+        q = normalize_food_name(query)
+        if not q:
+            return []
+        qgrams = trigrams(q)
+        # snapshot under the lock add() writes with: posting lists grow while we read them
+        with self._lock:
+            lists = [np.array(self._postings[g], dtype=np.int64) for g in qgrams if g in self._postings]
+            all_sizes = self._sizes
+        if not lists:
+            return []
+        ids, common = np.unique(np.concatenate(lists), return_counts=True)
+        sizes = all_sizes[ids]
+        dice = 2.0 * common / (sizes + len(qgrams))
+        coverage = common / len(qgrams)
+        scores = 0.5 * dice + 0.5 * coverage
+        # cheap pre-selection before the per-candidate prefix/exact checks
+        top = np.argsort(-scores)[: max(limit * 4, 32)]
+        out = []
+        for i in top:
+            idx = int(ids[i])
+            norm = self._norm[idx]
+            score = float(scores[i])
+            if norm == q:
+                score = 1.0
+            elif norm.startswith(q):
+                score = max(score, 0.9)
+            if score >= min_score:
+                out.append(dict(self.entries[idx], score=round(score, 3)))
+        out.sort(key=lambda c: (-c["score"], len(c["name"])))
+        return out[:limit]
+
+    def best(self, query: str, min_score: float) -> Optional[Dict[str, Any]]:
+        found = self.search(query, limit=1, min_score=min_score)
+        return found[0] if found else None
+
+    def typo_match(self, query: str, min_score: float) -> Optional[Dict[str, Any]]:
+        """The best candidate `query` looks like a misspelling of (by its name or its key), or None."""
+        q = normalize_food_name(query)
+        for found in self.search(q, min_score=min_score):
+            if looks_like_typo(q, normalize_food_name(found["name"])) or looks_like_typo(q, found["key"]):
+                return found
+        return None
@@ -0,0 +1,67 @@
+# gunicorn.conf.py
+"""
+Gunicorn settings for NutriGuard (deploy.sh runs: gunicorn -c gunicorn.conf.py ... app:app).
+
+NUTRI_WORKER_CLASS selects the serving mode:
+- "gevent" (default when gevent is installed): every worker runs a gevent event loop.
+  gunicorn monkey-patches the standard library first, so `requests` (USDA, WeatherAPI),
+  the USDA lookup thread pool and the google-genai client (httpx) all become cooperative:
+  a worker keeps hundreds of slow upstream calls in flight (NUTRI_WORKER_CONNECTIONS)
+  while still answering /analyze and page loads.
+- "sync": the previous behaviour, one request at a time per worker.
+
+NUTRI_PRELOAD (default on) loads app.py once in the master, runs app.warm_up() there
+(Gemini SDK import, food name index, cache snapshot) and forks the workers from it:
+they start without importing anything and share that memory copy-on-write. With gevent
+the master must then be patched before app.py is imported, which this file does.
+"""
+
+import gc
+import os
+import sys
+import importlib.util
+
+
+def _default_worker_class() -> str:
+    return "gevent" if importlib.util.find_spec("gevent") else "sync"
+
+
+worker_class = os.getenv("NUTRI_WORKER_CLASS") or _default_worker_class()
+workers = int(os.getenv("NUTRI_WORKERS", "3"))
+worker_connections = int(os.getenv("NUTRI_WORKER_CONNECTIONS", "500"))
+timeout = int(os.getenv("NUTRI_TIMEOUT", "120"))
+graceful_timeout = 30
+keepalive = 5
+preload_app = os.getenv("NUTRI_PRELOAD", "1").lower() not in ("0", "false", "no")
+
+if preload_app and worker_class == "gevent":
+    # locks, thread-locals and sockets created while app.py is imported must already be
+    # the cooperative ones, or the forked workers would inherit blocking versions
+    from gevent import monkey
+    monkey.patch_all()
+
+
+def _warm_up(log):
+    import app
+    log.info("warm-up: %s", app.warm_up())
+
+
+def when_ready(server):
+    if preload_app:
+        _warm_up(server.log)
+        # keep the collector from touching (and so copying) the objects the workers share
+        gc.freeze()
+
+
+def post_worker_init(worker):
+    if not preload_app:
+        _warm_up(worker.log)
+
+
+def worker_exit(server, worker):
+    app = sys.modules.get("app")
+    if app is not None:
+        try:
+            app.save_cache_snapshot()
+        except Exception as e:
+            worker.log.warning("cache snapshot not saved: %s", e)
@@ -0,0 +1,127 @@
+# json_stream.py
+"""
+Incremental parser for a JSON object that arrives in chunks (streamed model output).
+
+Top-level fields are reported as soon as their value is complete; fields named in
+`stream_arrays` are reported element by element instead:
+
+    parser = IncrementalObjectParser(stream_arrays=("meal_plan",))
+    for chunk in chunks:
+        for kind, key, value in parser.feed(chunk):
+            ...   # ("field", "summary", "...") / ("item", "meal_plan", {...})
+    result = parser.result()   # the whole object, or None if it never completed
+
+Input that is not a JSON object (a key that is not a string or lacks its ':') stops the parser: `failed`
+is set, later chunks are ignored and result() stays None.
+"""
+
+import json
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+_WS = " \t\r\n"
+_decoder = json.JSONDecoder()
+
+
+class IncrementalObjectParser:
+    def __init__(self, stream_arrays: Iterable[str] = ()):
+        self.stream_arrays = set(stream_arrays)
+        self.buf = ""
+        self.pos = 0
+        self.state = "start"      # start -> key -> value (-> array) -> ... -> end (or error)
+        self.key: Optional[str] = None
+        self.obj: Dict[str, Any] = {}
+
+    @property
+    def complete(self) -> bool:
+        return self.state == "end"
+
+    @property
+    def failed(self) -> bool:
+        return self.state == "error"
+
+    def _skip(self, chars: str = _WS):
+        while self.pos < len(self.buf) and self.buf[self.pos] in chars:
+            self.pos += 1
+
+    def _decode(self) -> Tuple[bool, Any]:
+        """Decode one JSON value at pos; (False, None) if it is not complete yet."""
+        try:
+            value, end = _decoder.raw_decode(self.buf, self.pos)
+        except json.JSONDecodeError:
+            return False, None
+        if end == len(self.buf) and isinstance(value, (int, float)) and not isinstance(value, bool):
+            # a number at the very end of the buffer may still be growing
+            return False, None
+        self.pos = end
+        return True, value
+
+    def feed(self, chunk: str) -> List[Tuple[str, str, Any]]:
+        self.buf += chunk
+        events = []
+        while True:
+            if self.state == "start":
+                start = self.buf.find("{", self.pos)
+                if start < 0:
+                    self.pos = len(self.buf)
+                    break
+                self.pos = start + 1
+                self.state = "key"
+            elif self.state == "key":
+                self._skip(_WS + ",")
+                if self.pos >= len(self.buf):
+                    break
+                if self.buf[self.pos] == "}":
+                    self.pos += 1
+                    self.state = "end"
+                    break
+                ok, key = self._decode()
+                if not ok:
+                    break
+                if not isinstance(key, str):
+                    self.state = "error"
+                    break
+                # the ':' may only come with a later chunk
+                self.key, self.state = key, "colon"
+            elif self.state == "colon":
+                self._skip()
+                if self.pos >= len(self.buf):
+                    break
+                if self.buf[self.pos] != ":":
+                    self.state = "error"
+                    break
+                self.pos += 1
+                self.state = "value"
+            elif self.state == "value":
+                self._skip()
+                if self.pos >= len(self.buf):
+                    break
+                if self.key in self.stream_arrays and self.buf[self.pos] == "[":
+                    self.pos += 1
+                    self.obj[self.key] = []
+                    self.state = "array"
+                    continue
+                ok, value = self._decode()
+                if not ok:
+                    break
+                self.obj[self.key] = value
+                events.append(("field", self.key, value))
+                self.state = "key"
+            elif self.state == "array":
+                self._skip(_WS + ",")
+                if self.pos >= len(self.buf):
+                    break
+                if self.buf[self.pos] == "]":
+                    self.pos += 1
+                    self.state = "key"
+                    continue
+                ok, value = self._decode()
+                if not ok:
+                    break
+                self.obj[self.key].append(value)
+                events.append(("item", self.key, value))
+            else:
+                break
+        return events
+
+    def result(self) -> Optional[Dict[str, Any]]:
+        return self.obj if self.complete else None
@@ -0,0 +1,243 @@
+# meal_log.py
+"""
+Per-user daily meal log shared by every gunicorn worker (SQLite, WAL mode).
+
+Each logged item keeps the nutrients it contributes (canonical amounts, already
+scaled by its quantity). Every (user, day) row keeps the running totals of its
+items and the state derived from them (deficiencies, recommendations, ...):
+- adding or removing items adds or subtracts only those items' nutrients and
+  re-derives the state from the new totals, in one transaction
+- reading a day is one primary-key lookup of the stored state
+- days older than `retention_days` are dropped, together with their items
+The caller resolves foods and supplies `derive(totals, profile) -> state`, so this
+module never calls an upstream.
+
+Users are created here: create_user() returns an internal user id and a random
+token for the client. Only a hash of the token is stored; user_for_token() maps
+a token back to its user, so a client can reach its own log and no other.
+"""
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import hashlib
+import secrets
+import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlite_store import SQLiteStore
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "meal_log.sqlite3")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    profile TEXT NOT NULL,
+    updated REAL NOT NULL,
+    token TEXT
+);
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    day TEXT NOT NULL,
+    name TEXT NOT NULL,
+    qty REAL NOT NULL,
+    nutrients TEXT NOT NULL,
+    status TEXT NOT NULL,
+    source TEXT,
+    added REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS items_user_day ON items(user_id, day);
+CREATE TABLE IF NOT EXISTS days (
+    user_id TEXT NOT NULL,
+    day TEXT NOT NULL,
+    totals TEXT NOT NULL,
+    item_count INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (user_id, day)
+);
+CREATE INDEX IF NOT EXISTS days_day ON days(day);
+"""
+
+# profile fields kept per user (the rest of a request body is ignored)
+PROFILE_FIELDS = ("gender", "height", "weight", "diet", "city")
+
+Derive = Callable[[Dict[str, float], Dict[str, Any]], Dict[str, Any]]
+
+
+def _token_hash(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def _add_nutrients(totals: Dict[str, list], nutrients: Dict[str, float], sign: int = 1):
+    """Add (sign=1) or subtract (sign=-1) an item's nutrients to totals {name: [amount, items reporting it]}."""
+    for name, amount in nutrients.items():
+        entry = totals.setdefault(name, [0.0, 0])
+        entry[0] += sign * amount
+        entry[1] += sign
+        if entry[1] <= 0:
+            del totals[name]
+        elif entry[0] < 1e-9:
+            # subtracting what was added leaves float dust, not a real amount
+            entry[0] = 0.0
+
+
+class MealLog:
+    def __init__(self, path: str = DEFAULT_PATH, retention_days: int = 90):
+        self.path = path
+        self.retention_days = retention_days
+        self._store = SQLiteStore(path, _SCHEMA)
+        self._writes = 0
+        self._add_token_column()
+
+    @classmethod
+    def from_env(cls) -> "MealLog":
+        return cls(
+            path=os.getenv("MEAL_LOG_PATH", DEFAULT_PATH),
+            retention_days=int(os.getenv("MEAL_LOG_RETENTION_DAYS", "90")),
+        )
+
+    def _add_token_column(self):
+        # user tables from before tokens get the column; their users have no token, so nobody can claim them
+        with self._store.connection() as conn:
+            have = {row[1] for row in conn.execute("PRAGMA table_info(users)")}
+            if "token" not in have:
+                try:
+                    conn.execute("ALTER TABLE users ADD COLUMN token TEXT")
+                except sqlite3.OperationalError:
+                    pass    # another worker added it first
+            conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS users_token ON users(token)")
+
+    # ---------- users ----------
+    def create_user(self) -> Tuple[str, str]:
+        """A new user: (user id, token). The token is only returned here, never stored in clear."""
+        user_id, token = uuid.uuid4().hex, secrets.token_urlsafe(32)
+        with self._store.connection() as conn:
+            conn.execute("INSERT INTO users (id, profile, updated, token) VALUES (?, '{}', ?, ?)",
+                         (user_id, time.time(), _token_hash(token)))
+        return user_id, token
+
+    def user_for_token(self, token: str) -> Optional[str]:
+        """The user a token was issued to, or None."""
+        if not token:
+            return None
+        with self._store.connection() as conn:
+            row = conn.execute("SELECT id FROM users WHERE token = ?", (_token_hash(token),)).fetchone()
+        return row[0] if row else None
+
+    # ---------- profiles ----------
+    def profile(self, user_id: str) -> Dict[str, Any]:
+        with self._store.connection() as conn:
+            row = conn.execute("SELECT profile FROM users WHERE id = ?", (user_id,)).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def _save_profile(self, conn, user_id: str, updates: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        row = conn.execute("SELECT profile FROM users WHERE id = ?", (user_id,)).fetchone()
+        profile = json.loads(row[0]) if row else {}
+        changes = {k: v for k, v in (updates or {}).items() if k in PROFILE_FIELDS and v not in (None, "")}
+        if changes or row is None:
+            profile.update(changes)
+            # an update, not a replace: that would drop the user's token
+            conn.execute("INSERT INTO users (id, profile, updated) VALUES (?, ?, ?) "
+                         "ON CONFLICT(id) DO UPDATE SET profile = excluded.profile, updated = excluded.updated",
+                         (user_id, json.dumps(profile, ensure_ascii=False), time.time()))
+        return profile
+
+    # ---------- days ----------
+    def day(self, user_id: str, day: str) -> Optional[str]:
+        """The stored state of a day as JSON text (as written by derive), or None if nothing is logged."""
+        with self._store.connection() as conn:
+            row = conn.execute("SELECT state FROM days WHERE user_id = ? AND day = ?",
+                               (user_id, day)).fetchone()
+        return row[0] if row else None
+
+    def items(self, user_id: str, day: str) -> List[Dict[str, Any]]:
+        with self._store.connection() as conn:
+            rows = conn.execute(
+                "SELECT id, name, qty, status, source FROM items WHERE user_id = ? AND day = ? ORDER BY id",
+                (user_id, day)).fetchall()
+        return [{"id": r[0], "name": r[1], "qty": r[2], "status": r[3], "source": r[4]} for r in rows]
+
+    def _update_day(self, conn, user_id: str, day: str, added: List[Dict[str, Any]],
+                    removed: List[Dict[str, float]], profile: Dict[str, Any], derive: Derive) -> Dict[str, Any]:
+        row = conn.execute("SELECT totals, item_count FROM days WHERE user_id = ? AND day = ?",
+                           (user_id, day)).fetchone()
+        totals, count = (json.loads(row[0]), row[1]) if row else ({}, 0)
+        for item in added:
+            _add_nutrients(totals, item["nutrients"])
+        for nutrients in removed:
+            _add_nutrients(totals, nutrients, -1)
+        count += len(added) - len(removed)
+        if count <= 0:
+            count, totals = 0, {}
+        amounts = {name: amount for name, (amount, _) in totals.items()}
+        state = dict(derive(amounts, profile), day=day, item_count=count)
+        conn.execute(
+            "INSERT OR REPLACE INTO days (user_id, day, totals, item_count, state, updated) VALUES (?, ?, ?, ?, ?, ?)",
+            (user_id, day, json.dumps(totals), count, json.dumps(state, ensure_ascii=False), time.time()))
+        return state
+
+    def add(self, user_id: str, day: str, items: List[Dict[str, Any]], derive: Derive,
+            profile: Optional[Dict[str, Any]] = None) -> Tuple[Dict[str, Any], List[int]]:
+        """
+        Log items {name, qty, nutrients, status, source} for a day and update its totals and
+        state; `profile` updates the user's profile first. Returns (new state, item ids).
+        """
+        with self._store.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                profile = self._save_profile(conn, user_id, profile)
+                now = time.time()
+                ids = []
+                for item in items:
+                    cur = conn.execute(
+                        "INSERT INTO items (user_id, day, name, qty, nutrients, status, source, added) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (user_id, day, item["name"], item["qty"], json.dumps(item["nutrients"]), item["status"],
+                         item.get("source"), now))
+                    ids.append(cur.lastrowid)
+                state = self._update_day(conn, user_id, day, items, [], profile, derive)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        self._writes += 1
+        if self._writes % 100 == 0:
+            self.evict()
+        return state, ids
+
+    def remove(self, user_id: str, item_id: int, derive: Derive) -> Optional[Dict[str, Any]]:
+        """Delete one of the user's items and update its day; returns the day's new state, None if not found."""
+        with self._store.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT day, nutrients FROM items WHERE id = ? AND user_id = ?",
+                                   (item_id, user_id)).fetchone()
+                if row is None:
+                    conn.execute("ROLLBACK")
+                    return None
+                conn.execute("DELETE FROM items WHERE id = ?", (item_id,))
+                profile = self._save_profile(conn, user_id, None)
+                state = self._update_day(conn, user_id, row[0], [], [json.loads(row[1])], profile, derive)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return state
+
+    # ---------- maintenance ----------
+    def evict(self) -> int:
+        """Drop days (and their items) older than retention_days; returns the number of days removed."""
+        cutoff = (datetime.date.today() - datetime.timedelta(days=self.retention_days)).isoformat()
+        with self._store.connection() as conn:
+            conn.execute("DELETE FROM items WHERE day < ?", (cutoff,))
+            return conn.execute("DELETE FROM days WHERE day < ?", (cutoff,)).rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        with self._store.connection() as conn:
+            users = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+            days, items = conn.execute("SELECT COUNT(*), COALESCE(SUM(item_count), 0) FROM days").fetchone()
+            return {"users": users, "days": days, "items": items, "retention_days": self.retention_days}
@@ -0,0 +1,295 @@
+# metrics.py
+"""
+Prometheus-style metrics aggregated across gunicorn workers.
+
+Each worker counts in memory (no I/O on the request path). A background thread
+writes the worker's cumulative values to a shared SQLite file every
+`flush_interval` seconds, one row per (worker pid, series). The /metrics
+endpoint sums the rows of all workers:
+- counters and histograms keep the totals of workers that have exited
+- gauges (e.g. requests in flight) only count workers that are still running
+
+RequestTimer collects the per-phase durations of one request for its
+Server-Timing header.
+"""
+
+import os
+import time
+import atexit
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlite_store import SQLiteStore
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "metrics.sqlite3")
+
+# seconds; covers cache hits (~1 ms) up to slow Gemini replies
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS samples (
+    pid INTEGER NOT NULL,
+    family TEXT NOT NULL,
+    sample TEXT NOT NULL,
+    labels TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (pid, sample, labels)
+);
+"""
+
+COUNTER, GAUGE, HISTOGRAM = "counter", "gauge", "histogram"
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _render_labels(labels: Iterable[Tuple[str, str]]) -> str:
+    parts = []
+    for k, v in labels:
+        v = v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{k}="{v}"')
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True       # exists, owned by someone else
+    return True
+
+
+class Metrics:
+    def __init__(self, path: str = DEFAULT_PATH, flush_interval: float = 5.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._store = SQLiteStore(path, _SCHEMA)
+        self._families: Dict[str, Tuple[str, str, Tuple[float, ...]]] = {}   # name -> (kind, help, buckets)
+        self._collectors: List[Callable[[], Iterable[Tuple[str, Dict[str, Any], float]]]] = []
+        self._lock = threading.Lock()
+        self._pid = None
+        self._values: Dict[Tuple[str, Labels], float] = {}
+        self._histograms: Dict[Tuple[str, Labels], List[float]] = {}   # buckets..., sum, count
+        self._flusher = None
+        self._flushed_pid = None
+
+    @classmethod
+    def from_env(cls) -> "Metrics":
+        return cls(
+            path=os.getenv("METRICS_PATH", DEFAULT_PATH),
+            flush_interval=float(os.getenv("METRICS_FLUSH_INTERVAL", "5")),
+        )
+
+    # ---------- definitions ----------
+    def counter(self, name: str, help: str):
+        self._families[name] = (COUNTER, help, ())
+
+    def gauge(self, name: str, help: str):
+        self._families[name] = (GAUGE, help, ())
+
+    def histogram(self, name: str, help: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self._families[name] = (HISTOGRAM, help, tuple(sorted(buckets)))
+
+    def collector(self, fn: Callable[[], Iterable[Tuple[str, Dict[str, Any], float]]]):
+        """fn() -> [(name, labels, value)], read at every flush (for counts kept elsewhere, e.g. cache hits)."""
+        self._collectors.append(fn)
+        return fn
+
+    # ---------- recording (per worker, in memory) ----------
+    def _check_pid(self):
+        # counts inherited from the gunicorn master belong to the master, not this worker
+        pid = os.getpid()
+        if self._pid != pid:
+            self._pid = pid
+            self._values = {}
+            self._histograms = {}
+            self._flusher = threading.Thread(target=self._flush_loop, name="metrics-flush", daemon=True)
+            self._flusher.start()
+            atexit.register(self._flush_quietly)
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            self._check_pid()
+            self._values[key] = self._values.get(key, 0.0) + value
+
+    def add(self, name: str, delta: float, **labels):
+        """Move a gauge up or down."""
+        self.inc(name, delta, **labels)
+
+    def observe(self, name: str, value: float, **labels):
+        buckets = self._families[name][2]
+        key = (name, _labels(labels))
+        with self._lock:
+            self._check_pid()
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = [0.0] * (len(buckets) + 2)
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    hist[i] += 1
+                    break
+            hist[-2] += value
+            hist[-1] += 1
+
+    @contextmanager
+    def time(self, name: str, **labels) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    # ---------- flushing ----------
+    def _rows(self) -> List[Tuple[str, str, str, str, float]]:
+        """This worker's series as (family, sample, labels, kind, value) rows."""
+        with self._lock:
+            values = dict(self._values)
+            histograms = {k: list(v) for k, v in self._histograms.items()}
+        for fn in self._collectors:
+            try:
+                for name, labels, value in fn():
+                    values[(name, _labels(labels))] = float(value)
+            except Exception:
+                pass
+        rows = []
+        for (name, labels), value in values.items():
+            kind = self._families[name][0]
+            rows.append((name, name, _render_labels(labels), kind, value))
+        for (name, labels), hist in histograms.items():
+            buckets = self._families[name][2]
+            cumulative = 0.0
+            for bound, count in zip(buckets, hist):
+                cumulative += count
+                rows.append((name, name + "_bucket", _render_labels(labels + (("le", f"{bound:g}"),)),
+                             HISTOGRAM, cumulative))
+            rows.append((name, name + "_bucket", _render_labels(labels + (("le", "+Inf"),)), HISTOGRAM, hist[-1]))
+            rows.append((name, name + "_sum", _render_labels(labels), HISTOGRAM, hist[-2]))
+            rows.append((name, name + "_count", _render_labels(labels), HISTOGRAM, hist[-1]))
+        return rows
+
+    def flush(self):
+        """Write this worker's cumulative values to the shared file."""
+        with self._lock:
+            self._check_pid()
+        pid = os.getpid()
+        rows = [(pid,) + row for row in self._rows()]
+        with self._store.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if self._flushed_pid != pid:
+                    # a reused pid: gauges left by the old process are not ours
+                    conn.execute("DELETE FROM samples WHERE pid = ? AND kind = ?", (pid, GAUGE))
+                conn.executemany(
+                    "INSERT OR REPLACE INTO samples (pid, family, sample, labels, kind, value) VALUES (?, ?, ?, ?, ?, ?)",
+                    rows)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        self._flushed_pid = pid
+
+    def _flush_quietly(self):
+        if self._pid == os.getpid():
+            try:
+                self.flush()
+            except Exception:
+                pass
+
+    def _flush_loop(self):
+        pid = os.getpid()
+        while self._pid == pid:
+            time.sleep(self.flush_interval)
+            self._flush_quietly()
+
+    # ---------- exposition ----------
+    def collect(self) -> Dict[str, Dict[Tuple[str, str], float]]:
+        """{family: {(sample, labels): value summed over workers}}."""
+        with self._store.connection() as conn:
+            rows = conn.execute("SELECT pid, family, sample, labels, kind, value FROM samples").fetchall()
+        alive: Dict[int, bool] = {}
+        families: Dict[str, Dict[Tuple[str, str], float]] = {}
+        for pid, family, sample, labels, kind, value in rows:
+            if kind == GAUGE:
+                if pid not in alive:
+                    alive[pid] = _pid_alive(pid)
+                if not alive[pid]:
+                    continue
+            series = families.setdefault(family, {})
+            series[(sample, labels)] = series.get((sample, labels), 0.0) + value
+        return families
+
+    def render(self, extra: Optional[Iterable[Tuple[str, str, str, Dict[str, Any], float]]] = None) -> str:
+        """
+        Prometheus text format. Flushes this worker first; other workers are at most
+        `flush_interval` seconds behind. `extra` adds (name, kind, help, labels, value)
+        samples computed at scrape time.
+        """
+        self.flush()
+        families = self.collect()
+        lines = []
+        for name in sorted(families):
+            if name not in self._families:
+                continue
+            kind, help, _ = self._families[name]
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for (sample, labels), value in sorted(families[name].items(), key=_sample_order):
+                lines.append(f"{sample}{labels} {value:g}")
+        by_name: Dict[str, List[Tuple[str, str, Dict[str, Any], float]]] = {}
+        for name, kind, help, labels, value in extra or ():
+            by_name.setdefault(name, []).append((kind, help, labels, value))
+        for name, samples in by_name.items():
+            lines.append(f"# HELP {name} {samples[0][1]}")
+            lines.append(f"# TYPE {name} {samples[0][0]}")
+            for _, _, labels, value in samples:
+                lines.append(f"{name}{_render_labels(_labels(labels))} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        """Forget every worker's values (e.g. after a deploy)."""
+        with self._store.connection() as conn:
+            conn.execute("DELETE FROM samples")
+
+
+def _sample_order(item):
+    """Sort key that keeps each histogram series' buckets (ascending), _sum and _count together."""
+    (sample, labels), _ = item
+    le = 0.0
+    if 'le="' in labels:
+        # "le" is always rendered last
+        labels, bound = labels.rsplit('le="', 1)
+        le = float(bound.rstrip('"}'))
+    suffix = {"_sum": 1, "_count": 2}.get(sample[sample.rfind("_"):], 0)
+    return (labels.strip("{},"), suffix, le)
+
+
+class RequestTimer:
+    """Per-phase durations of one request, for the Server-Timing header."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - started
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def header(self) -> str:
+        parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.phases.items()]
+        parts.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ", ".join(parts)
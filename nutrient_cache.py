@@ -0,0 +1,240 @@
+# nutrient_cache.py
+"""
+Persistent nutrient cache shared by every gunicorn worker.
+
+Entries live in a small SQLite database (WAL mode), keyed by normalized food name:
+- positive entries expire after `ttl` seconds, "no foods found" entries after `negative_ttl`
+- the table is bounded to `max_entries`; the least recently used rows are evicted first
+- concurrent misses for the same key are collapsed to one upstream call, both between
+  threads of a worker (a per-key lock) and between workers (a lease row in SQLite)
+
+CLI:
+    python nutrient_cache.py warm foods.txt      # one food per line ('-' for stdin)
+    python nutrient_cache.py stats
+    python nutrient_cache.py purge [--expired]
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple
+
+from sqlite_store import SQLiteStore
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "nutrient_cache.sqlite3")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS nutrients (
+    key TEXT PRIMARY KEY,
+    payload TEXT,
+    expires REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS nutrients_accessed ON nutrients(accessed);
+CREATE TABLE IF NOT EXISTS leases (
+    key TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires REAL NOT NULL
+);
+"""
+
+# sentinel for "not in cache" (None is a valid, negative, cached value)
+MISS = object()
+
+
+class NutrientCache:
+    def __init__(self, path: str = DEFAULT_PATH, ttl: float = 7 * 86400, negative_ttl: float = 86400,
+                 max_entries: int = 50000, lease_timeout: float = 15.0, poll_interval: float = 0.05):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.lease_timeout = lease_timeout
+        self.poll_interval = poll_interval
+        self._store = SQLiteStore(path, _SCHEMA)
+        self._key_locks: Dict[str, list] = {}    # key -> [lock, callers holding or waiting for it]
+        self._key_locks_guard = threading.Lock()
+        self._writes = 0
+
+    @classmethod
+    def from_env(cls) -> "NutrientCache":
+        return cls(
+            path=os.getenv("NUTRIENT_CACHE_PATH", DEFAULT_PATH),
+            ttl=float(os.getenv("NUTRIENT_CACHE_TTL", str(7 * 86400))),
+            negative_ttl=float(os.getenv("NUTRIENT_CACHE_NEGATIVE_TTL", "86400")),
+            max_entries=int(os.getenv("NUTRIENT_CACHE_MAX_ENTRIES", "50000")),
+        )
+
+    # ---------- basic operations ----------
+    def get(self, key: str) -> Any:
+        """Return the cached payload (possibly None for a negative entry) or MISS."""
+        now = time.time()
+        with self._store.connection() as conn:
+            row = conn.execute(
+                "SELECT payload, expires, accessed FROM nutrients WHERE key = ?", (key,)).fetchone()
+            if row is None or row[1] < now:
+                return MISS
+            # only touch the LRU timestamp occasionally, so hits stay read-only
+            if now - row[2] > 3600:
+                conn.execute("UPDATE nutrients SET accessed = ? WHERE key = ?", (now, key))
+        return json.loads(row[0]) if row[0] is not None else None
+
+    def put(self, key: str, payload: Any):
+        now = time.time()
+        ttl = self.ttl if payload is not None else self.negative_ttl
+        data = json.dumps(payload) if payload is not None else None
+        with self._store.connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO nutrients (key, payload, expires, accessed) VALUES (?, ?, ?, ?)",
+                (key, data, now + ttl, now))
+        self._writes += 1
+        if self._writes % 100 == 0:
+            self.evict()
+
+    def invalidate(self, key: str):
+        with self._store.connection() as conn:
+            conn.execute("DELETE FROM nutrients WHERE key = ?", (key,))
+
+    def evict(self) -> int:
+        """Drop expired rows, then the least recently used rows above max_entries."""
+        with self._store.connection() as conn:
+            removed = conn.execute("DELETE FROM nutrients WHERE expires < ?", (time.time(),)).rowcount
+            count = conn.execute("SELECT COUNT(*) FROM nutrients").fetchone()[0]
+            if count > self.max_entries:
+                removed += conn.execute(
+                    "DELETE FROM nutrients WHERE key IN (SELECT key FROM nutrients ORDER BY accessed LIMIT ?)",
+                    (count - self.max_entries,)).rowcount
+        return removed
+
+    def purge(self):
+        with self._store.connection() as conn:
+            conn.execute("DELETE FROM nutrients")
+
+    def descriptions(self, after_rowid: int = 0) -> List[Tuple[int, str, str]]:
+        """(rowid, key, description) of live positive entries written after `after_rowid`."""
+        with self._store.connection() as conn:
+            return conn.execute(
+                "SELECT rowid, key, json_extract(payload, '$.description') FROM nutrients "
+                "WHERE rowid > ? AND payload IS NOT NULL AND expires >= ? ORDER BY rowid",
+                (after_rowid, time.time())).fetchall()
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        with self._store.connection() as conn:
+            total, negative, expired = conn.execute(
+                "SELECT COUNT(*), SUM(payload IS NULL), SUM(expires < ?) FROM nutrients", (now,)).fetchone()
+        return {"path": self.path, "entries": total, "negative": negative or 0,
+                "expired": expired or 0, "max_entries": self.max_entries}
+
+    # ---------- single-flight ----------
+    @contextmanager
+    def _key_lock(self, key: str) -> Iterator[None]:
+        """Per-key lock; the entry is dropped once no caller holds or waits for it."""
+        with self._key_locks_guard:
+            entry = self._key_locks.get(key)
+            if entry is None:
+                entry = self._key_locks[key] = [threading.Lock(), 0]
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._key_locks_guard:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._key_locks[key]
+
+    def _acquire_lease(self, key: str, owner: str) -> bool:
+        now = time.time()
+        with self._store.connection() as conn:
+            conn.execute("DELETE FROM leases WHERE key = ? AND expires < ?", (key, now))
+            cur = conn.execute("INSERT OR IGNORE INTO leases (key, owner, expires) VALUES (?, ?, ?)",
+                               (key, owner, now + self.lease_timeout))
+        return cur.rowcount == 1
+
+    def _release_lease(self, key: str, owner: str):
+        with self._store.connection() as conn:
+            conn.execute("DELETE FROM leases WHERE key = ? AND owner = ?", (key, owner))
+
+    def get_or_fetch(self, key: str, fetch: Callable[[str], Any]) -> Tuple[Any, bool]:
+        """
+        Return (payload, hit). On a miss exactly one caller across all workers runs
+        fetch(key); the others wait for its result. Exceptions from fetch are not cached.
+        """
+        value = self.get(key)
+        if value is not MISS:
+            return value, True
+        with self._key_lock(key):
+            value = self.get(key)
+            if value is not MISS:
+                return value, True
+            owner = uuid.uuid4().hex
+            deadline = time.time() + self.lease_timeout
+            while not self._acquire_lease(key, owner):
+                # another worker is fetching this key: wait for its result
+                time.sleep(self.poll_interval)
+                value = self.get(key)
+                if value is not MISS:
+                    return value, True
+                if time.time() > deadline:
+                    break
+            try:
+                value = fetch(key)
+                self.put(key, value)
+                return value, False
+            finally:
+                self._release_lease(key, owner)
+
+
+def _read_foods(path: str) -> Iterable[str]:
+    fh = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    with fh:
+        for line in fh:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                yield line
+
+
+def main(argv=None) -> int:
+    import argparse
+    parser = argparse.ArgumentParser(description="Manage the shared USDA nutrient cache.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    warm = sub.add_parser("warm", help="fetch and cache nutrients for a list of foods")
+    warm.add_argument("file", help="text file with one food name per line ('-' for stdin)")
+    warm.add_argument("--refresh", action="store_true", help="re-fetch foods that are already cached")
+    sub.add_parser("stats", help="print cache statistics")
+    purge = sub.add_parser("purge", help="delete cache entries")
+    purge.add_argument("--expired", action="store_true", help="only drop expired / over-limit entries")
+    args = parser.parse_args(argv)
+
+    if args.cmd == "warm":
+        import app  # uses the same fetcher, key normalization and cache settings as the server
+        foods = [app.normalize_food_name(f) for f in _read_foods(args.file)]
+        if args.refresh:
+            for food in foods:
+                app.NUTRIENT_CACHE.invalidate(food)
+        failed = 0
+        for food, res in app.lookup_foods(foods).items():
+            if res["error"]:
+                failed += 1
+                print(f"ERROR {food}: {res['error']}")
+            else:
+                print(f"{'ok' if res['nutrients'] else 'not found':9} {food}")
+        return 1 if failed else 0
+
+    cache = NutrientCache.from_env()
+    if args.cmd == "stats":
+        print(json.dumps(cache.stats(), indent=2))
+    elif args.cmd == "purge":
+        removed = cache.evict() if args.expired else cache.purge()
+        if args.expired:
+            print(f"removed {removed} entries")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
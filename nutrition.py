@@ -0,0 +1,258 @@
+# nutrition.py
+"""
+Nutrient mapping, unit conversion and deficiency rules shared by /analyze,
+/analyze/batch and the offline tools. USDA nutrients are mapped once per food by
+nutrientId / nutrient number to a canonical {name: amount per 100 g} dict
+(mg for masses, kcal for Energy). The *_matrix / *_vector helpers are NumPy versions of the
+per-request code that give the same results for many records at once.
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# Standard nutrient panel: friendly name -> (USDA nutrientId, nutrient number, display unit).
+# Amounts are kept per 100 g in a canonical unit: mg for every mass, kcal for Energy.
+NUTRIENT_PANEL = {
+    "Energy": (1008, "208", "kcal"),
+    "Protein": (1003, "203", "g"),
+    "Fat": (1004, "204", "g"),
+    "Carbohydrate": (1005, "205", "g"),
+    "Fiber": (1079, "291", "g"),
+    "Sugars": (2000, "269", "g"),
+    "Calcium": (1087, "301", "mg"),
+    "Iron": (1089, "303", "mg"),
+    "Magnesium": (1090, "304", "mg"),
+    "Phosphorus": (1091, "305", "mg"),
+    "Potassium": (1092, "306", "mg"),
+    "Sodium": (1093, "307", "mg"),
+    "Zinc": (1095, "309", "mg"),
+    "Copper": (1098, "312", "mg"),
+    "Selenium": (1103, "317", "µg"),
+    "Vitamin A": (1106, "320", "µg"),      # RAE
+    "Vitamin E": (1109, "323", "mg"),      # alpha-tocopherol
+    "Vitamin D": (1114, "328", "µg"),      # D2 + D3
+    "Vitamin C": (1162, "401", "mg"),
+    "Thiamin": (1165, "404", "mg"),
+    "Riboflavin": (1166, "405", "mg"),
+    "Niacin": (1167, "406", "mg"),
+    "Vitamin B6": (1175, "415", "mg"),
+    "Folate": (1190, "435", "µg"),         # DFE
+    "Vitamin B12": (1178, "418", "µg"),
+    "Vitamin K": (1185, "430", "µg"),      # phylloquinone
+}
+
+# Other USDA ids/numbers for the same nutrient, used only when the primary one is absent.
+NUTRIENT_ALIASES = {
+    "Energy": [(2047, "957"), (2048, "958"), (1062, "268")],    # Atwater energy, kJ
+    "Carbohydrate": [(1050, "205.2")],
+    "Fiber": [(2033, "293")],
+    "Sugars": [(1063, "269.3")],
+    "Vitamin A": [(1104, "318")],                               # IU
+    "Vitamin D": [(1110, "324")],                               # IU
+    "Folate": [(1177, "417")],                                  # total folate
+}
+
+# id / number -> (friendly name, rank); rank 0 is the primary entry
+USDA_ID_MAP: Dict[int, Tuple[str, int]] = {}
+USDA_NUMBER_MAP: Dict[str, Tuple[str, int]] = {}
+for _name, (_id, _number, _unit) in NUTRIENT_PANEL.items():
+    USDA_ID_MAP[_id] = (_name, 0)
+    USDA_NUMBER_MAP[_number] = (_name, 0)
+for _name, _aliases in NUTRIENT_ALIASES.items():
+    for _rank, (_id, _number) in enumerate(_aliases, start=1):
+        USDA_ID_MAP[_id] = (_name, _rank)
+        USDA_NUMBER_MAP[_number] = (_name, _rank)
+
+ENERGY_NUTRIENTS = ("Energy",)
+MASS_TO_MG = {"kg": 1e6, "g": 1000.0, "gram": 1000.0, "grams": 1000.0,
+              "mg": 1.0, "milligram": 1.0, "milligrams": 1.0,
+              "µg": 0.001, "μg": 0.001, "ug": 0.001, "mcg": 0.001, "microgram": 0.001, "micrograms": 0.001}
+ENERGY_TO_KCAL = {"kcal": 1.0, "kj": 1.0 / 4.184}
+# International Units are nutrient specific (retinol, cholecalciferol, natural alpha-tocopherol)
+IU_TO_MG = {"Vitamin A": 0.0003, "Vitamin D": 0.000025, "Vitamin E": 0.67}
+
+def to_canonical(amount: float, unit: str, nutrient: str) -> Optional[float]:
+    """Amount in the nutrient's canonical unit (mg, or kcal for Energy); None if the unit is unknown."""
+    unit = (unit or "").strip().lower()
+    if nutrient in ENERGY_NUTRIENTS:
+        factor = ENERGY_TO_KCAL.get(unit)
+    elif unit == "iu":
+        factor = IU_TO_MG.get(nutrient)
+    else:
+        factor = MASS_TO_MG.get(unit)
+    return amount * factor if factor is not None else None
+
+def convert_to_mg(amount: float, unit: str, nutrient: str = "") -> float:
+    value = to_canonical(amount, unit, nutrient)
+    if value is None:
+        raise ValueError(f"cannot convert {unit!r} to mg for {nutrient or 'nutrient'}")
+    return value
+
+def map_usda_nutrients(food_nutrients: Iterable[Dict[str, Any]]) -> Dict[str, float]:
+    """
+    USDA foodNutrients (search API or FDC download shape) -> {friendly name: canonical amount per 100 g}.
+    Matching is by nutrientId / nutrient number only; primary ids win over aliases.
+    """
+    out: Dict[str, float] = {}
+    ranks: Dict[str, int] = {}
+    for n in food_nutrients:
+        nested = n.get("nutrient") or {}
+        hit = USDA_ID_MAP.get(n.get("nutrientId") or nested.get("id"))
+        if hit is None:
+            hit = USDA_NUMBER_MAP.get(str(n.get("nutrientNumber") or nested.get("number") or ""))
+        if hit is None:
+            continue
+        name, rank = hit
+        if ranks.get(name, rank + 1) <= rank:
+            continue
+        value = n.get("value", n.get("amount"))
+        unit = n.get("unitName") or nested.get("unitName") or ""
+        try:
+            amount = to_canonical(float(value), unit, name)
+        except (TypeError, ValueError):
+            continue
+        if amount is not None:
+            out[name] = amount
+            ranks[name] = rank
+    return out
+
+# Name-based matching, kept for data without USDA ids (older cache entries).
+NUTRIENT_KEY_MAP = {
+    "Protein": ["protein"],
+    "Vitamin C": ["vitamin c", "ascorbic acid"],
+    "Iron": ["iron"],
+    "Calcium": ["calcium"],
+    "Fiber": ["fiber", "dietary fiber"],
+}
+
+def match_nutrient(full_name: str):
+    """Friendly NUTRIENT_KEY_MAP key for a USDA nutrient name, or None."""
+    low = full_name.lower()
+    for friendly, substrings in NUTRIENT_KEY_MAP.items():
+        if any(s in low for s in substrings):
+            return friendly
+    return None
+
+def canonical_nutrients(nutrients: Dict[str, Any]) -> Dict[str, float]:
+    """
+    Accept either canonical {name: amount} or the older {nutrient name: (value, unit)}
+    shape and return canonical amounts per 100 g.
+    """
+    if not nutrients or not any(isinstance(v, (list, tuple)) for v in nutrients.values()):
+        return nutrients or {}
+    out: Dict[str, float] = {}
+    for full_name, (val, unit) in nutrients.items():
+        key = match_nutrient(full_name)
+        if key is None:
+            continue
+        try:
+            out[key] = out.get(key, 0.0) + convert_to_mg(float(val), unit, key)
+        except (TypeError, ValueError):
+            continue
+    return out
+
+def calculate_deficiency(total_nutrients_mg: Dict[str,float], gender: str, height_cm: float, weight_kg: float):
+    baseline = {
+        "Protein_g": 50.0,
+        "Vitamin C_mg": 90.0,
+        "Iron_mg": 18.0 if gender.lower() == "female" else 8.0,
+        "Calcium_mg": 1000.0,
+        "Fiber_g": 30.0,
+    }
+    bmi = weight_kg / ((height_cm / 100.0) ** 2) if height_cm > 0 else 0
+    if bmi and bmi < 18.5:
+        for k in list(baseline.keys()):
+            baseline[k] *= 1.10
+    elif bmi and bmi > 25:
+        for k in list(baseline.keys()):
+            baseline[k] *= 0.90
+
+    deficiencies = {}
+    protein_mg = total_nutrients_mg.get("Protein", 0.0)
+    fiber_mg = total_nutrients_mg.get("Fiber", 0.0)
+    if protein_mg < (baseline["Protein_g"] * 1000.0) * 0.6:
+        need_mg = baseline["Protein_g"] * 1000.0 - protein_mg
+        deficiencies["Protein"] = f"{round(need_mg/1000.0, 2)} g"
+    if fiber_mg < (baseline["Fiber_g"] * 1000.0) * 0.6:
+        need_mg = baseline["Fiber_g"] * 1000.0 - fiber_mg
+        deficiencies["Fiber"] = f"{round(need_mg/1000.0, 2)} g"
+
+    for short_key, base_key in [("Vitamin C", "Vitamin C_mg"), ("Iron", "Iron_mg"), ("Calcium", "Calcium_mg")]:
+        have = total_nutrients_mg.get(short_key, 0.0)
+        need = baseline[base_key]
+        if have < need * 0.6:
+            need_more = need - have
+            deficiencies[short_key] = f"{round(need_more, 2)} mg"
+    return deficiencies
+
+# order of the columns in nutrient vectors / total matrices
+TRACKED_NUTRIENTS = list(NUTRIENT_PANEL)
+# nutrients calculate_deficiency looks at (always reported)
+CORE_NUTRIENTS = ["Protein", "Vitamin C", "Iron", "Calcium", "Fiber"]
+_COLUMN = {n: i for i, n in enumerate(TRACKED_NUTRIENTS)}
+
+def nutrient_vector(nutrients: Dict[str, float]) -> np.ndarray:
+    """Canonical {name: amount per 100 g} -> vector in TRACKED_NUTRIENTS order."""
+    vec = np.zeros(len(TRACKED_NUTRIENTS))
+    for name, amount in nutrients.items():
+        j = _COLUMN.get(name)
+        if j is not None:
+            vec[j] = amount
+    return vec
+
+def format_amount(nutrient: str, amount: float) -> str:
+    """Canonical amount (mg / kcal) as text in the nutrient's display unit."""
+    unit = NUTRIENT_PANEL[nutrient][2] if nutrient in NUTRIENT_PANEL else "mg"
+    if unit == "g":
+        return f"{round(amount/1000.0, 2)} g"
+    if unit == "µg":
+        return f"{round(amount*1000.0, 2)} µg"
+    if unit == "kcal":
+        return f"{round(amount, 1)} kcal"
+    return f"{round(amount, 2)} mg"
+
+def parse_amount(nutrient: str, text: str) -> Optional[float]:
+    """Inverse of format_amount: '29.5 g' -> canonical amount, None if it cannot be read."""
+    parts = str(text or "").split()
+    if len(parts) != 2:
+        return None
+    try:
+        return to_canonical(float(parts[0]), parts[1], nutrient)
+    except ValueError:
+        return None
+
+def deficiency_matrix(totals_mg: np.ndarray, female: np.ndarray, height_cm: np.ndarray,
+                      weight_kg: np.ndarray) -> List[Dict[str, str]]:
+    """
+    calculate_deficiency for many rows at once. totals_mg is (rows, len(TRACKED_NUTRIENTS));
+    returns one deficiency dict per row, identical to calling calculate_deficiency per row.
+    """
+    height_cm = np.asarray(height_cm, dtype=np.float64)
+    weight_kg = np.asarray(weight_kg, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        bmi = np.where(height_cm > 0, weight_kg / ((height_cm / 100.0) ** 2), 0.0)
+    factor = np.where((bmi != 0) & (bmi < 18.5), 1.10, np.where(bmi > 25, 0.90, 1.0))
+
+    col = _COLUMN
+    # baseline need per row, in mg (g-based needs scaled before the *1000 like the scalar code)
+    need = {
+        "Protein": (50.0 * factor) * 1000.0,
+        "Fiber": (30.0 * factor) * 1000.0,
+        "Vitamin C": 90.0 * factor,
+        "Iron": np.where(np.asarray(female, dtype=bool), 18.0, 8.0) * factor,
+        "Calcium": 1000.0 * factor,
+    }
+    missing = {}
+    for nutrient in ("Protein", "Fiber", "Vitamin C", "Iron", "Calcium"):
+        have = totals_mg[:, col[nutrient]]
+        missing[nutrient] = (have < need[nutrient] * 0.6, need[nutrient] - have)
+
+    out = []
+    for r in range(totals_mg.shape[0]):
+        defic = {}
+        for nutrient, (flag, amount) in missing.items():
+            if flag[r]:
+                defic[nutrient] = format_amount(nutrient, float(amount[r]))
+        out.append(defic)
+    return out
@@ -0,0 +1,168 @@
+# recommender.py
+"""
+Food recommendations that cover the reported deficiencies at a low energy cost.
+
+Built once over a FoodIndex (foods x nutrients, canonical amounts per 100 g):
+- per-nutrient rankings (foods ordered by amount per kcal) are precomputed, so a request
+  only scores the best `shortlist` foods of each deficient nutrient
+- portions are picked greedily, `step_g` at a time: every step adds the portion that
+  covers the most remaining need (each nutrient weighted by its deficit) per kcal,
+  scored for all shortlisted foods at once
+- diet is a hard filter over FOOD_TAGS; on hot days warming foods are dropped and on
+  cold days cooling foods, unless that would leave nothing to choose from
+
+    python recommender.py Protein=30g Calcium=600mg --temp 34 --diet vegetarian
+"""
+
+import sys
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from food_index import FoodIndex, normalize_food_name
+
+# tags of the foods in dataset.csv; foods without tags are only offered when no diet is set
+FOOD_TAGS: Dict[str, Set[str]] = {
+    "spinach": set(),
+    "almonds": {"warming"},
+    "apple": {"cooling"},
+    "banana": {"cooling"},
+    "egg": {"egg", "warming"},
+    "fish": {"fish"},
+    "milk": {"dairy", "cooling"},
+    "tofu": set(),
+    "oats": {"warming"},
+    "carrot": set(),
+    "broccoli": set(),
+    "lentils": {"warming"},
+    "orange": {"cooling"},
+    "chicken": {"meat", "warming"},
+    "paneer": {"dairy"},
+    "rice": set(),
+}
+
+# diet -> tags it excludes
+DIETS: Dict[str, Set[str]] = {
+    "vegan": {"meat", "fish", "egg", "dairy"},
+    "vegetarian": {"meat", "fish", "egg"},
+    "eggetarian": {"meat", "fish"},
+    "pescatarian": {"meat"},
+}
+
+HOT_DAY_C = 30.0
+COLD_DAY_C = 15.0
+
+
+class Recommender:
+    def __init__(self, index: FoodIndex, tags: Dict[str, Set[str]] = FOOD_TAGS,
+                 step_g: float = 50.0, max_grams: float = 300.0, max_foods: int = 5,
+                 max_steps: int = 24, shortlist: int = 20):
+        self.step_g = step_g
+        self.max_grams = max_grams
+        self.max_foods = max_foods
+        self.max_steps = max_steps
+        self.shortlist = shortlist
+        self.names = list(index.names)
+        self.columns = {c: j for j, c in enumerate(index.columns)}
+        self.matrix = np.array(index.matrix, dtype=np.float64)
+        known = np.array(index.known, dtype=bool)
+
+        e = self.columns["Energy"]
+        self.energy = self.matrix[:, e]
+        # foods with a known, positive energy value can be scored per kcal
+        self.usable = known[:, e] & (self.energy > 0)
+
+        food_tags = [tags.get(normalize_food_name(n)) for n in self.names]
+        self.diet_masks = {
+            diet: self.usable & np.array([t is not None and not (t & banned) for t in food_tags], dtype=bool)
+            for diet, banned in DIETS.items()
+        }
+        self.warming = np.array([bool(t) and "warming" in t for t in food_tags], dtype=bool)
+        self.cooling = np.array([bool(t) and "cooling" in t for t in food_tags], dtype=bool)
+
+        # nutrient -> indices of usable foods that contain it, best amount per kcal first
+        density = np.zeros_like(self.matrix)
+        density[self.usable] = self.matrix[self.usable] / self.energy[self.usable, None]
+        self.rankings: Dict[str, np.ndarray] = {}
+        for nutrient, j in self.columns.items():
+            order = np.argsort(-density[:, j], kind="stable")
+            self.rankings[nutrient] = order[(density[order, j] > 0) & known[order, j]]
+
+    def _allowed(self, temp: Optional[float], diet: Optional[str]) -> np.ndarray:
+        allowed = self.diet_masks[diet] if diet else self.usable
+        if temp is not None:
+            avoid = self.warming if temp > HOT_DAY_C else self.cooling if temp < COLD_DAY_C else None
+            if avoid is not None and (allowed & ~avoid).any():
+                allowed = allowed & ~avoid
+        return allowed
+
+    def recommend(self, deficits: Dict[str, float], temp: Optional[float] = None,
+                  diet: Optional[str] = None) -> List[Tuple[str, float]]:
+        """
+        deficits: {nutrient: canonical amount still needed}. Returns [(food, grams)],
+        largest portion first. Raises KeyError for an unknown diet.
+        """
+        nutrients = [n for n, amount in deficits.items() if n in self.columns and amount and amount > 0]
+        if not nutrients:
+            return []
+        allowed = self._allowed(temp, diet)
+        shortlists = []
+        for n in nutrients:
+            ranked = self.rankings[n]
+            shortlists.append(ranked[allowed[ranked]][:self.shortlist])
+        candidates = np.unique(np.concatenate(shortlists))
+        if candidates.size == 0:
+            return []
+
+        cols = [self.columns[n] for n in nutrients]
+        need = np.array([deficits[n] for n in nutrients], dtype=np.float64)
+        portion = self.step_g / 100.0
+        gain = self.matrix[np.ix_(candidates, cols)] * portion      # nutrients per step, per food
+        cost = self.energy[candidates] * portion                    # kcal per step, per food
+        remaining = need.copy()
+        grams = np.zeros(candidates.size)
+
+        for _ in range(self.max_steps):
+            covered = (np.minimum(gain, remaining) / need).sum(axis=1)
+            open_ = grams < self.max_grams
+            if np.count_nonzero(grams) >= self.max_foods:
+                open_ &= grams > 0
+            score = np.where(open_, covered / cost, 0.0)
+            best = int(np.argmax(score))
+            if score[best] <= 1e-9:
+                break
+            grams[best] += self.step_g
+            remaining = np.maximum(remaining - gain[best], 0.0)
+            if not remaining.any():
+                break
+
+        picked = np.flatnonzero(grams)
+        picked = picked[np.argsort(-grams[picked], kind="stable")]
+        return [(self.names[candidates[i]], float(grams[i])) for i in picked]
+
+
+def main(argv=None) -> int:
+    import argparse
+    from food_index import load_default_index
+    from nutrition import parse_amount
+    parser = argparse.ArgumentParser(description="Recommend foods for a set of deficits.")
+    parser.add_argument("deficits", nargs="+", help="NUTRIENT=AMOUNTUNIT, e.g. Protein=30g Iron=8mg")
+    parser.add_argument("--temp", type=float, help="outdoor temperature in °C")
+    parser.add_argument("--diet", choices=sorted(DIETS))
+    args = parser.parse_args(argv)
+
+    deficits = {}
+    for spec in args.deficits:
+        nutrient, _, text = spec.partition("=")
+        number = text.rstrip("abcdefghijklmnopqrstuvwxyzµμ")
+        amount = parse_amount(nutrient, f"{number} {text[len(number):]}")
+        if amount is None:
+            parser.error(f"cannot read {spec!r}")
+        deficits[nutrient] = amount
+    for name, grams in Recommender(load_default_index()).recommend(deficits, args.temp, args.diet):
+        print(f"{grams:6.0f} g  {name}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
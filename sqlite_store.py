@@ -0,0 +1,66 @@
+# sqlite_store.py
+"""
+Pooled SQLite connections for state shared between gunicorn workers.
+
+Connections are autocommit, in WAL mode, and kept in a small per-process pool:
+callers check one out with `with store.connection() as conn:` for the statements
+(or the transaction) at hand and give it back right away. Under the gevent worker
+threading.local is per greenlet, so a per-thread connection would mean a new
+connection, PRAGMAs and schema run for every request; the pool reuses a handful
+per process instead. The schema is applied once per store, and connections
+inherited over a fork are never used by the child.
+
+SQLite calls still block the calling thread (and, under gevent, the worker's
+event loop) for their duration; they are short local reads and writes, so a
+transaction must never wait on the network while it holds a connection.
+"""
+
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Iterator, List
+
+
+class SQLiteStore:
+    def __init__(self, path: str, schema: str = "", pool_size: int = 4):
+        self.path = path
+        self.schema = schema
+        self.pool_size = pool_size
+        self._pool: List[sqlite3.Connection] = []
+        self._pid = os.getpid()
+        self._schema_applied = False
+        self._lock = threading.Lock()
+        self.opened = 0      # connections opened by this process (see DEPLOYMENT.md)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        if self.schema and not self._schema_applied:
+            conn.executescript(self.schema)
+            self._schema_applied = True
+        self.opened += 1
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """A connection for the caller's exclusive use until the block ends."""
+        with self._lock:
+            if self._pid != os.getpid():
+                # forked: the parent's connections stay the parent's
+                self._pool, self._pid, self.opened = [], os.getpid(), 0
+            conn = self._pool.pop() if self._pool else None
+        if conn is None:
+            conn = self._connect()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")     # the block bailed out of its own transaction
+            with self._lock:
+                if self._pid == os.getpid() and len(self._pool) < self.pool_size:
+                    self._pool.append(conn)
+                    conn = None
+            if conn is not None:
+                conn.close()
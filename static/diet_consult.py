@@ -25,20 +25,26 @@ except Exception as e:
 # default model — change if you prefer another Gemini model
 DEFAULT_MODEL = "gemini-2.5-flash"
 
+_client = None
+_client_pid = None
+
 def _ensure_client():
     """
-    Initialize the GenAI client. Fails with RuntimeError if GEMINI_API_KEY not set
-    or google-genai SDK not installed.
+    Return the module's GenAI client, creating it on first use (and again after a fork).
+    Fails with RuntimeError if GEMINI_API_KEY not set or google-genai SDK not installed.
     """
+    global _client, _client_pid
     api_key = os.getenv("GEMINI_API_KEY")
     if not api_key:
         raise RuntimeError("Please set GEMINI_API_KEY environment variable (Google AI Studio).")
     if genai is None:
         raise RuntimeError("google-genai SDK not installed. Run: pip install google-genai")
-    # client constructor will pick up API key from env automatically in most examples,
-    # but set it explicitly to be safe:
-    client = genai.Client(api_key=api_key)
-    return client
+    if _client is None or _client_pid != os.getpid():
+        # client constructor will pick up API key from env automatically in most examples,
+        # but set it explicitly to be safe:
+        _client = genai.Client(api_key=api_key)
+        _client_pid = os.getpid()
+    return _client
 
 def _format_prompt(profile: Dict[str, Any], totals: Dict[str, str],
                    deficiencies: Dict[str, str], weather: Dict[str, Any],
@@ -0,0 +1,653 @@
+/* ============================
+   Full client-side localization
+   ============================ */
+
+/* Translation dictionaries:
+   - UI strings
+   - nutrient labels mapping
+   - food name translations (recommendations)
+*/
+const translations = {
+  en: {
+    code: "EN", flag: "🌐",
+    title: "🥗 NutriGuard AI — Smart Nutrition Recommender",
+    heightPlaceholder: "Height (cm)",
+    weightPlaceholder: "Weight (kg)",
+    cityPlaceholder: "Enter your city",
+    namePlaceholder: "Food name",
+    qtyPlaceholder: "Qty (g)",
+    qtyTip: "Tip: Qty is interpreted as <strong>grams</strong> (e.g. 200 for 200g).",
+    addFood: "➕ Add Another Food",
+    analyze: "Analyze 🍽️",
+    consult_ai: "Consult with AI 🤖",
+    weatherHeading: (city) => `✅ Weather in ${city}`,
+    totalNutrients: "📊 Total Nutrients:",
+    deficient: "🧩 Deficient Nutrients:",
+    allBalanced: "🎉 All nutrients balanced!",
+    partialNote: "⚠️ Some data took too long and is missing below. Try again in a moment.",
+    unavailableNote: (services) => `⚠️ Temporarily unavailable: ${services}. Affected foods are left out of the totals below.`,
+    recommendations: "🍴 Recommended Foods & Nutrients:",
+    consultation_summary: "📝 AI Summary:",
+    consultation_meal_plan: "🥗 AI Meal Plan:",
+    consultation_advice: "💡 AI General Advice:",
+    errorPrefix: "❌",
+    need_more: (nutrient, value) => `${nutrient}: need ${value} more`,
+    nutrients: {
+      "Protein": "Protein",
+      "Vitamin C": "Vitamin C",
+      "Iron": "Iron",
+      "Calcium": "Calcium",
+      "Fiber": "Fiber"
+    },
+    foods: {
+      "Chicken": "Chicken",
+      "Eggs": "Eggs",
+      "Paneer": "Paneer",
+      "Oats": "Oats",
+      "Apple": "Apple",
+      "Carrots": "Carrots",
+      "Orange": "Orange",
+      "Guava": "Guava",
+      "Kiwi": "Kiwi",
+      "Spinach": "Spinach",
+      "Liver": "Liver",
+      "Beans": "Beans",
+      "Milk": "Milk",
+      "Curd": "Curd",
+      "Almonds": "Almonds",
+      "Egg": "Egg",
+      "Banana": "Banana",
+      "Fish": "Fish",
+      "Tofu": "Tofu",
+      "Carrot": "Carrot",
+      "Broccoli": "Broccoli",
+      "Lentils": "Lentils",
+      "Rice": "Rice"
+    }
+  },
+  hi: {
+    code: "HI", flag: "🌏",
+    title: "🥗 NutriGuard AI — स्मार्ट पोषण सुझावक",
+    heightPlaceholder: "ऊँचाई (सेमी)",
+    weightPlaceholder: "वजन (किलो)",
+    cityPlaceholder: "अपने शहर का नाम डालें",
+    namePlaceholder: "खाद्य नाम",
+    qtyPlaceholder: "मात्रा (ग्राम)",
+    qtyTip: "सूचना: मात्रा ग्राम में है (उदा., 200 = 200g)।",
+    addFood: "➕ और एक जोड़ें",
+    analyze: "विश्लेषण करें 🍽️",
+    consult_ai: "AI से सलाह लें 🤖",
+    weatherHeading: (city) => `✅ मौसम — ${city}`,
+    totalNutrients: "📊 कुल पोषक तत्व:",
+    deficient: "🧩 कम पोषक तत्व:",
+    allBalanced: "🎉 सभी पोषक तत्व संतुलित हैं!",
+    partialNote: "⚠️ कुछ डेटा समय पर नहीं मिला, इसलिए नीचे का परिणाम अधूरा है। थोड़ी देर बाद फिर कोशिश करें।",
+    unavailableNote: (services) => `⚠️ अभी उपलब्ध नहीं: ${services}। प्रभावित खाद्य पदार्थ नीचे के कुल में शामिल नहीं हैं।`,
+    recommendations: "🍴 सुझाए गए खाद्य पदार्थ और पोषक तत्व:",
+    consultation_summary: "📝 AI सारांश:",
+    consultation_meal_plan: "🥗 AI भोजन योजना:",
+    consultation_advice: "💡 AI सामान्य सलाह:",
+    errorPrefix: "❌",
+    need_more: (nutrient, value) => `${nutrient}: आवश्यकता ${value} अधिक`,
+    nutrients: {
+      "Protein": "प्रोटीन",
+      "Vitamin C": "विटामिन C",
+      "Iron": "आयरन",
+      "Calcium": "कैल्शियम",
+      "Fiber": "फाइबर"
+    },
+    foods: {
+      "Chicken": "चिकन",
+      "Eggs": "अंडे",
+      "Paneer": "पनीर",
+      "Oats": "ओट्स",
+      "Apple": "सेब",
+      "Carrots": "गाजर",
+      "Orange": "संतरा",
+      "Guava": "पेरिच / अमरूद", // regional variant ok
+      "Kiwi": "कीवी",
+      "Spinach": "पालक",
+      "Liver": "लीवर",
+      "Beans": "बीन्स",
+      "Milk": "दूध",
+      "Curd": "दही",
+      "Almonds": "बादाम",
+      "Egg": "अंडा",
+      "Banana": "केला",
+      "Fish": "मछली",
+      "Tofu": "टोफू",
+      "Carrot": "गाजर",
+      "Broccoli": "ब्रोकली",
+      "Lentils": "दाल",
+      "Rice": "चावल"
+    }
+  },
+  te: {
+    code: "TE", flag: "🌏",
+    title: "🥗 NutriGuard AI — స్మార్ట్ పోషణ సలహాదారు",
+    heightPlaceholder: "ఎత్తు (సెం.మీ)",
+    weightPlaceholder: "బరువు (kg)",
+    cityPlaceholder: "మీ నగరాన్ని నమోదు చేయండి",
+    namePlaceholder: "ఆహార పేరు",
+    qtyPlaceholder: "మొత్తం (గ్రాములు)",
+    qtyTip: "గమనిక: పరిమాణం గ్రాముల్లో (ఉదా., 200 = 200g).",
+    addFood: "➕ మరొకటి జోడించండి",
+    analyze: "విశ్లేషించు 🍽️",
+    consult_ai: "AI ని సంప్రదించండి 🤖",
+    weatherHeading: (city) => `✅ వాతావరణం — ${city}`,
+    totalNutrients: "📊 మొత్తం పోషకాలు:",
+    deficient: "🧩 లోపాలు ఉన్న పోషకాలు:",
+    allBalanced: "🎉 అన్ని పోషకాలు సమతుల్యంగా ఉన్నవి!",
+    partialNote: "⚠️ కొంత డేటా సమయానికి అందలేదు, కాబట్టి క్రింది ఫలితం అసంపూర్ణం. కొద్దిసేపటి తర్వాత మళ్లీ ప్రయత్నించండి.",
+    unavailableNote: (services) => `⚠️ ప్రస్తుతం అందుబాటులో లేదు: ${services}. ప్రభావిత ఆహారాలు క్రింది మొత్తాలలో లేవు.`,
+    recommendations: "🍴 సూచించిన ఆహారాలు & పోషకాలు:",
+    consultation_summary: "📝 AI సారాంశం:",
+    consultation_meal_plan: "🥗 AI భోజన ప్రణాళిక:",
+    consultation_advice: "💡 AI సాధారణ సలహా:",
+    errorPrefix: "❌",
+    need_more: (nutrient, value) => `${nutrient}: అవసరం ${value} ఎక్కువ`,
+    nutrients: {
+      "Protein": "ప్రోటీన్",
+      "Vitamin C": "విటమిన్ C",
+      "Iron": "ఐరన్",
+      "Calcium": "కాల్షియం",
+      "Fiber": "ఫైబర్"
+    },
+    foods: {
+      "Chicken": "చికెన్",
+      "Eggs": "గుడ్లు",
+      "Paneer": "పనీరు",
+      "Oats": "ఓట్స్",
+      "Apple": "ఆపిల్",
+      "Carrots": "క్యారెట్",
+      "Orange": "ఆరెంజ్",
+      "Guava": "పెరుగు / జామ",
+      "Kiwi": "కివి",
+      "Spinach": "పాలకూర",
+      "Liver": "లివర్",
+      "Beans": "బీన్స్",
+      "Milk": "పాల",
+      "Curd": "తయాంబు / పెరుగు",
+      "Almonds": "బాదాం",
+      "Egg": "గుడ్డు",
+      "Banana": "అరటిపండు",
+      "Fish": "చేప",
+      "Tofu": "టోఫు",
+      "Carrot": "క్యారెట్",
+      "Broccoli": "బ్రోకలీ",
+      "Lentils": "పప్పు",
+      "Rice": "అన్నం"
+    }
+  }
+};
+
+/* Persisted language in localStorage */
+const LS_KEY = "nutri_lang";
+let currentLang = localStorage.getItem(LS_KEY) || "en";
+let currentAnalysisData = null;
+
+/* Helpers to get translations easily */
+function t(key) {
+  return translations[currentLang][key];
+}
+function trNutrient(key) {
+  return translations[currentLang].nutrients[key] || key;
+}
+function trFood(key) {
+  return translations[currentLang].foods[key] || key;
+}
+
+/* UI elements */
+const langBtn = document.getElementById("langBtn");
+const langMenu = document.getElementById("langMenu");
+const currentLangEl = document.getElementById("currentLang");
+const langFlagEl = document.getElementById("langFlag");
+
+/* Setup language picker visible and interactive */
+function applyLangToPicker() {
+  currentLangEl.textContent = translations[currentLang].code;
+  langFlagEl.textContent = translations[currentLang].flag || "🌐";
+}
+applyLangToPicker();
+
+/* Open/close menu */
+langBtn.addEventListener("click", (e) => {
+  e.stopPropagation();
+  const expanded = langBtn.getAttribute("aria-expanded") === "true";
+  langBtn.setAttribute("aria-expanded", (!expanded).toString());
+  langMenu.hidden = !langMenu.hidden;
+});
+document.addEventListener("click", () => { langMenu.hidden = true; langBtn.setAttribute("aria-expanded","false"); });
+
+document.querySelectorAll(".lang-option").forEach(btn => {
+  btn.addEventListener("click", () => {
+    const lang = btn.getAttribute("data-lang");
+    setLanguage(lang);
+    langMenu.hidden = true;
+    langBtn.setAttribute("aria-expanded","false");
+  });
+});
+
+/* Apply translations to all static UI elements */
+function applyTranslations() {
+  const dict = translations[currentLang];
+  document.getElementById("title").innerHTML = dict.title;
+  document.getElementById("height").placeholder = dict.heightPlaceholder;
+  document.getElementById("weight").placeholder = dict.weightPlaceholder;
+  document.getElementById("city").placeholder = dict.cityPlaceholder;
+  document.querySelectorAll(".food-name").forEach(el => el.placeholder = dict.namePlaceholder);
+  document.querySelectorAll(".food-qty").forEach(el => el.placeholder = dict.qtyPlaceholder);
+  document.getElementById("qtyTip").innerHTML = dict.qtyTip;
+  document.getElementById("addBtn").textContent = dict.addFood;
+  document.getElementById("analyzeBtn").textContent = dict.analyze;
+  document.getElementById("consultBtn").textContent = dict.consult_ai;
+  applyLangToPicker();
+}
+
+/* Set and persist language */
+function setLanguage(lang) {
+  if (!translations[lang]) lang = "en";
+  currentLang = lang;
+  localStorage.setItem(LS_KEY, lang);
+  applyTranslations();
+}
+
+/* Initial apply */
+setLanguage(currentLang);
+
+/* Add another food row */
+function addFood() {
+  const list = document.getElementById("food-list");
+  const div = document.createElement("div");
+  div.classList.add("food-item");
+  div.innerHTML = `
+    <input type="text" placeholder="${translations[currentLang].namePlaceholder}" class="food-name" list="food-suggestions" autocomplete="off" />
+    <input type="number" placeholder="${translations[currentLang].qtyPlaceholder}" class="food-qty" min="1" value="100" />
+  `;
+  list.appendChild(div);
+}
+
+/* Food name autocomplete (served from the local index / cache, never USDA) */
+const foodSuggestions = document.getElementById("food-suggestions");
+let suggestTimer = null;
+let suggestQuery = "";
+document.getElementById("food-list").addEventListener("input", (e) => {
+  if (!e.target.classList.contains("food-name")) return;
+  const q = e.target.value.trim();
+  clearTimeout(suggestTimer);
+  if (q.length < 2 || q === suggestQuery) return;
+  suggestTimer = setTimeout(async () => {
+    suggestQuery = q;
+    try {
+      const res = await fetch(`/foods/suggest?q=${encodeURIComponent(q)}`);
+      const data = await res.json();
+      if (q !== suggestQuery) return; // a newer query is in flight
+      foodSuggestions.innerHTML = (data.suggestions || [])
+        .map(s => `<option value="${escapeHtml(s.name)}"></option>`).join("");
+    } catch (err) {
+      // autocomplete is best-effort
+    }
+  }, 150);
+});
+
+/* Render output fully localized */
+function escapeHtml(s){
+  return String(s).replaceAll("&","&amp;").replaceAll("<","&lt;").replaceAll(">","&gt;").replaceAll('"',"&quot;");
+}
+
+function renderOutput(data, city) {
+  const dict = translations[currentLang];
+  const out = document.getElementById("output");
+  const weather = data.weather || null;
+  let html = "";
+
+  // the server ran out of time for the weather or some foods
+  if (data.partial) {
+    html += `<p style="color:#b26a00;">${escapeHtml(dict.partialNote)}</p>`;
+  }
+  if ((data.unavailable || []).length) {
+    const names = { usda: "USDA FoodData Central", weather: "WeatherAPI" };
+    const services = data.unavailable.map(u => names[u] || u).join(", ");
+    html += `<p style="color:#b26a00;">${escapeHtml(dict.unavailableNote(services))}</p>`;
+  }
+
+  // Weather header (localized)
+  const weatherHeading = dict.weatherHeading(city || (weather && weather.location) || "");
+  html += `<h3>${escapeHtml(weatherHeading)}</h3>`;
+  if (weather) {
+    html += `<p>🌤 ${escapeHtml(weather.condition)}, 🌡 ${escapeHtml(String(weather.temp))}°C, 💧 ${escapeHtml(String(weather.humidity))}%</p>`;
+  }
+
+  // Total nutrients
+  html += `<h3>${dict.totalNutrients}</h3>`;
+  const totals = data.total_nutrients || {};
+  if (!Object.keys(totals).length) {
+    html += `<p>-</p>`;
+  } else {
+    html += `<ul>`;
+    for (const [k, v] of Object.entries(totals)) {
+      html += `<li><strong>${escapeHtml(trNutrient(k))}:</strong> ${escapeHtml(v)}</li>`;
+    }
+    html += `</ul>`;
+  }
+
+  // Deficiencies
+  html += `<h3>${dict.deficient}</h3>`;
+  const deficient = data.deficient || {};
+  if (!Object.keys(deficient).length) {
+    html += `<p>${dict.allBalanced}</p>`;
+  } else {
+    html += `<ul>`;
+    for (const [k, v] of Object.entries(deficient)) {
+      const label = trNutrient(k);
+      html += `<li>${escapeHtml(dict.need_more(label, v))}</li>`;
+    }
+    html += `</ul>`;
+  }
+
+  // Recommendations
+  html += `<h3>${dict.recommendations}</h3>`;
+  const recs = data.recommendations || [];
+  if (!recs.length) {
+    html += `<p>-</p>`;
+  } else {
+    html += `<ul>`;
+    recs.forEach(item => {
+      // item could be [name, amt] or [name, amt, unit] or [name, '-', '-']
+      const name = item[0] || "";
+      const amt = item[1] || "";
+      // translate food name if we have mapping
+      const nameLocal = trFood(name);
+      html += `<li>${escapeHtml(nameLocal)}${amt && amt !== "-" ? " — " + escapeHtml(amt) : ""}</li>`;
+    });
+    html += `</ul>`;
+  }
+
+  out.innerHTML = html;
+}
+
+/* POST to /analyze and render localized output */
+async function analyze() {
+  const city = document.getElementById("city").value.trim();
+  const gender = document.getElementById("gender").value;
+  const height = document.getElementById("height").value;
+  const weight = document.getElementById("weight").value;
+  const foodNames = document.querySelectorAll(".food-name");
+  const foodQtys = document.querySelectorAll(".food-qty");
+
+  const items = [];
+  for (let i = 0; i < foodNames.length; i++) {
+    const name = foodNames[i].value.trim();
+    const qty = foodQtys[i].value;
+    if (name) items.push({ name, qty });
+  }
+
+  const payload = { city, gender, height, weight, items, lang: currentLang };
+  const outEl = document.getElementById("output");
+  outEl.innerHTML = `<p>⏳ ...</p>`;
+
+  try {
+    const res = await fetch("/analyze", {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify(payload)
+    });
+    const data = await res.json();
+    if (data.error) {
+      outEl.innerHTML = `<p style="color:red;">${escapeHtml(translations[currentLang].errorPrefix)} ${escapeHtml(data.error)}</p>`;
+      currentAnalysisData = null;
+      document.getElementById("consultBtn").style.display = "none";
+      return;
+    }
+    renderOutput(data, city);
+    currentAnalysisData = data;
+    chatSessionId = null; // the next chat message opens a session for this analysis
+    document.getElementById("consultBtn").style.display = "inline-block";
+    chatWidget.style.display = "flex"; // Show the chatbot
+  } catch (err) {
+    outEl.innerHTML = `<p style="color:red;">${escapeHtml(translations[currentLang].errorPrefix)} ${escapeHtml(err.message || String(err))}</p>`;
+    currentAnalysisData = null;
+    document.getElementById("consultBtn").style.display = "none";
+  }
+}
+
+async function consultAI() {
+  if (!currentAnalysisData) return;
+
+  const outEl = document.getElementById("output");
+  const consultBtn = document.getElementById("consultBtn");
+  consultBtn.disabled = true;
+  outEl.innerHTML += `<div id="consult-output"><p>🤖 ...</p></div>`;
+
+  const payload = {
+    ...currentAnalysisData,
+    lang: currentLang,
+    height: document.getElementById("height").value,
+    weight: document.getElementById("weight").value,
+    gender: document.getElementById("gender").value,
+  };
+
+  // filled in as the streamed consultation arrives
+  const consult = { summary: "", meal_plan: [], advice: "" };
+  const showError = (msg) => {
+    document.getElementById("consult-output").innerHTML = `<p style="color:red;">${escapeHtml(translations[currentLang].errorPrefix)} ${escapeHtml(msg)}</p>`;
+  };
+
+  try {
+    const res = await fetch("/consult/stream", {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify(payload)
+    });
+    if (!res.ok || !res.body) {
+      const data = await res.json().catch(() => ({}));
+      showError(data.error || res.statusText);
+      return;
+    }
+    await readSSE(res, (event, data) => {
+      if (event === "summary" || event === "advice") {
+        consult[event] = data.text;
+      } else if (event === "meal") {
+        consult.meal_plan.push(data.meal);
+      } else if (event === "done") {
+        Object.assign(consult, data.consult);
+      } else if (event === "error") {
+        showError(data.error);
+        return;
+      }
+      renderConsultation(consult);
+    });
+  } catch (err) {
+    showError(err.message || String(err));
+  } finally {
+    consultBtn.disabled = false;
+  }
+}
+
+function renderConsultation(consult) {
+  const dict = translations[currentLang];
+  let html = "";
+
+  if (consult.summary) {
+    html += `<h3>${dict.consultation_summary}</h3>`;
+    html += `<p>${escapeHtml(consult.summary)}</p>`;
+  }
+  if (consult.meal_plan && consult.meal_plan.length) {
+    html += `<h3>${dict.consultation_meal_plan}</h3>`;
+    html += `<ul>`;
+    consult.meal_plan.forEach(meal => {
+      html += `<li><strong>${escapeHtml(meal.meal)}:</strong> ${escapeHtml(meal.name)} — <em>${escapeHtml((meal.items || []).join(", "))}</em></li>`;
+    });
+    html += `</ul>`;
+  }
+  if (consult.advice) {
+    html += `<h3>${dict.consultation_advice}</h3>`;
+    html += `<p>${escapeHtml(consult.advice)}</p>`;
+  }
+
+  document.getElementById("consult-output").innerHTML = html;
+}
+
+/* wiring */
+document.getElementById("addBtn").addEventListener("click", addFood);
+document.getElementById("analyzeBtn").addEventListener("click", analyze);
+document.getElementById("consultBtn").addEventListener("click", consultAI);
+
+
+// --- CHATBOT SCRIPT ---
+const chatWidget = document.getElementById("chat-widget");
+const chatHeader = document.getElementById("chat-header");
+const chatToggleBtn = document.getElementById("chat-toggle-btn");
+const chatMessages = document.getElementById("chat-messages");
+const chatInput = document.getElementById("chat-input");
+const chatSendBtn = document.getElementById("chat-send-btn");
+const suggestionBtns = document.querySelectorAll(".suggestion-btn");
+
+// Hide chat widget initially
+chatWidget.style.display = "none";
+
+// Toggle minimize/maximize
+chatToggleBtn.addEventListener("click", () => {
+  chatWidget.classList.toggle("minimized");
+  chatToggleBtn.textContent = chatWidget.classList.contains("minimized") ? "+" : "-";
+});
+
+let chatController = null;
+let chatSessionId = null;
+
+// Open a server-side chat session holding the current analysis (once per analysis)
+async function ensureChatSession() {
+  if (chatSessionId) return chatSessionId;
+  const res = await fetch("/chat/session", {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ analysis_data: currentAnalysisData, lang: currentLang })
+  });
+  const data = await res.json();
+  if (!data.ok) throw new Error(data.error || "Could not start a chat session.");
+  chatSessionId = data.session_id;
+  return chatSessionId;
+}
+
+// POST a message to /chat/stream, re-opening the session once if it expired
+async function postChatMessage(messageText, signal) {
+  for (let attempt = 0; ; attempt++) {
+    const res = await fetch("/chat/stream", {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ message: messageText, session_id: await ensureChatSession(), lang: currentLang }),
+      signal
+    });
+    if (res.status !== 404 || attempt > 0) return res;
+    chatSessionId = null;
+  }
+}
+
+// Read a text/event-stream response, calling onEvent(eventName, parsedData) per event
+async function readSSE(res, onEvent) {
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    let sep;
+    while ((sep = buffer.indexOf("\n\n")) !== -1) {
+      const block = buffer.slice(0, sep);
+      buffer = buffer.slice(sep + 2);
+      let event = "message";
+      let data = "";
+      block.split("\n").forEach(line => {
+        if (line.startsWith("event: ")) event = line.slice(7);
+        else if (line.startsWith("data: ")) data += line.slice(6);
+      });
+      onEvent(event, data ? JSON.parse(data) : {});
+    }
+  }
+}
+
+// Function to add a message to the chat window
+function addMessage(sender, text) {
+  const messageEl = document.createElement("div");
+  messageEl.classList.add("message", sender);
+  messageEl.textContent = text;
+  chatMessages.appendChild(messageEl);
+  chatMessages.scrollTop = chatMessages.scrollHeight; // Auto-scroll
+}
+
+// Function to handle sending a message
+async function sendMessage() {
+  const messageText = chatInput.value.trim();
+  if (!messageText) return;
+
+  addMessage("user", messageText);
+  chatInput.value = "";
+
+  const typingIndicator = document.createElement("div");
+  typingIndicator.classList.add("message", "bot");
+  typingIndicator.textContent = "...";
+  chatMessages.appendChild(typingIndicator);
+  chatMessages.scrollTop = chatMessages.scrollHeight;
+
+  if (!currentAnalysisData) {
+    typingIndicator.textContent = "Please run a nutrition analysis first to get personalized advice.";
+    return;
+  }
+
+  // a new question cancels a reply that is still streaming
+  if (chatController) chatController.abort();
+  const controller = new AbortController();
+  chatController = controller;
+
+  try {
+    const res = await postChatMessage(messageText, controller.signal);
+    if (!res.ok || !res.body) {
+      const data = await res.json().catch(() => ({}));
+      typingIndicator.remove();
+      addMessage("bot", `Error: ${data.error || 'Something went wrong.'}`);
+      return;
+    }
+
+    let reply = "";
+    await readSSE(res, (event, data) => {
+      if (event === "delta") {
+        reply += data.text;
+        typingIndicator.textContent = reply;
+        chatMessages.scrollTop = chatMessages.scrollHeight;
+      } else if (event === "error") {
+        typingIndicator.textContent = reply ? `${reply} — Error: ${data.error}` : `Error: ${data.error || 'Something went wrong.'}`;
+      } else if (event === "done" && data.partial) {
+        typingIndicator.textContent = reply ? `${reply} …` : "Error: No reply in time, please try again.";
+      }
+    });
+    if (!reply && typingIndicator.textContent === "...") typingIndicator.remove();
+  } catch (err) {
+    if (err.name === "AbortError") return;
+    typingIndicator.remove();
+    addMessage("bot", `Error: ${err.message || 'Could not connect to the server.'}`);
+  } finally {
+    if (chatController === controller) chatController = null;
+  }
+}
+
+// Event Listeners
+chatSendBtn.addEventListener("click", sendMessage);
+chatInput.addEventListener("keydown", (e) => {
+  if (e.key === "Enter") {
+    e.preventDefault();
+    sendMessage();
+  }
+});
+
+suggestionBtns.forEach(btn => {
+  btn.addEventListener("click", () => {
+    chatInput.value = btn.textContent;
+    sendMessage();
+  });
+});
+// --- END CHATBOT SCRIPT ---
+
+
+/* keep language across reloads */
+applyTranslations();
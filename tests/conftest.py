@@ -0,0 +1,24 @@
+# tests/conftest.py
+"""
+Puts the project root on sys.path and points every state file the app keeps at a
+throwaway directory before anything imports app.py, so tests never touch the real
+caches, logs or breakers (or the network: upstream keys are dummies).
+"""
+
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+STATE_DIR = tempfile.mkdtemp(prefix="nutri-tests-")
+for _var, _name in {"NUTRIENT_CACHE_PATH": "nutrient_cache.sqlite3", "CONSULT_JOBS_PATH": "consult_jobs.sqlite3",
+                    "CHAT_SESSION_PATH": "chat_sessions.sqlite3", "BREAKER_PATH": "circuit_breakers.sqlite3",
+                    "METRICS_PATH": "metrics.sqlite3", "MEAL_LOG_PATH": "meal_log.sqlite3",
+                    "CACHE_SNAPSHOT_PATH": "cache_snapshot.json"}.items():
+    os.environ[_var] = os.path.join(STATE_DIR, _name)
+os.environ["USDA_API_KEY"] = "test"
+os.environ["WEATHER_API_KEY"] = "test"
+os.environ["USDA_BASE_URL"] = "http://127.0.0.1:9/fdc/v1"
+os.environ["WEATHER_BASE_URL"] = "http://127.0.0.1:9/weather/v1"
@@ -0,0 +1,60 @@
+import json
+
+import pytest
+
+import app
+from bulk_analyze import analyze_records
+from deadline import Deadline
+
+
+def _resolve(keys):
+    return {key: ({"Protein": 2700.0} if key == "rice" else {}) for key in keys}
+
+
+@pytest.mark.parametrize("bad, error", [
+    ({"id": 2, "meals": ["oops"]}, "each meal must be an object {date, items}"),
+    ({"id": 2, "items": [["rice", 100]]}, "items must be a list of objects {name, qty}"),
+    ({"id": 2, "meals": {"date": "2026-01-01"}}, "meals must be a list"),
+    ({"id": 2, "meals": [{"items": "rice"}]}, "items must be a list of objects {name, qty}"),
+    ("rice", "record must be an object"),
+])
+def test_malformed_record_gets_an_error_and_the_others_are_analyzed(bad, error):
+    good = {"id": 1, "items": [{"name": "rice", "qty": 100}]}
+    results = list(analyze_records([good, bad, dict(good, id=3)], {}, _resolve))
+    assert [r.get("id") for r in results] == [1, None if bad == "rice" else 2, 3]
+    assert results[1]["error"] == error
+    assert results[0]["days"][0]["total_nutrients"]["Protein"] == results[2]["days"][0]["total_nutrients"]["Protein"]
+
+
+def test_batch_endpoint_streams_past_a_malformed_line():
+    lines = [{"id": "a", "items": [{"name": "rice", "qty": 100}]}, {"id": "b", "meals": ["oops"]},
+             {"id": "c", "items": [["rice", 100]]}, {"id": "d", "items": [{"name": "rice", "qty": 50}]}]
+    body = "\n".join(json.dumps(line) for line in lines) + "\nnot json\n"
+    resp = app.app.test_client().post("/analyze/batch", data=body, content_type="application/x-ndjson")
+    assert resp.status_code == 200
+    results = [json.loads(line) for line in resp.get_data(as_text=True).splitlines()]
+    assert [r.get("id") for r in results] == ["a", "b", "c", "d", None]
+    assert "days" in results[0] and "days" in results[3]
+    assert "error" in results[1] and "error" in results[2] and results[4]["error"].startswith("invalid JSON line")
+
+
+def test_foods_not_answered_in_time_are_reported_and_not_memoized():
+    def resolve(keys):
+        return {key: ({"Protein": 2700.0} if key == "rice" else None) for key in keys}
+
+    vectors = {}
+    rec = {"id": 1, "items": [{"name": "rice", "qty": 100}, {"name": "slow bean", "qty": 50}]}
+    result, = analyze_records([rec], vectors, resolve)
+    assert result["timeout"] == ["slow bean"] and result["unresolved"] == []
+    assert "slow bean" not in vectors and "rice" in vectors
+    assert result["days"][0]["total_nutrients"]["Protein"] == "2.7 g"
+
+
+def test_spent_deadline_answers_misses_as_timeouts_without_calling_usda(monkeypatch):
+    def no_session():
+        raise AssertionError("USDA was asked after the deadline")
+    monkeypatch.setattr(app, "http_session", no_session)
+    monkeypatch.setattr(app, "_ensure_http_resources", no_session)
+    app.UPSTREAMS["usda"].record_success()
+    found = app.lookup_foods(["qzxv never cached"], Deadline(0))
+    assert found["qzxv never cached"]["timeout"] is True
@@ -0,0 +1,64 @@
+import gzip
+import os
+
+import app
+from assets import Assets, Precompressed, negotiate
+
+
+def _static(tmp_path, css="body { color: red; }\n" * 50):
+    static = tmp_path / "static"
+    static.mkdir(exist_ok=True)
+    (static / "style.css").write_text(css)
+    (static / "notes.md").write_text("not an asset")
+    return Assets(str(static))
+
+
+def test_build_fingerprints_and_precompresses(tmp_path):
+    assets = _static(tmp_path)
+    manifest = assets.build()
+    assert list(manifest) == ["style.css"]
+    built = manifest["style.css"]
+    assert built.startswith("dist/style.") and built.endswith(".css")
+    path = os.path.join(assets.static_dir, built)
+    with open(path, "rb") as f, open(path + ".gz", "rb") as gz:
+        assert gzip.decompress(gz.read()) == f.read()
+    assert assets.path("style.css") == built and assets.path("missing.js") == "missing.js"
+
+
+def test_new_content_gets_a_new_name_and_old_files_stay(tmp_path):
+    old = _static(tmp_path).build()["style.css"]
+    new = _static(tmp_path, "body { color: blue; }\n" * 50).build()["style.css"]
+    assert new != old
+    assert os.path.exists(str(tmp_path / "static" / old)) and os.path.exists(str(tmp_path / "static" / new))
+
+
+def test_negotiate_honours_q_zero_and_wildcards():
+    assert negotiate("gzip, br", ("gzip",)) == "gzip"
+    assert negotiate("gzip;q=0, identity", ("gzip",)) is None
+    assert negotiate("*", ("gzip",)) == "gzip"
+    assert negotiate("", ("gzip",)) is None
+
+
+def test_variants_that_do_not_save_bytes_are_dropped():
+    assert Precompressed(b"x").variants == {}
+    assert "gzip" in Precompressed(b"x" * 1000).variants
+
+
+def test_page_is_compressed_and_revalidated():
+    client = app.app.test_client()
+    first = client.get("/", headers={"Accept-Encoding": "gzip"})
+    assert first.status_code == 200 and first.headers["Content-Encoding"] == "gzip"
+    assert first.headers["Cache-Control"] == "no-cache" and "Accept-Encoding" in first.headers["Vary"]
+    again = client.get("/", headers={"Accept-Encoding": "gzip", "If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304 and again.get_data() == b""
+    plain = client.get("/", headers={"If-None-Match": first.headers["ETag"]})
+    assert plain.status_code == 200 and "Content-Encoding" not in plain.headers
+
+
+def test_fingerprinted_assets_are_cached_for_good():
+    client = app.app.test_client()
+    built = app.ASSETS.path("style.css")
+    resp = client.get("/static/" + built, headers={"Accept-Encoding": "gzip"})
+    assert resp.status_code == 200 and "immutable" in resp.headers["Cache-Control"]
+    assert resp.mimetype == "text/css"
+    assert client.get("/static/dist/style.0000.css").status_code == 404
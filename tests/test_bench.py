@@ -0,0 +1,21 @@
+import glob
+import os
+import re
+import sys
+
+from conftest import ROOT
+
+sys.path.insert(0, os.path.join(ROOT, "bench"))
+
+from run_bench import STATE_FILES    # noqa: E402
+
+# read-only inputs, not state a run could leave behind
+INPUT_PATHS = {"FOOD_DATASET_PATH", "USDA_DUMP_PATH"}
+
+
+def test_benchmarks_redirect_every_state_file():
+    used = set()
+    for path in glob.glob(os.path.join(ROOT, "*.py")):
+        with open(path, encoding="utf-8") as f:
+            used.update(re.findall(r'getenv\("([A-Z_]+_PATH)"', f.read()))
+    assert used - INPUT_PATHS == set(STATE_FILES)
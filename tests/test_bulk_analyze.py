@@ -0,0 +1,45 @@
+import csv
+import gzip
+import json
+
+import pytest
+
+import app
+import bulk_analyze
+
+RECORDS = [
+    {"id": "a", "gender": "female", "height": 160, "weight": 55,
+     "meals": [{"date": "2026-01-01", "items": [{"name": "rice", "qty": 150}, {"name": "Chiken", "qty": 100}]},
+               {"date": "2026-01-02", "items": [{"name": "spinach", "qty": 200}]}]},
+    {"id": "b", "items": [{"name": "lentils", "qty": 80}, {"name": "dragonfruit custard", "qty": 10}]},
+    {"id": "c", "meals": ["oops"]},
+]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_cli_matches_the_batch_endpoint(tmp_path, workers):
+    src, dst = tmp_path / "meals.jsonl.gz", tmp_path / "out.jsonl"
+    with gzip.open(src, "wt") as f:
+        f.writelines(json.dumps(r) + "\n" for r in RECORDS)
+    assert bulk_analyze.main([str(src), str(dst), "--workers", str(workers), "--chunk", "2"]) == 0
+    offline = [json.loads(line) for line in dst.read_text().splitlines()]
+
+    body = "".join(json.dumps(r) + "\n" for r in RECORDS[:1] + RECORDS[2:])
+    resp = app.app.test_client().post("/analyze/batch", data=body, content_type="application/x-ndjson")
+    online = [json.loads(line) for line in resp.get_data(as_text=True).splitlines()]
+    assert [offline[0], offline[2]] == online
+    assert offline[1]["unresolved"] == ["dragonfruit custard"]     # never sent to USDA
+
+
+def test_csv_rows_of_one_id_form_one_record(tmp_path):
+    src, dst = tmp_path / "meals.csv", tmp_path / "out.csv"
+    with open(src, "w", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["id", "date", "food", "qty", "gender"])
+        w.writerows([["p1", "2026-01-01", "rice", "100", "male"], ["p1", "2026-01-01", "rice", "100", "male"],
+                     ["p1", "2026-01-02", "rice", "50", "male"], ["p2", "2026-01-01", "spinach", "100", "female"]])
+    assert bulk_analyze.main([str(src), str(dst), "--workers", "1"]) == 0
+    with open(dst, newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert [(r["id"], r["date"]) for r in rows] == [("p1", "2026-01-01"), ("p1", "2026-01-02"), ("p2", "2026-01-01")]
+    assert [r["Protein (g)"] for r in rows[:2]] == ["5.4", "1.35"]     # rice: 2.7 g per 100 g
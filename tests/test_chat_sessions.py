@@ -0,0 +1,53 @@
+import time
+
+from chat_sessions import ChatSessionStore, estimate_tokens
+
+
+def _store(tmp_path, **kwargs):
+    return ChatSessionStore(str(tmp_path / "c.sqlite3"), **kwargs)
+
+
+def test_session_keeps_only_the_analysis_fields_it_uses(tmp_path):
+    store = _store(tmp_path)
+    session_id = store.create({"total_nutrients": {"Iron": "4 mg"}, "deficient": {"Iron": "4 mg"},
+                               "recommendations": [["spinach", "100 g"]] * 100}, lang="hi")
+    session = store.get(session_id)
+    assert session["analysis"] == {"total_nutrients": {"Iron": "4 mg"}, "deficient": {"Iron": "4 mg"}}
+    assert session["lang"] == "hi" and session["turns"] == [] and session["summary"] == ""
+
+
+def test_history_is_compacted_to_the_token_budget(tmp_path):
+    store = _store(tmp_path, token_budget=200, summary_tokens=80)
+    session_id = store.create({})
+    for i in range(40):
+        store.add_turn(session_id, f"question {i} " + "about iron " * 20, f"answer {i} " + "eat lentils " * 20)
+    session = store.get(session_id)
+    recent = sum(estimate_tokens(text) for _, text in session["turns"])
+    assert recent <= 200 and estimate_tokens(session["summary"]) <= 80
+    # the newest exchange is kept verbatim, older ones only in the summary
+    assert session["turns"][-2][1].startswith("question 39") and session["turns"][-1][1].startswith("answer 39")
+    assert "question 0 " not in session["summary"] and "User: question" in session["summary"]
+
+
+def test_newest_exchange_survives_even_above_the_budget(tmp_path):
+    store = _store(tmp_path, token_budget=10)
+    session_id = store.create({})
+    store.add_turn(session_id, "first " * 50, "reply " * 50)
+    store.add_turn(session_id, "second " * 50, "reply " * 50)
+    roles = [role for role, _ in store.get(session_id)["turns"]]
+    assert roles == ["user", "assistant"] and store.get(session_id)["summary"].startswith("User: first")
+
+
+def test_expired_and_least_recently_used_sessions_are_dropped(tmp_path):
+    store = _store(tmp_path, ttl=0.2, max_sessions=2)
+    old = store.create({})
+    time.sleep(0.25)
+    assert store.get(old) is None
+    a, b = store.create({}), store.create({})
+    store.add_turn(a, "hi", "hello")
+    time.sleep(0.01)
+    store.get(a)                      # a is now used more recently than b
+    c = store.create({})
+    assert store.evict() == 2         # the expired one, then b
+    assert store.get(b) is None and store.get(a) and store.get(c)
+    assert store.stats()["turns"] == 2
@@ -0,0 +1,96 @@
+import time
+
+import pytest
+import requests
+
+from circuit_breaker import RetryBudget, UpstreamUnavailable, Upstreams
+from deadline import DeadlineExceeded
+
+
+class HTTPError(Exception):
+    def __init__(self, status):
+        super().__init__(status)
+        self.code = status
+
+
+@pytest.fixture
+def upstreams(tmp_path):
+    return Upstreams(("usda",), path=str(tmp_path / "b.sqlite3"), failure_threshold=3, reset_timeout=0.2)
+
+
+def _fail(breaker, e):
+    with pytest.raises(type(e)):
+        with breaker.guard():
+            raise e
+
+
+def test_opens_after_consecutive_upstream_failures_and_fails_fast(upstreams):
+    breaker = upstreams["usda"]
+    for _ in range(3):
+        _fail(breaker, requests.exceptions.ConnectionError())
+    assert breaker.is_open()
+    with pytest.raises(UpstreamUnavailable) as caught:
+        breaker.call(lambda: pytest.fail("must not be called while open"))
+    assert 0 < caught.value.retry_after <= 0.2
+
+
+def test_client_errors_and_successes_do_not_open_it(upstreams):
+    breaker = upstreams["usda"]
+    for _ in range(2):
+        _fail(breaker, HTTPError(503))
+    breaker.call(lambda: None)            # a success resets the count
+    for _ in range(5):
+        _fail(breaker, HTTPError(404))
+    _fail(breaker, HTTPError(429))
+    assert breaker.state() == {"state": "closed", "failures": 1, "retry_after": 0.0}
+
+
+def test_one_probe_after_the_reset_timeout_closes_or_reopens(upstreams, tmp_path):
+    breaker = upstreams["usda"]
+    for _ in range(3):
+        _fail(breaker, HTTPError(500))
+    time.sleep(0.25)
+    # another worker sharing the file sees the same state and the same single probe
+    other = Upstreams(("usda",), path=str(tmp_path / "b.sqlite3"), failure_threshold=3, reset_timeout=0.2)["usda"]
+    assert breaker.allow() and not other.allow()
+    breaker.record_failure()                      # failed probe: open again at once
+    assert other.is_open()
+    time.sleep(0.25)
+    assert other.allow()
+    other.record_success()
+    assert breaker.state()["state"] == "closed"
+
+
+def _half_open(breaker):
+    for _ in range(3):
+        _fail(breaker, HTTPError(500))
+    time.sleep(0.25)
+
+
+def test_a_probe_answered_with_a_client_error_closes_it(upstreams):
+    breaker = upstreams["usda"]
+    _half_open(breaker)
+    _fail(breaker, HTTPError(404))
+    assert breaker.state()["state"] == "closed"
+    breaker.call(lambda: None)
+
+
+@pytest.mark.parametrize("e", [DeadlineExceeded("USDA: request deadline exceeded"), GeneratorExit(),
+                               requests.exceptions.ReadTimeout()])
+def test_a_probe_cut_short_does_not_block_the_next_call(upstreams, tmp_path, e):
+    breaker = upstreams["usda"]
+    _half_open(breaker)
+    with pytest.raises(type(e)):
+        with breaker.guard(count_timeout=False):
+            raise e
+    other = Upstreams(("usda",), path=str(tmp_path / "b.sqlite3"), failure_threshold=3, reset_timeout=0.2)["usda"]
+    assert not other.is_open()
+    other.call(lambda: None)
+    assert breaker.state()["state"] == "closed"
+
+
+def test_retry_budget_is_a_fraction_of_recent_calls():
+    budget = RetryBudget(ratio=0.5, window=10, min_retries=1)
+    for _ in range(4):
+        budget.record_call()
+    assert [budget.try_retry() for _ in range(4)] == [True, True, True, False]
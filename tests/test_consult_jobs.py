@@ -0,0 +1,87 @@
+import sqlite3
+import threading
+import time
+
+from consult_jobs import JobQueue, LOST_JOB_ERROR
+
+
+def test_job_runs_and_keeps_its_result(tmp_path):
+    jobs = JobQueue(lambda payload: {"echo": payload["q"]}, path=str(tmp_path / "j.sqlite3"), workers=1)
+    job = jobs.wait(jobs.submit({"q": "hi"}), timeout=5, poll_interval=0.01)
+    assert job["status"] == "done" and job["result"] == {"echo": "hi"}
+
+
+def test_jobs_of_a_dead_process_fail_once_their_lease_runs_out(tmp_path):
+    path = str(tmp_path / "j.sqlite3")
+    release = threading.Event()
+    dead = JobQueue(lambda payload: release.wait(), path=path, workers=1, lease=0.2)
+    running, queued = dead.submit({}), dead.submit({})
+    while dead.get(running)["status"] != "running":
+        time.sleep(0.01)
+    # the process "dies": its threads stop renewing, another worker answers the polls
+    dead.renew = lambda: 0
+    poller = JobQueue(lambda payload: None, path=path, lease=0.2)
+    assert poller.get(running)["status"] == "running"
+    assert poller.get(queued)["status"] == "queued"
+    time.sleep(0.3)
+    for job_id in (running, queued):
+        job = poller.get(job_id)
+        assert job["status"] == "error" and job["error"] == LOST_JOB_ERROR
+    assert poller.stats()["all"]["running"] == 0
+    release.set()
+
+
+def test_live_process_keeps_renewing_its_lease(tmp_path):
+    release = threading.Event()
+    jobs = JobQueue(lambda payload: release.wait(), path=str(tmp_path / "j.sqlite3"), workers=1, lease=0.3)
+    job_id = jobs.submit({})
+    time.sleep(0.7)
+    assert jobs.get(job_id)["status"] == "running"
+    release.set()
+    assert jobs.wait(job_id, timeout=5, poll_interval=0.01)["status"] == "done"
+
+
+def test_job_table_from_before_leases_is_upgraded(tmp_path):
+    path = str(tmp_path / "j.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE jobs (id TEXT PRIMARY KEY, status TEXT NOT NULL, priority INTEGER NOT NULL, "
+                 "result TEXT, error TEXT, queued_at REAL NOT NULL, started_at REAL, finished_at REAL)")
+    conn.execute("INSERT INTO jobs (id, status, priority, queued_at) VALUES ('old', 'running', 5, 0)")
+    conn.commit()
+    conn.close()
+    jobs = JobQueue(lambda payload: None, path=path)
+    assert jobs.get("old")["status"] == "error"
+
+
+def test_a_result_after_the_lease_ran_out_does_not_revive_the_job(tmp_path):
+    path = str(tmp_path / "j.sqlite3")
+    release = threading.Event()
+    slow = JobQueue(lambda payload: release.wait() and {"late": True}, path=path, workers=1, lease=0.2)
+    job_id = slow.submit({})
+    while slow.get(job_id)["status"] != "running":
+        time.sleep(0.01)
+    slow.renew = lambda: 0
+    time.sleep(0.3)
+    poller = JobQueue(lambda payload: None, path=path, lease=0.2)
+    assert poller.get(job_id)["status"] == "error"
+    release.set()
+    time.sleep(0.2)
+    job = poller.get(job_id)
+    assert job["status"] == "error" and job["error"] == LOST_JOB_ERROR and "result" not in job
+
+
+def test_stats_only_reads(tmp_path):
+    path = str(tmp_path / "j.sqlite3")
+    release = threading.Event()
+    jobs = JobQueue(lambda payload: release.wait(), path=path, workers=1, lease=0.2)
+    job_id = jobs.submit({})
+    while jobs.get(job_id)["status"] != "running":
+        time.sleep(0.01)
+    jobs.renew = lambda: 0
+    jobs.expire = lambda job_id=None: 0      # no lease thread that would fail it meanwhile
+    time.sleep(0.3)
+    poller = JobQueue(lambda payload: None, path=path, lease=0.2)
+    assert poller.stats()["all"]["running"] == 1       # lapsed, but stats() does not fail it
+    assert poller.get(job_id)["status"] == "error"
+    assert poller.stats()["all"] == {"queued": 0, "running": 0, "done": 0, "error": 1}
+    release.set()
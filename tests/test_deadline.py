@@ -0,0 +1,93 @@
+import time
+
+import pytest
+import requests
+
+import app
+from circuit_breaker import is_upstream_failure
+from deadline import Deadline
+
+
+def test_header_budget_is_kept_within_floor_and_cap():
+    assert Deadline.from_header("100", default=10, maximum=110, minimum=1).budget == 1
+    assert Deadline.from_header("500000", default=10, maximum=110, minimum=1).budget == 110
+    assert Deadline.from_header("garbage", default=10, maximum=110, minimum=1).budget == 10
+    assert Deadline.from_header(None, default=10, maximum=110, minimum=1).budget == 10
+
+
+def test_only_a_client_shortened_budget_limits_calls():
+    assert not Deadline.from_header(None, default=10, maximum=110).limits(8)
+    assert not Deadline.from_header("20000", default=10, maximum=110).limits(8)
+    short = Deadline.from_header("3000", default=10, maximum=110)
+    assert short.limits(8) and short.limits(None) and not short.limits(2)
+
+
+def test_timeouts_can_be_left_uncounted():
+    e = requests.exceptions.ReadTimeout()
+    assert is_upstream_failure(e) and not is_upstream_failure(e, count_timeout=False)
+    assert is_upstream_failure(requests.exceptions.ConnectionError(), count_timeout=False)
+
+
+class TimingOutSession:
+    def __init__(self):
+        self.calls = 0
+
+    def get(self, url, params=None, timeout=None):
+        self.calls += 1
+        raise requests.exceptions.ReadTimeout(f"read timed out ({timeout} s)")
+
+
+@pytest.fixture
+def weather_times_out(monkeypatch):
+    session = TimingOutSession()
+    monkeypatch.setattr(app, "http_session", lambda: session)
+    breaker = app.UPSTREAMS["weather"]
+    breaker.record_success()
+    yield session
+    breaker.record_success()
+
+
+def test_short_client_deadlines_do_not_open_the_shared_breaker(weather_times_out):
+    client = app.app.test_client()
+    for i in range(8):
+        resp = client.post("/analyze", json={"city": f"city {i}", "items": [{"name": "rice", "qty": 100}]},
+                           headers={"X-Request-Deadline-Ms": "100"})
+        assert resp.status_code == 200
+    assert weather_times_out.calls >= 8
+    assert app.UPSTREAMS["weather"].state() == {"state": "closed", "failures": 0, "retry_after": 0.0}
+
+
+def test_timeouts_within_the_usual_cap_still_count(weather_times_out):
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        app._fetch_weather("somewhere", Deadline(app.WEATHER_TIMEOUT + 2))
+    assert app.UPSTREAMS["weather"].state()["failures"] >= 1
+
+
+class SlowUSDASession:
+    def get(self, url, params=None, timeout=None):
+        time.sleep(0.4)
+        return SlowUSDAResponse(params["query"])
+
+
+class SlowUSDAResponse:
+    status_code = 200
+
+    def __init__(self, query):
+        self.query = query
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {"foods": [{"description": self.query.title(),
+                           "foodNutrients": [{"nutrientId": 1003, "value": 7.5, "unitName": "G"}]}]}
+
+
+def test_a_usda_answer_that_misses_the_deadline_fills_the_cache(monkeypatch):
+    monkeypatch.setattr(app, "http_session", lambda: SlowUSDASession())
+    app.UPSTREAMS["usda"].record_success()
+    first = app.lookup_foods(["qzxv slow lentil"], Deadline(0.1))["qzxv slow lentil"]
+    assert first["timeout"] is True
+    time.sleep(0.6)
+    second = app.lookup_foods(["qzxv slow lentil"], Deadline(0.1))["qzxv slow lentil"]
+    assert second["source"] == "cache" and second["nutrients"] == {"Protein": 7500.0}
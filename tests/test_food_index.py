@@ -0,0 +1,64 @@
+import json
+
+import pytest
+
+import app
+from food_index import FoodIndex
+
+FDC_DUMP = {"FoundationFoods": [
+    {"description": "Quinoa, cooked", "foodNutrients": [
+        {"nutrient": {"id": 1003, "number": "203", "unitName": "g"}, "amount": 4.4},
+        {"nutrient": {"id": 1089, "number": "303", "unitName": "mg"}, "amount": 1.49},
+        {"nutrient": {"id": 1114, "number": "328", "unitName": "µg"}, "amount": 0.0},
+    ]},
+    {"description": "Nothing we track", "foodNutrients": [
+        {"nutrient": {"id": 1051, "number": "255", "unitName": "g"}, "amount": 71.6},
+    ]},
+]}
+
+
+def _index():
+    index = FoodIndex()
+    index.add_foods([("Egg", {"Protein": 13000.0}), ("Tomato", {"Vitamin C": 13.7}), ("Grass", {"Fiber": 1.0})],
+                    source="test")
+    return index
+
+
+@pytest.mark.parametrize("name, food", [("Eggs", "Egg"), ("  tomatoes ", "Tomato"), ("grass", "Grass"),
+                                        ("eggss", None), ("toma", None)])
+def test_plural_names_fall_back_to_the_singular(name, food):
+    index = _index()
+    row = index.row_for(name)
+    assert (index.names[row] if row is not None else None) == food
+
+
+def test_missing_values_are_left_out_not_zero():
+    assert _index().lookup("eggs") == {"Protein": 13000.0}
+    assert _index().lookup("bread") is None
+
+
+def test_usda_dump_round_trips_through_npz(tmp_path):
+    dump = tmp_path / "foundation.json"
+    dump.write_text(json.dumps(FDC_DUMP), encoding="utf-8")
+    index = FoodIndex()
+    assert index.import_usda_json(str(dump)) == 1
+    quinoa = {"Protein": pytest.approx(4400.0), "Iron": pytest.approx(1.49), "Vitamin D": 0.0}
+    assert index.lookup("quinoa, cooked") == quinoa
+    index.save_npz(str(tmp_path / "foods.npz"))
+    loaded = FoodIndex()
+    assert loaded.load_extra(str(tmp_path / "foods.npz")) == 1
+    assert loaded.lookup("Quinoa, Cooked") == quinoa
+    assert loaded.sources == ["usda-dump"]
+
+
+def test_local_foods_never_reach_usda(monkeypatch):
+    def no_usda(*args, **kwargs):
+        raise AssertionError("USDA was asked for a food the local index knows")
+    monkeypatch.setattr(app, "http_session", no_usda)
+    monkeypatch.setattr(app, "_ensure_http_resources", no_usda)
+    monkeypatch.setattr(app, "_search_usda_food_hedged", no_usda)
+    found = app.lookup_foods(["Rice", "eggs", "rice "])
+    assert list(found) == ["rice", "eggs"]
+    assert all(f["source"] == "local" and f["error"] is None for f in found.values())
+    assert found["rice"]["nutrients"]["Protein"] == pytest.approx(2700.0)
+    assert app.get_food_nutrients("Eggs") == found["eggs"]["nutrients"]
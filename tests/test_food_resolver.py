@@ -0,0 +1,89 @@
+import threading
+
+import pytest
+
+import app
+from food_resolver import FoodNameResolver, edit_distance
+
+LOCAL = ["apple", "fish", "chicken", "orange", "paneer", "broccoli", "banana"]
+DIFFERENT_FOODS = ["apple pie", "fish oil", "chicken curry", "orange juice", "paneer tikka"]
+
+
+@pytest.fixture
+def resolver():
+    r = FoodNameResolver()
+    for name in LOCAL:
+        r.add(name, "local")
+    return r
+
+
+def test_edit_distance_counts_swaps_and_stops_at_limit():
+    assert edit_distance("chiken", "chicken", 2) == 1
+    assert edit_distance("brocolli", "broccoli", 2) == 2
+    assert edit_distance("banaan", "banana", 2) == 1
+    assert edit_distance("apple", "paneer tikka", 2) == 3
+
+
+@pytest.mark.parametrize("query", DIFFERENT_FOODS)
+def test_longer_dish_is_not_a_typo_of_its_first_word(resolver, query):
+    assert resolver.best(query, 0.6) is not None      # similar enough to suggest...
+    assert resolver.typo_match(query, 0.6) is None    # ...but not to answer for it
+
+
+@pytest.mark.parametrize("query, expected", [("chiken", "chicken"), ("brocolli", "broccoli"),
+                                             ("bananna", "banana"), ("aple", "apple")])
+def test_misspellings_still_match(resolver, query, expected):
+    assert resolver.typo_match(query, 0.6)["name"] == expected
+
+
+def test_typo_match_accepts_a_cached_key(resolver):
+    resolver.add("Chicken, broilers or fryers, breast, meat only, raw", "cache", key="chicken breast")
+    assert resolver.typo_match("chicken breast", 0.3)["key"] == "chicken breast"
+    assert resolver.typo_match("chicken breest", 0.3)["key"] == "chicken breast"
+
+
+def test_scores_stay_right_past_the_initial_capacity():
+    r = FoodNameResolver()
+    for i in range(600):
+        r.add(f"food number {i}", "local")
+    r.add("quinoa", "local")
+    assert len(r) == 601
+    assert r.best("quinoa", 0.3) == {"name": "quinoa", "source": "local", "key": "quinoa", "score": 1.0}
+    assert r.best("food number 599", 0.3)["name"] == "food number 599"
+
+
+def test_search_while_names_are_added():
+    r = FoodNameResolver()
+    r.add("apple", "local")
+    errors = []
+
+    def search():
+        for _ in range(200):
+            try:
+                assert r.best("aple", 0.3)["name"] == "apple"
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=search) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for i in range(2000):
+        r.add(f"apple variety {i}", "cache")
+    for t in threads:
+        t.join()
+    assert not errors
+
+
+def test_lookup_foods_asks_usda_for_multi_word_dishes(monkeypatch):
+    asked = []
+
+    def fake_usda(key, deadline=None):
+        asked.append(key)
+        return {"description": key.title(), "nutrients": {"Protein": 1.0}}
+
+    monkeypatch.setattr(app, "_search_usda_food_hedged", fake_usda)
+    found = app.lookup_foods(DIFFERENT_FOODS + ["chiken"])
+    assert sorted(asked) == sorted(DIFFERENT_FOODS)
+    for key in DIFFERENT_FOODS:
+        assert found[key]["source"] == "usda" and "match" not in found[key]
+    assert found["chiken"]["match"] == "Chicken"
@@ -0,0 +1,119 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import app
+
+
+class FakeGemini:
+    """Stands in for genai.Client: answers every call with the next scripted reply, in chunks."""
+
+    def __init__(self, *replies, chunk=7):
+        self.replies = list(replies)
+        self.chunk = chunk
+        self.calls = 0
+        self.models = self
+
+    def _next(self):
+        self.calls += 1
+        return self.replies.pop(0) if len(self.replies) > 1 else self.replies[0]
+
+    def generate_content(self, model=None, contents=None, config=None):
+        return SimpleNamespace(text=self._next(), usage_metadata=None)
+
+    def generate_content_stream(self, model=None, contents=None, config=None):
+        text = self._next()
+        return iter([SimpleNamespace(text=text[i:i + self.chunk], usage_metadata=None)
+                     for i in range(0, len(text), self.chunk)])
+
+
+@pytest.fixture
+def gemini(monkeypatch):
+    fake = FakeGemini('{"summary": "ok", "meal_plan": [], "advice": "ok"}')
+    monkeypatch.setattr(app, "_ensure_gemini_client", lambda: fake)
+    app.UPSTREAMS["gemini"].record_success()
+    app.CONSULT_CACHE.clear()
+    return fake
+
+
+def _consult_events(age=30):
+    profile = {"age": age, "gender": "female", "height_cm": 160, "weight_kg": 55, "activity": "moderate"}
+    return list(app.stream_consult_with_gemini(profile, {"Protein": "20 g"}, {"Iron": "10 mg"}, {}))
+
+
+def test_broken_model_json_streams_the_summary_once(gemini):
+    gemini.replies = ['{"summary": "Eat more greens.", "meal_plan": [{"meal": "Lunch"} "advice": "x"}']
+    events = _consult_events()
+    assert [kind for kind, _ in events].count("summary") == 1
+    assert events[0] == ("summary", "Eat more greens.")
+    assert events[-1][0] == "done"
+
+
+def test_unparseable_reply_still_gets_a_fallback_summary(gemini):
+    gemini.replies = ["Sorry, no JSON today."]
+    events = _consult_events(age=31)
+    assert events[0] == ("summary", "Sorry, no JSON today.")
+    assert [kind for kind, _ in events] == ["summary", "done"]
+
+
+def test_same_consultation_is_answered_from_the_cache(gemini):
+    profile = {"age": 40, "gender": "male", "height_cm": 175, "weight_kg": 70, "activity": "moderate"}
+    weather = {"condition": "Sunny", "temp": 31.2, "humidity": 40}
+    first = app.consult_with_gemini(profile, {"Protein": "20.3 g"}, {"Iron": "6.36 mg"}, weather)
+    # the same inputs up to rounding hit the same entry
+    again = app.consult_with_gemini(dict(profile, weight_kg=70.2), {"Protein": "20.4 g"}, {"Iron": "6.4 mg"},
+                                    dict(weather, condition="sunny", temp=31.6))
+    assert again == first and gemini.calls == 1
+    app.consult_with_gemini(dict(profile, age=60), {"Protein": "20.3 g"}, {"Iron": "6.36 mg"}, weather)
+    assert gemini.calls == 2
+
+
+def test_one_gemini_client_per_process(monkeypatch):
+    made = []
+
+    class Client:
+        def __init__(self, api_key=None, http_options=None):
+            made.append(self)
+
+    monkeypatch.setattr(app, "GEMINI_API_KEY", "test")
+    monkeypatch.setattr(app, "_genai", lambda: SimpleNamespace(Client=Client))
+    monkeypatch.setattr(app, "_gemini_client", None)
+    first = app._ensure_gemini_client()
+    assert app._ensure_gemini_client() is first and len(made) == 1
+    monkeypatch.setattr(app, "_gemini_client_pid", -1)        # as seen from a forked worker
+    assert app._ensure_gemini_client() is not first and len(made) == 2
+
+
+def _sse_events(body):
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+@pytest.fixture
+def chat_client(gemini, monkeypatch):
+    monkeypatch.setattr(app, "GENAI_INSTALLED", True)
+    monkeypatch.setattr(app, "GEMINI_API_KEY", "test")
+    return app.app.test_client()
+
+
+def test_chat_stream_sends_deltas_then_done(chat_client, gemini):
+    gemini.replies = ["Add a bowl of lentils and some spinach to lunch."]
+    resp = chat_client.post("/chat/stream", json={"message": "What should I eat?",
+                                                  "analysis_data": {"deficient": {"Iron": "6 mg"}}})
+    assert resp.status_code == 200 and resp.mimetype == "text/event-stream"
+    events = _sse_events(resp.get_data(as_text=True))
+    assert [kind for kind, _ in events[:-1]] == ["delta"] * (len(events) - 1) and len(events) > 2
+    assert "".join(data["text"] for _, data in events[:-1]) == gemini.replies[0]
+    assert events[-1] == ("done", {})
+
+
+def test_chat_stream_reports_upstream_errors_as_an_event(chat_client, monkeypatch):
+    def broken():
+        raise RuntimeError("model overloaded")
+    monkeypatch.setattr(app, "_ensure_gemini_client", broken)
+    resp = chat_client.post("/chat/stream", json={"message": "hi"})
+    assert _sse_events(resp.get_data(as_text=True)) == [("error", {"error": "model overloaded"})]
@@ -0,0 +1,58 @@
+import json
+
+import pytest
+
+from json_stream import IncrementalObjectParser
+
+DOC = {"summary": "Eat more greens.",
+       "meal_plan": [{"meal": "Breakfast", "name": "Oats", "items": ["oats 50 g", "milk"]},
+                     {"meal": "Lunch", "name": "Dal", "items": ["lentils"]}],
+       "advice": "Drink water.", "score": 42}
+
+
+def _events(text, size):
+    parser = IncrementalObjectParser(stream_arrays=("meal_plan",))
+    events = []
+    for i in range(0, len(text), size):
+        events += parser.feed(text[i:i + size])
+    return parser, events
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, 1000])
+def test_fields_and_items_come_out_as_they_complete(size):
+    parser, events = _events("```json\n" + json.dumps(DOC, indent=2) + "\n```", size)
+    assert events == [("field", "summary", DOC["summary"]),
+                      ("item", "meal_plan", DOC["meal_plan"][0]),
+                      ("item", "meal_plan", DOC["meal_plan"][1]),
+                      ("field", "advice", DOC["advice"]),
+                      ("field", "score", 42)]
+    assert parser.result() == DOC
+
+
+def test_number_is_not_reported_before_it_ends():
+    parser = IncrementalObjectParser()
+    assert parser.feed('{"score": 4') == []
+    assert parser.feed('2}') == [("field", "score", 42)]
+
+
+def test_cut_off_stream_keeps_what_was_parsed():
+    text = json.dumps(DOC)
+    parser, events = _events(text[:text.index('"advice"') + 12], 5)
+    assert parser.result() is None
+    assert [e[:2] for e in events] == [("field", "summary"), ("item", "meal_plan"), ("item", "meal_plan")]
+    assert parser.obj["meal_plan"] == DOC["meal_plan"]
+
+
+@pytest.mark.parametrize("text", ['{"a" "b"}', '{"summary": "x", "advice" 1}', '{1: 2}'])
+@pytest.mark.parametrize("size", [1, 1000])
+def test_malformed_objects_fail_the_parse(text, size):
+    parser, _events_seen = _events(text, size)
+    assert parser.failed and parser.result() is None
+    assert parser.feed('"more": 1}') == []
+
+
+def test_colon_split_across_chunks():
+    parser = IncrementalObjectParser()
+    assert parser.feed('{"a" ') == []
+    assert parser.feed(' : 1, "b": true}') == [("field", "a", 1), ("field", "b", True)]
+    assert parser.result() == {"a": 1, "b": True}
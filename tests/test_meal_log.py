@@ -0,0 +1,67 @@
+import pytest
+
+import app
+from meal_log import MealLog
+
+
+@pytest.fixture
+def client():
+    return app.app.test_client()
+
+
+def _token(client, day="2026-03-01"):
+    resp = client.post("/log/items", json={"day": day, "items": [{"name": "rice", "qty": 100}]})
+    assert resp.status_code == 200
+    return resp.get_json()["token"], resp
+
+
+@pytest.mark.parametrize("day", ["2026-13-45", "2026-02-30", "2026-1-5", "yesterday"])
+def test_impossible_days_are_rejected(client, day):
+    token, first = _token(client)
+    user_id = first.get_json()["user_id"]
+    headers = {"X-Log-Token": token}
+    resp = client.post("/log/items", json={"day": day, "items": [{"name": "rice", "qty": 100}]}, headers=headers)
+    assert resp.status_code == 400
+    assert client.get(f"/log/today?day={day}", headers=headers).status_code == 400
+    assert app.MEAL_LOG.day(user_id, day) is None
+
+
+def test_log_totals_follow_added_and_removed_items(client):
+    day = "2026-03-01"
+    token, first = _token(client, day)
+    headers = {"X-Log-Token": token}
+    second = client.post("/log/items", json={"day": day, "items": [{"name": "rice", "qty": 100}]}, headers=headers)
+    assert "token" not in second.get_json()
+    item_id = second.get_json()["items"][0]["id"]
+    today = client.get(f"/log/today?day={day}", headers=headers).get_json()
+    assert today["item_count"] == 2
+    assert today["total_nutrients"]["Protein"] == "5.4 g"
+    resp = client.delete(f"/log/items/{item_id}", headers=headers)
+    assert resp.status_code == 200
+    assert client.get(f"/log/today?day={day}", headers=headers).get_json()["total_nutrients"] == \
+        first.get_json()["total_nutrients"]
+
+
+def test_a_log_is_only_reachable_with_its_own_token(client):
+    day = "2026-03-01"
+    mine, first = _token(client, day)
+    victim = first.get_json()["user_id"]
+    item_id = first.get_json()["items"][0]["id"]
+    theirs, _ = _token(client, day)
+    other = {"X-Log-Token": theirs}
+    # naming someone else's user_id, with or without a token of one's own
+    assert client.get(f"/log/today?user_id={victim}&day={day}").status_code == 401
+    assert client.get(f"/log/today?user_id={victim}&day={day}", headers=other).status_code == 403
+    assert client.post("/log/items", json={"user_id": victim, "items": [{"name": "rice", "qty": 100}]}
+                       ).status_code == 401
+    assert client.get(f"/log/today?day={day}", headers={"X-Log-Token": "guessed"}).status_code == 403
+    # another user's item id is simply not found
+    assert client.delete(f"/log/items/{item_id}", headers=other).status_code == 404
+    assert client.get(f"/log/today?day={day}", headers={"X-Log-Token": mine}).get_json()["item_count"] == 1
+
+
+def test_profile_updates_keep_the_token(tmp_path):
+    log = MealLog(str(tmp_path / "m.sqlite3"))
+    user_id, token = log.create_user()
+    log.add(user_id, "2026-03-01", [], lambda totals, profile: {}, {"city": "Pune"})
+    assert log.user_for_token(token) == user_id and log.profile(user_id) == {"city": "Pune"}
@@ -0,0 +1,86 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import app
+from metrics import Metrics, RequestTimer
+
+
+@pytest.fixture
+def metrics(tmp_path):
+    m = Metrics(str(tmp_path / "m.sqlite3"), flush_interval=3600)
+    m.counter("reqs_total", "requests")
+    m.gauge("in_flight", "requests in flight")
+    m.histogram("duration_seconds", "duration", buckets=(0.1, 1.0))
+    return m
+
+
+def _dead_pid():
+    proc = subprocess.Popen([sys.executable, "-c", "pass"])
+    proc.wait()
+    return proc.pid
+
+
+def _copy_rows(m, pid):
+    """What another worker with the same counts would have flushed."""
+    with m._store.connection() as conn:
+        conn.execute("INSERT INTO samples SELECT ?, family, sample, labels, kind, value FROM samples WHERE pid = ?",
+                     (pid, os.getpid()))
+
+
+def test_counters_sum_over_workers_and_gauges_only_over_live_ones(metrics):
+    metrics.inc("reqs_total", endpoint="analyze", status=200)
+    metrics.inc("reqs_total", endpoint="analyze", status=200)
+    metrics.add("in_flight", 1, endpoint="analyze")
+    metrics.flush()
+    _copy_rows(metrics, os.getppid())          # a live worker
+    _copy_rows(metrics, _dead_pid())           # a worker that has exited
+    families = metrics.collect()
+    assert families["reqs_total"] == {("reqs_total", '{endpoint="analyze",status="200"}'): 6.0}
+    assert families["in_flight"] == {("in_flight", '{endpoint="analyze"}'): 2.0}
+
+
+def test_histograms_render_cumulative_buckets(metrics):
+    for seconds in (0.05, 0.5, 0.7, 3.0):
+        metrics.observe("duration_seconds", seconds, endpoint="chat")
+    text = metrics.render()
+    assert text.splitlines()[:7] == [
+        "# HELP duration_seconds duration",
+        "# TYPE duration_seconds histogram",
+        'duration_seconds_bucket{endpoint="chat",le="0.1"} 1',
+        'duration_seconds_bucket{endpoint="chat",le="1"} 3',
+        'duration_seconds_bucket{endpoint="chat",le="+Inf"} 4',
+        'duration_seconds_sum{endpoint="chat"} 4.25',
+        'duration_seconds_count{endpoint="chat"} 4',
+    ]
+
+
+def test_collectors_and_scrape_time_samples_are_rendered(metrics):
+    metrics.counter("cache_hits_total", "hits")
+    metrics.collector(lambda: [("cache_hits_total", {"cache": "weather"}, 7)])
+    text = metrics.render([("breaker_open", "gauge", "open breakers", {"upstream": "usda"}, 1)])
+    assert 'cache_hits_total{cache="weather"} 7' in text
+    assert "# TYPE breaker_open gauge" in text and 'breaker_open{upstream="usda"} 1' in text
+
+
+def test_server_timing_lists_each_phase_and_the_total():
+    timer = RequestTimer()
+    with timer.phase("weather"):
+        pass
+    with timer.phase("foods"):
+        pass
+    with timer.phase("weather"):
+        pass
+    parts = [part.split(";")[0] for part in timer.header().split(", ")]
+    assert parts == ["weather", "foods", "total"]
+
+
+def test_every_response_is_timed_and_counted():
+    client = app.app.test_client()
+    resp = client.get("/foods/suggest?q=spinac")
+    assert resp.status_code == 200 and "total;dur=" in resp.headers["Server-Timing"]
+    text = client.get("/metrics").get_data(as_text=True)
+    assert "# TYPE nutri_requests_total counter" in text
+    assert any(line.startswith("nutri_requests_total{") and "suggest" in line for line in text.splitlines())
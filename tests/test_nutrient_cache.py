@@ -0,0 +1,36 @@
+import threading
+import time
+
+from nutrient_cache import NutrientCache
+
+
+def test_get_or_fetch_caches_and_reports_hits(tmp_path):
+    cache = NutrientCache(str(tmp_path / "c.sqlite3"))
+    assert cache.get_or_fetch("rice", lambda key: {"nutrients": {"Protein": 1.0}}) == \
+        ({"nutrients": {"Protein": 1.0}}, False)
+    assert cache.get_or_fetch("rice", lambda key: 1 / 0) == ({"nutrients": {"Protein": 1.0}}, True)
+
+
+def test_key_locks_are_released_after_each_fill(tmp_path):
+    cache = NutrientCache(str(tmp_path / "c.sqlite3"))
+    for i in range(200):
+        cache.get_or_fetch(f"food {i}", lambda key: None)
+    assert cache._key_locks == {}
+
+
+def test_concurrent_misses_fetch_once_and_leave_no_lock(tmp_path):
+    cache = NutrientCache(str(tmp_path / "c.sqlite3"))
+    calls = []
+
+    def fetch(key):
+        calls.append(key)
+        time.sleep(0.1)
+        return {"nutrients": {}}
+
+    threads = [threading.Thread(target=cache.get_or_fetch, args=("oats", fetch)) for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert calls == ["oats"]
+    assert cache._key_locks == {}
@@ -0,0 +1,54 @@
+import pytest
+
+from nutrition import canonical_nutrients, convert_to_mg, format_amount, map_usda_nutrients, to_canonical
+
+
+@pytest.mark.parametrize("amount, unit, nutrient, canonical", [
+    (400, "IU", "Vitamin D", 0.01),          # 10 µg
+    (1000, "IU", "Vitamin A", 0.3),          # 300 µg RAE (retinol)
+    (15, "IU", "Vitamin E", 10.05),
+    (2.5, "G", "Protein", 2500.0),
+    (80, "mcg", "Folate", 0.08),
+    (418.4, "kJ", "Energy", 100.0),
+])
+def test_units_convert_to_mg_or_kcal(amount, unit, nutrient, canonical):
+    assert to_canonical(amount, unit, nutrient) == pytest.approx(canonical)
+
+
+def test_unknown_units_are_left_out_not_guessed():
+    assert to_canonical(3, "IU", "Iron") is None
+    assert to_canonical(3, "furlong", "Protein") is None
+    with pytest.raises(ValueError):
+        convert_to_mg(3, "furlong", "Protein")
+    mapped = map_usda_nutrients([{"nutrientId": 1003, "value": 3, "unitName": "furlong"},
+                                 {"nutrientId": 1087, "value": 120, "unitName": "MG"}])
+    assert mapped == {"Calcium": 120.0}
+
+
+def test_usda_nutrients_map_by_id_or_number_not_name():
+    mapped = map_usda_nutrients([
+        {"nutrientId": 1003, "nutrientName": "something else", "value": 2.7, "unitName": "G"},
+        {"nutrientNumber": "401", "nutrientName": "?", "value": 12, "unitName": "MG"},
+        {"nutrient": {"id": 1089, "number": "303", "unitName": "mg"}, "amount": 0.8},   # FDC download shape
+        {"nutrientId": 9999, "nutrientName": "Protein", "value": 99, "unitName": "G"},
+    ])
+    assert mapped == pytest.approx({"Protein": 2700.0, "Vitamin C": 12.0, "Iron": 0.8})
+
+
+def test_primary_ids_win_over_aliases_in_any_order():
+    mapped = map_usda_nutrients([
+        {"nutrientId": 1110, "value": 400, "unitName": "IU"},     # Vitamin D (IU) alias
+        {"nutrientId": 1114, "value": 5, "unitName": "UG"},       # Vitamin D (D2 + D3)
+        {"nutrientId": 1104, "value": 1000, "unitName": "IU"},    # Vitamin A alias only
+    ])
+    assert mapped == pytest.approx({"Vitamin D": 0.005, "Vitamin A": 0.3})
+    assert format_amount("Vitamin A", mapped["Vitamin A"]) == "300.0 µg"
+
+
+def test_old_cache_entries_are_normalized():
+    old = {"Protein": [2.7, "G"], "Vitamin C, total ascorbic acid": [12, "MG"],
+           "Iron, Fe": (800, "UG"), "Fiber, total dietary": [1.5, "G"], "Water": [68, "G"]}
+    assert canonical_nutrients(old) == pytest.approx(
+        {"Protein": 2700.0, "Vitamin C": 12.0, "Iron": 0.8, "Fiber": 1500.0})
+    assert canonical_nutrients({"Protein": 2700.0}) == {"Protein": 2700.0}
+    assert canonical_nutrients(None) == {}
@@ -0,0 +1,54 @@
+import pytest
+
+from food_index import FoodIndex
+from recommender import Recommender
+
+FOODS = [
+    ("Chicken", {"Protein": 27000.0, "Iron": 1.0, "Energy": 165.0}),
+    ("Tofu", {"Protein": 8000.0, "Calcium": 350.0, "Iron": 5.4, "Energy": 76.0}),
+    ("Milk", {"Protein": 3400.0, "Calcium": 120.0, "Energy": 60.0}),
+    ("Lentils", {"Protein": 9000.0, "Iron": 3.3, "Energy": 116.0}),
+    ("Butter", {"Protein": 900.0, "Energy": 717.0}),
+    ("Mystery powder", {"Protein": 90000.0}),            # energy unknown: cannot be scored per kcal
+]
+TAGS = {"chicken": {"meat", "warming"}, "tofu": set(), "milk": {"dairy", "cooling"},
+        "lentils": {"warming"}, "butter": {"dairy"}}
+
+
+def _recommender(foods=FOODS, **kwargs):
+    index = FoodIndex()
+    index.add_foods(foods, source="test")
+    return Recommender(index, tags=TAGS, **kwargs)
+
+
+def test_portions_cover_the_deficit_at_the_lowest_energy():
+    assert _recommender().recommend({"Protein": 30000.0}) == [("Chicken", 100.0), ("Tofu", 50.0)]
+
+
+def test_diet_is_a_hard_filter():
+    picks = _recommender().recommend({"Protein": 30000.0, "Calcium": 600.0}, diet="vegan")
+    assert picks and {name for name, _ in picks} <= {"Tofu", "Lentils"}
+    with pytest.raises(KeyError):
+        _recommender().recommend({"Protein": 30000.0}, diet="carnivore")
+
+
+def test_weather_drops_warming_or_cooling_foods_unless_nothing_is_left():
+    hot = _recommender().recommend({"Protein": 30000.0}, temp=34)
+    assert hot and not {name for name, _ in hot} & {"Chicken", "Lentils"}
+    cold = _recommender().recommend({"Calcium": 600.0}, temp=5)
+    assert "Milk" not in {name for name, _ in cold}
+    only_milk = _recommender(FOODS[2:3]).recommend({"Calcium": 600.0}, temp=5)
+    assert [name for name, _ in only_milk] == ["Milk"]
+
+
+def test_portions_stay_within_the_limits():
+    rec = _recommender(max_grams=150.0, max_foods=2)
+    picks = rec.recommend({"Protein": 500000.0, "Calcium": 5000.0, "Iron": 50.0})
+    assert 0 < len(picks) <= 2
+    assert all(0 < grams <= 150.0 and grams % 50.0 == 0 for _, grams in picks)
+    assert "Mystery powder" not in {name for name, _ in picks}
+
+
+def test_nothing_to_cover_recommends_nothing():
+    assert _recommender().recommend({}) == []
+    assert _recommender().recommend({"Protein": 0.0, "Sodium": 100.0}) == []
@@ -0,0 +1,54 @@
+import threading
+
+import pytest
+
+from sqlite_store import SQLiteStore
+
+SCHEMA = "CREATE TABLE IF NOT EXISTS kv (k TEXT PRIMARY KEY, v TEXT);"
+
+
+def test_connections_are_reused(tmp_path):
+    store = SQLiteStore(str(tmp_path / "s.sqlite3"), SCHEMA)
+    for i in range(100):
+        with store.connection() as conn:
+            conn.execute("INSERT INTO kv VALUES (?, ?)", (str(i), "x"))
+    assert store.opened == 1
+
+
+def test_pool_keeps_at_most_pool_size_connections(tmp_path):
+    store = SQLiteStore(str(tmp_path / "s.sqlite3"), SCHEMA, pool_size=2)
+    inside = threading.Barrier(5)
+
+    def use():
+        with store.connection() as conn:
+            inside.wait()
+            conn.execute("SELECT COUNT(*) FROM kv").fetchone()
+
+    threads = [threading.Thread(target=use) for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert store.opened == 5        # each caller had a connection of its own
+    assert len(store._pool) == 2
+
+
+def test_unfinished_transaction_is_rolled_back_on_return(tmp_path):
+    store = SQLiteStore(str(tmp_path / "s.sqlite3"), SCHEMA)
+    with pytest.raises(RuntimeError):
+        with store.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("INSERT INTO kv VALUES ('a', 'b')")
+            raise RuntimeError
+    with store.connection() as conn:
+        assert not conn.in_transaction
+        assert conn.execute("SELECT COUNT(*) FROM kv").fetchone()[0] == 0
+
+
+def test_connections_from_before_a_fork_are_not_reused(tmp_path):
+    store = SQLiteStore(str(tmp_path / "s.sqlite3"), SCHEMA)
+    with store.connection() as conn:
+        inherited = conn
+    store._pid = -1                 # as seen from a forked child
+    with store.connection() as conn:
+        assert conn is not inherited
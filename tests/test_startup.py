@@ -0,0 +1,24 @@
+import os
+import subprocess
+import sys
+
+import app
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_importing_the_app_leaves_the_sdks_for_later():
+    code = ("import sys, app; "
+            "print(sorted(m for m in ('google.genai', 'requests', 'tenacity') if m in sys.modules))")
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=os.environ, capture_output=True,
+                         text=True, check=True).stdout
+    assert out.strip().splitlines()[-1] == "[]"
+
+
+def test_warm_up_restores_the_cache_snapshot():
+    app.WEATHER_CACHE.set("snapshot city", {"condition": "Sunny", "temp": 30, "humidity": 40})
+    assert app.save_cache_snapshot() >= 1
+    app.WEATHER_CACHE.clear()
+    done = app.warm_up()
+    assert done["snapshot_entries"] >= 1 and done["assets"] > 0
+    assert app.WEATHER_CACHE.get("snapshot city")["temp"] == 30
@@ -0,0 +1,106 @@
+import threading
+import time
+
+import pytest
+
+from ttl_cache import TTLCache, load_snapshot, save_snapshot
+
+
+class Loader:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, key):
+        with self.lock:
+            self.calls += 1
+            n = self.calls
+        time.sleep(self.delay)
+        return f"{key}-{n}"
+
+
+def test_fresh_entries_are_reused_and_expire():
+    cache, load = TTLCache(ttl=0.1), Loader()
+    assert cache.get_or_load("pune", load) == "pune-1"
+    assert cache.get_or_load("pune", load) == "pune-1"
+    time.sleep(0.15)
+    assert cache.get("pune") is None
+    assert cache.get_or_load("pune", load) == "pune-2"
+
+
+def test_stale_value_is_served_while_one_refresh_runs():
+    cache, load = TTLCache(ttl=0.3, stale_ttl=5), Loader(delay=0.1)
+    assert cache.get_or_load("pune", load) == "pune-1"
+    time.sleep(0.35)
+    started = time.monotonic()
+    assert [cache.get_or_load("pune", load) for _ in range(3)] == ["pune-1"] * 3
+    assert time.monotonic() - started < 0.05        # nobody waited for the refresh
+    time.sleep(0.15)
+    assert cache.get_or_load("pune", load) == "pune-2"
+    assert load.calls == 2 and cache.stale_hits == 3
+
+
+def test_concurrent_misses_share_one_load():
+    cache, load = TTLCache(ttl=10), Loader(delay=0.1)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_load("pune", load))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == ["pune-1"] * 8 and load.calls == 1
+
+
+def test_errors_are_not_cached_and_misses_use_the_negative_ttl():
+    cache = TTLCache(ttl=10, negative_ttl=0.05)
+
+    def fail(key):
+        raise RuntimeError("upstream down")
+    with pytest.raises(RuntimeError):
+        cache.get_or_load("pune", fail)
+    assert cache.get_or_load("pune", lambda key: None) is None
+    assert cache.get_or_load("pune", lambda key: "late") is None     # the None is cached...
+    time.sleep(0.06)
+    assert cache.get_or_load("pune", lambda key: "found") == "found"  # ...but only briefly
+
+
+def test_least_recently_used_entries_go_first():
+    cache = TTLCache(ttl=10, maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None and cache.get("a") == 1 and cache.get("c") == 3
+
+
+def test_snapshot_carries_fresh_entries_over_a_restart(tmp_path):
+    path = str(tmp_path / "snap.json")
+    weather, consult = TTLCache(ttl=60), TTLCache(ttl=0.05)
+    weather.set("pune", {"temp": 31})
+    consult.set("k", {"summary": "eat greens"})
+    assert save_snapshot(path, {"weather": weather, "consult": consult}) == 2
+    time.sleep(0.06)
+    fresh = {"weather": TTLCache(ttl=60), "consult": TTLCache(ttl=60)}
+    assert load_snapshot(path, fresh) == 1                  # the consult entry has expired
+    assert fresh["weather"].get("pune") == {"temp": 31} and fresh["consult"].get("k") is None
+
+
+def test_snapshots_of_several_workers_merge(tmp_path):
+    path = str(tmp_path / "snap.json")
+    first, second = TTLCache(ttl=10, maxsize=2), TTLCache(ttl=60, maxsize=2)
+    first.set("pune", "old")
+    first.set("goa", "sunny")
+    second.set("pune", "new")
+    save_snapshot(path, {"weather": first})
+    save_snapshot(path, {"weather": second})
+    restored = TTLCache(ttl=60)
+    assert load_snapshot(path, {"weather": restored, "missing": TTLCache(ttl=60)}) == 2
+    # the entry that lives longer wins, and no more than maxsize are kept
+    assert restored.get("pune") == "new" and restored.get("goa") == "sunny"
+    third = TTLCache(ttl=90, maxsize=2)
+    third.set("delhi", "hazy")
+    save_snapshot(path, {"weather": third})
+    restored = TTLCache(ttl=60)
+    load_snapshot(path, {"weather": restored})
+    assert restored.get("goa") is None and restored.get("delhi") == "hazy"
@@ -0,0 +1,45 @@
+import pytest
+import requests
+
+import app
+
+SECRET = "SECRETKEY123"
+
+
+class LeakySession:
+    """Fails every request the way requests does: with the full URL, api_key included, in the message."""
+
+    def __init__(self, status=None):
+        self.status = status
+
+    def get(self, url, params=None, timeout=None):
+        full = f"{url}?api_key={(params or {}).get('api_key') or (params or {}).get('key')}"
+        if self.status is None:
+            raise requests.exceptions.ConnectionError(f"Max retries exceeded with url: {full}")
+        resp = requests.Response()
+        resp.status_code = self.status
+        raise requests.exceptions.HTTPError(f"{self.status} Client Error for url: {full}", response=resp)
+
+
+@pytest.fixture(params=[None, 403], ids=["unreachable", "http-error"])
+def usda_fails(request, monkeypatch):
+    monkeypatch.setattr(app, "USDA_API_KEY", SECRET)
+    monkeypatch.setattr(app, "WEATHER_API_KEY", SECRET)
+    monkeypatch.setattr(app, "http_session", lambda: LeakySession(request.param))
+    for name in ("usda", "weather"):
+        app.UPSTREAMS[name].record_success()
+    yield request.param
+    for name in ("usda", "weather"):
+        app.UPSTREAMS[name].record_success()
+
+
+def test_api_key_never_reaches_analyze_or_log_replies(usda_fails):
+    client = app.app.test_client()
+    items = [{"name": "qzxv leaky grain", "qty": 100}]
+    analyzed = client.post("/analyze", json={"city": "nowhere", "items": items})
+    logged = client.post("/log/items", json={"day": "2026-03-02", "items": items})
+    for resp in (analyzed, logged):
+        assert resp.status_code == 200
+        assert SECRET not in resp.get_data(as_text=True)
+        assert resp.get_json()["items"][0]["error"] == \
+            ("usda is unavailable" if usda_fails is None else "usda request failed (403)")
@@ -0,0 +1,174 @@
+# ttl_cache.py
+"""
+Small in-process cache for upstream lookups.
+
+- entries expire after `ttl` seconds; `None` results are cached for `negative_ttl`
+- with `stale_ttl` > 0 an expired entry is still served for that long while one
+  background thread refreshes it (stale-while-revalidate)
+- concurrent misses for the same key wait for a single load (request coalescing),
+  optionally only up to a timeout
+- at most `maxsize` entries, least recently used evicted first
+Exceptions raised by the loader are never cached.
+
+save_snapshot()/load_snapshot() carry the live entries of caches with string keys
+and JSON values over a restart, through one JSON file shared by all processes.
+"""
+
+import os
+import json
+import time
+import fcntl
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+
+class TTLCache:
+    def __init__(self, ttl: float, maxsize: int = 1024, negative_ttl: Optional[float] = None,
+                 stale_ttl: float = 0.0):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.negative_ttl = ttl if negative_ttl is None else negative_ttl
+        self.stale_ttl = stale_ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()   # key -> (value, expires)
+        self._inflight: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _store(self, key: Hashable, value: Any):
+        ttl = self.ttl if value is not None else self.negative_ttl
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Fresh cached value without loading (stale entries count as missing)."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or time.monotonic() >= entry[1]:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key: Hashable, value: Any):
+        self._store(key, value)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def snapshot(self) -> List[Tuple[Hashable, Any, float]]:
+        """Unexpired entries as (key, value, expiry as a wall-clock timestamp), least recently used first."""
+        now, wall = time.monotonic(), time.time()
+        with self._lock:
+            return [(key, value, wall + expires - now) for key, (value, expires) in self._data.items()
+                    if expires > now]
+
+    def restore(self, entries: Iterable[Tuple[Hashable, Any, float]]) -> int:
+        """Add snapshot() entries (from this or another process) that are still fresh; returns how many."""
+        now, wall = time.monotonic(), time.time()
+        added = 0
+        with self._lock:
+            for key, value, expires_at in entries:
+                if expires_at > wall and key not in self._data:
+                    self._data[key] = (value, now + expires_at - wall)
+                    added += 1
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return added
+
+    def _load(self, key: Hashable, loader: Callable[[Hashable], Any], fut: Future):
+        try:
+            value = loader(key)
+        except BaseException as e:
+            fut.set_exception(e)
+        else:
+            self._store(key, value)
+            fut.set_result(value)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def get_or_load(self, key: Hashable, loader: Callable[[Hashable], Any],
+                    timeout: Optional[float] = None) -> Any:
+        """
+        Cached value or loader(key). A caller that waits for another caller's load gives up
+        after `timeout` seconds (concurrent.futures.TimeoutError); the load itself carries on.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires = entry
+                if now < expires:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                if value is not None and now < expires + self.stale_ttl:
+                    # serve the stale value, refresh it in the background (once)
+                    self.stale_hits += 1
+                    if key not in self._inflight:
+                        fut = self._inflight[key] = Future()
+                        threading.Thread(target=self._load, args=(key, loader, fut), daemon=True).start()
+                    return value
+            fut = self._inflight.get(key)
+            owner = fut is None
+            if owner:
+                fut = self._inflight[key] = Future()
+            self.misses += 1
+        if owner:
+            self._load(key, loader, fut)
+        return fut.result(timeout)
+
+
+def _read_snapshot(path: str) -> Dict[str, List[list]]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def save_snapshot(path: str, caches: Dict[str, TTLCache]) -> int:
+    """
+    Merge the live entries of `caches` into the snapshot file at `path` (several worker
+    processes may save one after the other; the later expiry of a key wins). Returns the
+    number of entries written.
+    """
+    written = 0
+    with open(path + ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        data = _read_snapshot(path)
+        wall = time.time()
+        for name, cache in caches.items():
+            merged = {key: (value, expires_at) for key, value, expires_at in data.get(name, [])
+                      if expires_at > wall}
+            for key, value, expires_at in cache.snapshot():
+                if key not in merged or merged[key][1] < expires_at:
+                    merged[key] = (value, expires_at)
+            # keep the entries that live longest if there are more than the cache holds
+            entries = sorted(([k, v, e] for k, (v, e) in merged.items()), key=lambda entry: entry[2])
+            data[name] = entries[-cache.maxsize:]
+            written += len(data[name])
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, path)
+    return written
+
+
+def load_snapshot(path: str, caches: Dict[str, TTLCache]) -> int:
+    """Fill `caches` from the snapshot at `path`, skipping what has expired; returns entries loaded."""
+    data = _read_snapshot(path)
+    return sum(cache.restore(tuple(entry) for entry in data.get(name, [])) for name, cache in caches.items())